@@ -0,0 +1,68 @@
+import java.io.BufferedReader;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.io.StringWriter;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.DirectoryStream;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.Base64;
+import java.util.List;
+import javax.tools.JavaCompiler;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+
+/**
+ * Long-lived javac for native_runner.py: compiling in a warm JVM avoids a JVM
+ * start and a cold compiler for every submitted file.
+ *
+ * Protocol: "ready" is printed once started. Each request is one line,
+ * "<source directory>\t<class directory>", compiling every .java file of the
+ * source directory; the answer is one line, "<0 if compiled, 1 otherwise>
+ * <diagnostics in base64>". Annotation processing is disabled, so compiling
+ * never runs submitted code.
+ */
+public class CompileServer {
+
+    public static void main(String[] args) throws IOException {
+        JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        PrintStream out = new PrintStream(System.out, true, "UTF-8");
+        if (compiler == null) {
+            out.println("error no system Java compiler (a JRE without javac?)");
+            return;
+        }
+        // The file manager keeps the platform classes indexed between compilations
+        StandardJavaFileManager fileManager = compiler.getStandardFileManager(null, null, StandardCharsets.UTF_8);
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        out.println("ready");
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            String[] dirs = line.split("\t", -1);
+            StringWriter diagnostics = new StringWriter();
+            boolean compiled;
+            try {
+                List<String> files = new ArrayList<>();
+                try (DirectoryStream<Path> sources = Files.newDirectoryStream(Paths.get(dirs[0]), "*.java")) {
+                    for (Path source : sources) {
+                        files.add(source.toString());
+                    }
+                }
+                List<String> options = Arrays.asList("-d", dirs[1], "-encoding", "UTF-8", "-proc:none");
+                compiled = compiler.getTask(
+                    diagnostics, fileManager, null, options, null, fileManager.getJavaFileObjectsFromStrings(files)
+                ).call();
+            } catch (RuntimeException | IOException e) {
+                diagnostics.write(e.toString());
+                compiled = false;
+            }
+            byte[] text = diagnostics.toString().getBytes(StandardCharsets.UTF_8);
+            out.println((compiled ? "0 " : "1 ") + Base64.getEncoder().encodeToString(text));
+        }
+        fileManager.close();
+    }
+}
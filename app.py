@@ -1,14 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, send_from_directory, jsonify, abort, Response
 import os
+import json
+import threading
+import time
 from werkzeug.utils import secure_filename
 import uuid
 
 # Import our custom modules
 from config import Config
-from report_generator import generate_report
+from report_generator import generate_report, warmup
+from job_queue import JobQueue, QueueFull, DONE, FAILED
+import metrics
+from uploads import UploadRequest, save_upload, discard_uploads
+from session_storage import SessionStorage, EVICTED
 
 app = Flask(__name__)
 app.config.from_object(Config)
+# Stream uploaded files to disk, hashing them on the way
+app.request_class = UploadRequest
 
 # Ensure the secret key is set
 if not app.secret_key:
@@ -17,14 +26,80 @@ if not app.secret_key:
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+def run_report_job(job):
+    """Generate the report for a queued job and return the report filename."""
+    payload = job['payload']
+    report_path = generate_report(
+        payload['instruction_path'],
+        payload['code_paths'],
+        payload['output_dir'],
+        progress_callback=lambda event: job_queue.add_event(job['id'], event),
+        previous_dir=payload.get('previous_dir'),
+        file_hashes=payload.get('file_hashes')
+    )
+    storage.update_size(job['session_id'])
+    return os.path.basename(report_path)
+
+# Background workers generating the reports
+job_queue = JobQueue(
+    app.config['JOB_DATABASE'],
+    run_report_job,
+    num_workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_MAX_PENDING']
+)
+
+# Session folders, evicted after SESSION_TTL or beyond the UPLOAD_MAX_BYTES quota
+storage = SessionStorage(
+    app.config['UPLOAD_FOLDER'],
+    app.config['SESSION_DATABASE'],
+    ttl=app.config['SESSION_TTL'],
+    max_bytes=app.config['UPLOAD_MAX_BYTES'],
+    sweep_interval=app.config['SESSION_SWEEP_INTERVAL'],
+    protected=job_queue.active_sessions,
+    cleanup=job_queue.purge
+)
+storage.adopt_legacy_sessions()
+job_queue.start()
+storage.start()
+
+# Load the report generator's dependencies in the background, so that the first report does not wait for them
+if app.config['WARMUP']:
+    threading.Thread(target=warmup, name='warmup', daemon=True).start()
+
+def parse_session_id(value):
+    """Return value as a canonical session id, or None if it is not one."""
+    try:
+        return str(uuid.UUID(value))
+    except (TypeError, ValueError):
+        return None
+
+def get_previous_session_id(value):
+    """Return value if it names an existing report session folder, else None."""
+    session_id = parse_session_id(value)
+    if session_id is None or storage.path(session_id) is None:
+        return None
+    return session_id
+
 @app.route('/')
 def index():
-    """Render the main page with file upload form."""
-    return render_template('index.html')
+    """Render the main page with file upload form.
+
+    `?resubmit=<session_id>` marks the upload as a new version of an earlier report,
+    so that its unchanged sections are reused.
+    """
+    return render_template('index.html', previous_session_id=get_previous_session_id(request.args.get('resubmit')))
 
 @app.route('/upload', methods=['POST'])
 def upload_files():
     """Handle file uploads and initiate report generation."""
+    try:
+        return queue_uploaded_report()
+    finally:
+        # Spooled uploads that were not saved (missing fields, rejected request)
+        discard_uploads(request.files)
+
+def queue_uploaded_report():
+    """Save the uploaded files and queue their report."""
     if 'instruction_file' not in request.files or 'code_files' not in request.files:
         flash('Fichiers requis manquants', 'warning')
         return redirect(request.url)
@@ -36,15 +111,13 @@ def upload_files():
         flash('Aucun fichier sélectionné', 'warning')
         return redirect(request.url)
 
-    # Create a unique session ID for this report
-    session_id = str(uuid.uuid4())
-    session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
-    os.makedirs(session_folder, exist_ok=True)
+    # Create a unique session folder for this report
+    session_id, session_folder = storage.create()
 
     # Save instruction file
     instruction_filename = secure_filename(instruction_file.filename)
     instruction_path = os.path.join(session_folder, instruction_filename)
-    instruction_file.save(instruction_path)
+    file_hashes = {instruction_path: save_upload(instruction_file, instruction_path)}
 
     # Save code files
     code_paths = []
@@ -52,22 +125,144 @@ def upload_files():
         if code_file and code_file.filename != '':
             code_filename = secure_filename(code_file.filename)
             code_path = os.path.join(session_folder, code_filename)
-            code_file.save(code_path)
+            file_hashes[code_path] = save_upload(code_file, code_path)
             code_paths.append(code_path)
 
-    # Generate the report
+    # Reuse the unchanged sections of the report being resubmitted, if any
+    previous_session_id = get_previous_session_id(request.form.get('previous_session_id'))
+    previous_dir = None
+    if previous_session_id:
+        previous_dir = storage.path(previous_session_id)
+    storage.update_size(session_id)
+
+    # Queue the report generation and answer right away
     try:
-        report_path = generate_report(instruction_path, code_paths, session_folder)
-        return redirect(url_for('download_report', session_id=session_id, filename=os.path.basename(report_path)))
-    except Exception as e:
-        flash(f'Erreur lors de la génération du rapport: {str(e)}', 'danger')
+        job_id = job_queue.submit(
+            session_id,
+            instruction_path=instruction_path,
+            code_paths=code_paths,
+            output_dir=session_folder,
+            previous_dir=previous_dir,
+            file_hashes=file_hashes
+        )
+    except QueueFull:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'error': 'Trop de rapports en attente, réessayez plus tard'}), 503
+        flash('Trop de rapports en attente, réessayez dans quelques minutes', 'warning')
         return redirect(url_for('index'))
 
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({
+            'job_id': job_id,
+            'status_url': url_for('job_status', job_id=job_id),
+            'result_url': url_for('job_result', job_id=job_id)
+        }), 202
+    return redirect(url_for('job_page', job_id=job_id))
+
+def job_to_dict(job):
+    """Public view of a job for the status endpoints."""
+    data = {'job_id': job['id'], 'session_id': job['session_id'], 'status': job['status']}
+    if job['status'] == DONE:
+        data['result_url'] = url_for('job_result', job_id=job['id'])
+    elif job['status'] == FAILED:
+        data['error'] = job['error']
+    return data
+
+@app.route('/jobs/<job_id>')
+def job_page(job_id):
+    """Render the waiting page for a queued report."""
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    return render_template('job.html', job=job_to_dict(job))
+
+@app.route('/jobs/<job_id>/status')
+def job_status(job_id):
+    """Return the current state of a report job as JSON."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Tâche inconnue'}), 404
+    return jsonify(job_to_dict(job))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream the progress events of a job as Server-Sent Events.
+
+    Each stage event is sent as an unnamed message; a final `end` event carries the
+    job status once it is done or failed. The stream is closed after
+    Config.JOB_EVENTS_MAX_SECONDS so that it does not hold a server worker for the
+    whole job: the browser reconnects and resumes after the Last-Event-ID it received.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    result_url = url_for('job_result', job_id=job_id)
+    last_id = request.headers.get('Last-Event-ID', type=int) or 0
+
+    def stream():
+        nonlocal last_id
+        last_sent = time.monotonic()
+        deadline = last_sent + Config.JOB_EVENTS_MAX_SECONDS
+        while True:
+            for event_id, event in job_queue.get_events(job_id, last_id):
+                last_id = event_id
+                last_sent = time.monotonic()
+                yield f"id: {event_id}\ndata: {json.dumps(event)}\n\n"
+
+            job = job_queue.get(job_id)
+            if job['status'] in (DONE, FAILED):
+                # Flush events stored between the two queries before closing the stream
+                for event_id, event in job_queue.get_events(job_id, last_id):
+                    yield f"id: {event_id}\ndata: {json.dumps(event)}\n\n"
+                end = {'status': job['status'], 'result_url': result_url, 'error': job['error']}
+                yield f"event: end\ndata: {json.dumps(end)}\n\n"
+                return
+
+            if time.monotonic() > deadline:
+                # Let the client reconnect (after 1 s) instead of holding this worker
+                yield "retry: 1000\n\n"
+                return
+
+            if time.monotonic() - last_sent > 15:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(0.5)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Disable proxy buffering (nginx)
+    })
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Redirect to the finished report of a job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    if job['status'] == FAILED:
+        flash(f'Erreur lors de la génération du rapport: {job["error"]}', 'danger')
+        return redirect(url_for('index'))
+    if job['status'] != DONE:
+        return redirect(url_for('job_page', job_id=job_id))
+    return redirect(url_for('download_report', session_id=job['session_id'], filename=job['result']))
+
 @app.route('/download/<session_id>/<filename>')
 def download_report(session_id, filename):
-    """Serve the generated report for download."""
-    report_path = os.path.join(app.config['UPLOAD_FOLDER'], session_id, filename)
-    return send_file(report_path, as_attachment=True)
+    """Serve the generated report for download, or answer 410 once it has been deleted."""
+    session_id = parse_session_id(session_id)
+    if session_id is None:
+        abort(404)
+    session_folder = storage.path(session_id)
+    if session_folder is None:
+        if storage.state(session_id) == EVICTED:
+            abort(410, description="Ce rapport a expiré et a été supprimé. Veuillez le générer à nouveau.")
+        abort(404)
+    return send_from_directory(session_folder, filename, as_attachment=True)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose the report pipeline metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(debug=True)
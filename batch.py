@@ -0,0 +1,227 @@
+"""Generate the reports of a whole class from the command line.
+
+Usage:
+    python batch.py instructions.pdf submissions/ -o reports/ --workers 4 --rate-limit 2
+
+Every subdirectory of the submissions folder holds the code files of one student;
+code files placed directly in the folder are treated as one student each. The
+instructions are parsed once and shared by every report. Students are processed
+in parallel, and all their API calls go through the same rate-limited client.
+
+Progress is written to a summary CSV (one row per student, with per-stage timings)
+after every student. Running the same command again after a crash or an
+interruption skips the students whose report is done and whose files did not
+change, and reuses the unchanged sections of the others.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import Config
+import report_generator
+import report_manifest
+
+SUMMARY_FIELDS = [
+    'student', 'status', 'files', 'inputs_hash', 'started_at', 'wall_s',
+    'analysis_s', 'execution_s', 'plot_interpretation_s', 'pdf_s', 'tokens',
+    'plot_bytes_saved', 'plot_calls_saved', 'report', 'error'
+]
+
+# Stages whose elapsed time is reported in the summary (summed over the files of a student)
+TIMED_STAGES = ['analysis', 'execution', 'plot_interpretation', 'pdf']
+
+
+def find_students(submissions_dir):
+    """Return {student: [code paths]} for the submissions folder."""
+    code_extensions = {f".{ext}" for ext in Config.ALLOWED_EXTENSIONS['code']}
+    students = {}
+    for entry in sorted(os.scandir(submissions_dir), key=lambda e: e.name):
+        if entry.name.startswith('.'):
+            continue
+        if entry.is_dir():
+            code_paths = []
+            for root, dirs, files in os.walk(entry.path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                code_paths += [
+                    os.path.join(root, f) for f in sorted(files)
+                    if os.path.splitext(f)[1].lower() in code_extensions
+                ]
+            if code_paths:
+                students[entry.name] = code_paths
+        elif os.path.splitext(entry.name)[1].lower() in code_extensions:
+            students[os.path.splitext(entry.name)[0]] = [entry.path]
+    return students
+
+
+def inputs_hash(instructions_hash, code_paths):
+    """Hash of everything a student's report depends on."""
+    digest = hashlib.sha256(instructions_hash.encode('utf-8'))
+    for code_path in code_paths:
+        digest.update(os.path.basename(code_path).encode('utf-8'))
+        digest.update(report_manifest.file_hash(code_path).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_lab_info(instruction_path, instructions_hash, output_dir):
+    """Parse the instructions, or reuse the result saved by an earlier run."""
+    path = os.path.join(output_dir, 'lab_info.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get('hash') == instructions_hash:
+            return saved['lab_info']
+    except (OSError, ValueError):
+        pass
+
+    lab_info = report_generator.parse_instruction_file(instruction_path)
+    if not lab_info.get('fallback'):
+        # A failed parse is not saved, so that the next run tries again
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'hash': instructions_hash, 'lab_info': lab_info}, f, ensure_ascii=False, indent=2)
+    return lab_info
+
+
+def load_summary(summary_path):
+    """Return the rows of an existing summary CSV by student."""
+    try:
+        with open(summary_path, 'r', encoding='utf-8', newline='') as f:
+            return {row['student']: row for row in csv.DictReader(f)}
+    except OSError:
+        return {}
+
+
+def write_summary(summary_path, rows):
+    """Rewrite the summary CSV atomically, so that a crash never leaves it half written."""
+    tmp_path = f"{summary_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for student in sorted(rows):
+            writer.writerow({field: rows[student].get(field, '') for field in SUMMARY_FIELDS})
+    os.replace(tmp_path, summary_path)
+
+
+def is_done(row, student_hash, output_dir):
+    """True if a summary row records a finished report for the same inputs."""
+    return (
+        row is not None
+        and row.get('status') == 'done'
+        and row.get('inputs_hash') == student_hash
+        and os.path.exists(os.path.join(output_dir, row.get('report', '')))
+    )
+
+
+def run_student(student, code_paths, instruction_path, lab_info, student_hash, output_dir):
+    """Generate the report of one student and return its summary row."""
+    stage_ms = {stage: 0 for stage in TIMED_STAGES}
+    tokens = [0]
+    plot_savings = {}
+
+    def on_event(event):
+        if event['stage'] in stage_ms and event.get('status') == 'done':
+            stage_ms[event['stage']] += event.get('elapsed_ms', 0)
+            tokens[0] += event.get('tokens', 0)
+        elif event['stage'] == 'plots':
+            plot_savings.update(event)
+
+    row = {
+        'student': student,
+        'files': len(code_paths),
+        'inputs_hash': student_hash,
+        'started_at': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    try:
+        # A report left by an earlier run lets its unchanged sections be reused
+        report_path = report_generator.generate_report(
+            instruction_path, code_paths, output_dir,
+            progress_callback=on_event, previous_dir=output_dir, lab_info=lab_info
+        )
+        row['status'] = 'done'
+        row['report'] = os.path.basename(report_path)
+    except Exception as e:
+        print(f"Error generating report for {student}: {str(e)}")
+        row['status'] = 'failed'
+        row['error'] = str(e)
+
+    row['wall_s'] = f"{time.perf_counter() - start:.2f}"
+    for stage, ms in stage_ms.items():
+        row[f"{stage}_s"] = f"{ms / 1000:.2f}"
+    row['tokens'] = tokens[0]
+    row['plot_bytes_saved'] = plot_savings.get('bytes_saved', 0)
+    row['plot_calls_saved'] = plot_savings.get('calls_saved', 0)
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate lab reports for a folder of student submissions.")
+    parser.add_argument('instructions', help="Lab instruction file (PDF, image or text)")
+    parser.add_argument('submissions', help="Folder with one subfolder (or one code file) per student")
+    parser.add_argument('-o', '--output', default='reports', help="Folder receiving one report folder per student")
+    parser.add_argument('-w', '--workers', type=int, default=4, help="Students processed in parallel")
+    parser.add_argument('--rate-limit', type=float, default=Config.DEEPSEEK_RATE_LIMIT,
+                        help="Maximum DeepSeek requests per second across all students (0 = unlimited)")
+    parser.add_argument('--summary', help="Summary CSV path (default: <output>/summary.csv)")
+    parser.add_argument('--force', action='store_true', help="Regenerate the reports that are already done")
+    args = parser.parse_args(argv)
+
+    # The shared API client is created on first use, from Config
+    Config.DEEPSEEK_RATE_LIMIT = args.rate_limit
+
+    students = find_students(args.submissions)
+    if not students:
+        print(f"No code files found in {args.submissions}")
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    summary_path = args.summary or os.path.join(args.output, 'summary.csv')
+    rows = load_summary(summary_path)
+
+    instructions_hash = report_manifest.file_hash(args.instructions)
+    todo = {}
+    for student, code_paths in students.items():
+        student_hash = inputs_hash(instructions_hash, code_paths)
+        output_dir = os.path.join(args.output, student)
+        if not args.force and is_done(rows.get(student), student_hash, output_dir):
+            continue
+        todo[student] = (code_paths, student_hash, output_dir)
+
+    print(f"{len(students)} students, {len(students) - len(todo)} already done, {len(todo)} to generate")
+    if not todo:
+        return 0
+
+    lab_info = load_lab_info(args.instructions, instructions_hash, args.output)
+
+    failed = 0
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = [
+                executor.submit(run_student, student, code_paths, args.instructions, lab_info, student_hash, output_dir)
+                for student, (code_paths, student_hash, output_dir) in todo.items()
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                row = future.result()
+                rows[row['student']] = row
+                write_summary(summary_path, rows)
+                if row['status'] != 'done':
+                    failed += 1
+                print(f"[{done}/{len(todo)}] {row['student']}: {row['status']} in {row['wall_s']}s")
+    finally:
+        if report_generator.sandbox_pool is not None:
+            report_generator.sandbox_pool.close()
+        if report_generator.native_executor is not None:
+            report_generator.native_executor.close()
+
+    print(f"Done in {time.perf_counter() - start:.1f}s, {failed} failed. Summary: {summary_path}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
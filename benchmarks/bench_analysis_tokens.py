@@ -0,0 +1,127 @@
+"""Compare the tokens spent by the two analyze_code modes.
+
+Usage: python benchmarks/bench_analysis_tokens.py
+
+For each workload and exercise, counts the tokens of:
+- two-step: the extraction prompt, the extracted block returned by the model
+  and the analysis prompt that sends the block back;
+- single: the structured prompt built from the locally selected segments.
+
+The explanation returned by the model is the same in both modes and is left
+out. No API call is made: the extracted block is taken to be the segments the
+local pre-segmentation selects. Tokens are counted with tiktoken when it is
+installed, otherwise estimated as one token per 4 characters.
+"""
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+
+import code_segments  # noqa: E402
+import report_generator  # noqa: E402
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except ImportError:
+    _encoding = None
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def payload_tokens(payload):
+    return sum(count_tokens(message['content']) for message in payload['messages'])
+
+
+def synthetic_python(exercises=8):
+    parts = ['"""Lab with one function per exercise."""', 'import math', '']
+    for n in range(1, exercises + 1):
+        parts += [
+            f"# Exercise {n}",
+            f"def exercise_{n}(values):",
+            f'    """Compute statistic number {n} of the values."""',
+            "    total = 0",
+            "    for i, value in enumerate(values):",
+            f"        total += math.pow(value, {n}) / (i + 1)",
+            "    return total",
+            "",
+            f"DATA_{n} = {list(range(n * 40))}",
+            "",
+        ]
+    parts += ["if __name__ == '__main__':"]
+    parts += [f"    print(exercise_{n}(DATA_{n}))" for n in range(1, exercises + 1)]
+    return "\n".join(parts)
+
+
+def synthetic_c(exercises=8):
+    parts = ["#include <stdio.h>", ""]
+    for n in range(1, exercises + 1):
+        parts += [
+            f"/* Exercise {n} */",
+            f"int exercise_{n}(int *values, int count) {{",
+            "    int total = 0;",
+            "    for (int i = 0; i < count; i++) {",
+            f"        total += values[i] * {n};",
+            "    }",
+            "    return total;",
+            "}",
+            "",
+        ]
+    parts += ["int main(void) {", "    int values[] = {1, 2, 3};"]
+    parts += [f'    printf("%d\\n", exercise_{n}(values, 3));' for n in range(1, exercises + 1)]
+    parts += ["    return 0;", "}"]
+    return "\n".join(parts)
+
+
+def measure(code, language, exercise_title):
+    segments = code_segments.select_segments(code_segments.segment_code(code, language), exercise_title)
+    block = "\n\n".join(segment['text'] for segment in segments)
+
+    two_step = (
+        payload_tokens(report_generator.build_extract_payload(code, language, exercise_title))
+        + count_tokens(block)
+        + payload_tokens(report_generator.build_analysis_payload(block, language))
+    )
+    single = payload_tokens(report_generator.build_structured_payload(
+        code_segments.number_lines(segments), language, exercise_title
+    ))
+    return two_step, single
+
+
+def main():
+    with open(os.path.join(ROOT, 'test_files', 'sample_code.py'), encoding='utf-8') as f:
+        sample = f.read()
+
+    workloads = [
+        ('sample_code.py', sample, 'python', ['Exercise 1: Fibonacci Implementation', 'Exercise 2: Sequence Visualization']),
+        ('synthetic.py', synthetic_python(), 'python', [f'Exercise {n}' for n in (1, 4, 8)]),
+        ('synthetic.c', synthetic_c(), 'c', [f'Exercise {n}' for n in (1, 4, 8)]),
+    ]
+
+    counter = 'tiktoken cl100k_base' if _encoding is not None else 'estimated (4 chars/token)'
+    print(f"Input tokens per analysis, {counter}")
+    print(f"{'workload':<16} {'exercise':<40} {'two-step':>9} {'single':>9} {'saved':>7}")
+    results = []
+    for name, code, language, titles in workloads:
+        for title in titles:
+            two_step, single = measure(code, language, title)
+            saved = 1 - single / two_step
+            results.append({'workload': name, 'exercise': title, 'two_step': two_step, 'single': single})
+            print(f"{name:<16} {title:<40} {two_step:>9} {single:>9} {saved:>6.0%}")
+
+    total_two_step = sum(r['two_step'] for r in results)
+    total_single = sum(r['single'] for r in results)
+    print(f"{'total':<57} {total_two_step:>9} {total_single:>9} {1 - total_single / total_two_step:>6.0%}")
+    if '--json' in sys.argv:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Measure the import time of the application modules and check it against a budget.
+
+Usage: python benchmarks/bench_import_time.py [--runs N] [--budget MODULE=MS ...] [--json]
+
+Each module is imported --runs times in a fresh interpreter with `python -X importtime`,
+without DEEPSEEK_API_KEY, and the median of its cumulative import time is compared
+with its budget. The slowest imports of the last run are listed, as well as the
+heavy dependencies (matplotlib, PIL, markdown, requests, PDF libraries) that were
+imported although the modules only need them on first use. Exits with status 1
+when a module is over budget or imports a heavy dependency.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time allowed per module, in milliseconds
+BUDGETS_MS = {'app': 500, 'report_generator': 250, 'batch': 250}
+
+# Dependencies that must only be imported on first use
+HEAVY_MODULES = ('matplotlib', 'PIL', 'markdown', 'requests', 'pypdf', 'pdf2image', 'weasyprint', 'pdfkit')
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def import_times(module):
+    """Import module in a fresh interpreter and return [(name, self us, cumulative us, depth)]."""
+    env = dict(os.environ)
+    env.pop('DEEPSEEK_API_KEY', None)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+    if process.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+    times = []
+    for line in process.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            times.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    return times
+
+
+def subtree(times, module):
+    """Imports done by the import of module (they are listed before it, deeper)."""
+    end = next(i for i, (name, _, _, depth) in enumerate(times) if name == module and depth == 0)
+    start = end
+    while start > 0 and times[start - 1][3] > 0:
+        start -= 1
+    return times[start:end + 1]
+
+
+def measure(module, runs):
+    cumulative = []
+    for _ in range(runs):
+        times = subtree(import_times(module), module)
+        cumulative.append(times[-1][2])
+    top_level = {name.split('.')[0] for name, _, _, _ in times}
+    return {
+        'module': module,
+        'median_ms': round(statistics.median(cumulative) / 1000, 1),
+        'min_ms': round(min(cumulative) / 1000, 1),
+        'slowest': [
+            {'module': name, 'cumulative_ms': round(total / 1000, 1)}
+            for name, _, total, depth in sorted(times, key=lambda item: -item[2])
+            if depth == 1
+        ][:8],
+        'heavy_imports': [name for name in HEAVY_MODULES if name in top_level]
+    }
+
+
+def parse_budgets(values):
+    budgets = dict(BUDGETS_MS)
+    for value in values or []:
+        module, _, ms = value.partition('=')
+        budgets[module] = float(ms)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument('--budget', action='append', metavar='MODULE=MS',
+                        help="budget of a module in milliseconds (repeatable, adds modules)")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    budgets = parse_budgets(args.budget)
+    results = []
+    failed = False
+    print(f"{'module':<18} {'median ms':>10} {'min ms':>8} {'budget':>8}  status")
+    for module, budget in budgets.items():
+        result = measure(module, args.runs)
+        result['budget_ms'] = budget
+        result['ok'] = result['median_ms'] <= budget and not result['heavy_imports']
+        failed = failed or not result['ok']
+        results.append(result)
+        status = 'ok' if result['ok'] else 'OVER BUDGET' if result['median_ms'] > budget else 'HEAVY IMPORTS'
+        print(f"{module:<18} {result['median_ms']:>10} {result['min_ms']:>8} {budget:>8}  {status}")
+        print("    slowest: " + ", ".join(f"{item['module']} {item['cumulative_ms']}" for item in result['slowest'][:5]))
+        if result['heavy_imports']:
+            print("    imported eagerly: " + ", ".join(result['heavy_imports']))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Compare the PDF renderers on a large report with many plots.
+
+Usage: python benchmarks/bench_pdf_render.py [--sections N] [--plots N] [--runs N] [backend ...]
+
+Every installed backend (see pdf_renderer) renders the same synthetic report,
+in its own process so that peak memory is measured separately: python_rss is the
+peak RSS of the rendering process, engine_rss the peak RSS of the processes it
+spawned (wkhtmltopdf). Intermediate files are not written. Pages are counted
+with pypdf when it is installed.
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+os.environ['REPORT_KEEP_INTERMEDIATE'] = '0'
+
+
+def make_report(output_dir, sections, plots_per_section):
+    """Build lab_info and code_analyses for a report with plots written to output_dir."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    with open(os.path.join(ROOT, 'test_files', 'sample_code.py'), encoding='utf-8') as f:
+        code = f.read()
+    explanation = "\n\n".join(
+        f"Paragraph {n} of the analysis: the function iterates over the input, keeps a running "
+        f"state and returns the computed sequence. " * 3 for n in range(4)
+    )
+
+    code_analyses = []
+    for i in range(sections):
+        plots = []
+        for j in range(plots_per_section):
+            plot_path = os.path.join(output_dir, f"section{i}_figure_{j + 1}.png")
+            fig, ax = plt.subplots(figsize=(6, 4))
+            ax.plot([x * (i + j + 1) for x in range(50)])
+            ax.set_title(f"Section {i + 1}, figure {j + 1}")
+            fig.savefig(plot_path, dpi=100)
+            plt.close(fig)
+            plots.append(plot_path)
+        code_analyses.append({
+            'filename': f"exercise_{i + 1}.py",
+            'language': 'python',
+            'code': code,
+            'code_block': code,
+            'explanation': explanation,
+            'execution_results': {
+                'output': "Fibonacci sequence: [0, 1, 1, 2, 3, 5, 8, 13, 21, 34]\n" * 5,
+                'error': None,
+                'plots': plots,
+                'plot_interpretations': {os.path.basename(p): "The curve grows linearly." for p in plots}
+            }
+        })
+    lab_info = {
+        'title': 'Benchmark Lab',
+        'objectives': ['Measure PDF rendering'],
+        'exercises': [f"Exercise {i + 1}" for i in range(sections)]
+    }
+    return lab_info, code_analyses
+
+
+def count_pages(path):
+    try:
+        import pypdf
+        return len(pypdf.PdfReader(path).pages)
+    except ImportError:
+        with open(path, 'rb') as f:
+            return len(re.findall(rb'/Type\s*/Page[^s]', f.read()))
+
+
+def child(backend, sections, plots, runs):
+    """Render the report runs times with backend and print the measurements as JSON."""
+    import pdf_renderer
+    import report_generator
+
+    renderer = pdf_renderer.get_renderer(backend)
+    with tempfile.TemporaryDirectory() as output_dir:
+        lab_info, code_analyses = make_report(output_dir, sections, plots)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            report_path = report_generator.generate_pdf_report(lab_info, code_analyses, output_dir, renderer)
+            timings.append(time.perf_counter() - start)
+        pages = count_pages(report_path) if report_path.endswith('.pdf') else 0
+        size = os.path.getsize(report_path)
+
+    print(json.dumps({
+        'backend': backend,
+        'seconds': min(timings),
+        'pages': pages,
+        'bytes': size,
+        'python_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'engine_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('backends', nargs='*', help="Backends to compare (default: all installed)")
+    parser.add_argument('--sections', type=int, default=40)
+    parser.add_argument('--plots', type=int, default=3, help="Plots per section")
+    parser.add_argument('--runs', type=int, default=3, help="Renders per backend, the fastest is kept")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.sections, args.plots, args.runs)
+        return
+
+    import pdf_renderer
+    backends = args.backends or [name for name, renderer in pdf_renderer.RENDERERS.items() if renderer.available()]
+
+    print(f"{args.sections} sections, {args.plots} plots per section, best of {args.runs}")
+    print(f"{'backend':<12} {'seconds':>8} {'pages':>6} {'pages/s':>8} {'size KB':>8} {'python_rss MB':>14} {'engine_rss MB':>14}")
+    for backend in backends:
+        process = subprocess.run(
+            [sys.executable, __file__, '--child', backend, '--sections', str(args.sections),
+             '--plots', str(args.plots), '--runs', str(args.runs)],
+            capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            print(f"{backend:<12} failed: {process.stderr.strip().splitlines()[-1]}")
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        pages_per_second = result['pages'] / result['seconds'] if result['pages'] else 0
+        print(f"{backend:<12} {result['seconds']:>8.2f} {result['pages']:>6} {pages_per_second:>8.1f}"
+              f" {result['bytes'] / 1024:>8.0f} {result['python_rss_kb'] / 1024:>14.1f} {result['engine_rss_kb'] / 1024:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
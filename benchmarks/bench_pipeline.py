@@ -0,0 +1,468 @@
+"""Benchmark suite of the whole report pipeline on synthetic workloads.
+
+Usage: python benchmarks/bench_pipeline.py [--workload NAME ...] [--scale X] [--runs N]
+           [--llm-latency-ms MS] [--profile {cprofile,sample}] [--profile-dir DIR]
+           [--no-allocations] [--output FILE] [--compare FILE] [--json]
+
+Workloads, generated in a temporary folder (--scale multiplies their sizes):
+
+- many_files: 40 distinct Python scripts and a text instructions file;
+- notebook: a notebook of 240 code cells without stored outputs, run cell by cell
+  and analyzed by chunks;
+- plots: 8 scripts drawing 6 figures each, every plot interpreted;
+- big_pdf: a 150-page PDF instructions file with a text layer and one script.
+
+Each run of a workload is one generate_report in a fresh interpreter, after
+report_generator.warmup(), against the offline LLM backend (LLM_BACKEND=fake, see
+fake_llm, with --llm-latency-ms per call) and without the response cache. For every
+stage it reports the number of tasks, their summed wall time, the span from the first
+start to the last end (stages run concurrently) and the CPU time of the threads that
+ran them; for the report, its wall time, the CPU time of the process and of the
+sandboxed runs and the peak RSS of both. With --runs N, the run of median wall time
+is kept. One more run traces the allocations with tracemalloc, which slows everything
+down (so its times are not used), for the peak Python heap and the allocation sites
+holding the most memory after the report; --no-allocations skips it.
+
+--profile cprofile writes <workload>.prof (pstats, every thread; view with snakeviz or
+flameprof), --profile sample writes <workload>.folded, wall-clock stacks of every thread
+sampled every millisecond in the collapsed format of flamegraph.pl and speedscope.
+--output stores the results as JSON with the commit they were measured on, and
+--compare prints the change against such a file, to diff two commits.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Number of allocation sites kept per workload
+TOP_ALLOCATIONS = 10
+
+
+def scaled(count, scale):
+    return max(1, round(count * scale))
+
+
+def write_pdf(path, pages):
+    """Write a PDF whose pages show the given lines of text, with a text layer."""
+    def escape(line):
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = ("BT /F1 10 Tf 14 TL 50 800 Td " + " ".join(f"({escape(line)}) '" for line in lines) + " ET").encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        ).encode('ascii'))
+        kids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode('ascii')
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def sample_script(number):
+    """A distinct copy of the sample script (distinct files are analyzed separately)."""
+    with open(os.path.join(ROOT, 'test_files', 'sample_code.py'), encoding='utf-8') as f:
+        return f"# Exercise {number}\nOFFSET = {number}\n\n{f.read()}"
+
+
+def plot_script(number, figures):
+    return f'''# Exercise {number}: plots of noisy signals
+import matplotlib.pyplot as plt
+import numpy as np
+
+rng = np.random.default_rng({number})
+x = np.linspace(0, 10, 400)
+for k in range({figures}):
+    fig, axes = plt.subplots(1, 2, figsize=(8, 3))
+    axes[0].plot(x, np.sin(x * (k + 1)) + rng.normal(0, 0.2, x.size))
+    axes[0].set_title(f"Signal {{k + 1}}")
+    axes[1].hist(rng.normal(k, 1 + k / 2, 2000), bins=40)
+    axes[1].set_title(f"Distribution {{k + 1}}")
+    fig.tight_layout()
+    print(f"Figure {{k + 1}}: mean {{np.mean(x):.2f}}")
+plt.show()
+'''
+
+
+def notebook_cell(number):
+    return [
+        f"def step_{number}(values):\n",
+        f"    \"\"\"Step {number} of the processing.\"\"\"\n",
+        f"    return [value * {number % 7 + 1} + {number} for value in values if value % {number % 5 + 2}]\n",
+        "\n",
+        f"data_{number} = step_{number}(range({50 + number}))\n",
+        f"print('step {number}:', len(data_{number}), sum(data_{number}))\n"
+    ]
+
+
+def make_many_files(folder, scale):
+    instructions = os.path.join(folder, 'instructions.txt')
+    shutil.copyfile(os.path.join(ROOT, 'test_files', 'sample_lab_instructions.txt'), instructions)
+    code_paths = []
+    for i in range(scaled(40, scale)):
+        code_paths.append(os.path.join(folder, f"exercise_{i + 1}.py"))
+        with open(code_paths[-1], 'w', encoding='utf-8') as f:
+            f.write(sample_script(i + 1))
+    return instructions, code_paths
+
+
+def make_notebook(folder, scale):
+    instructions = os.path.join(folder, 'instructions.txt')
+    shutil.copyfile(os.path.join(ROOT, 'test_files', 'sample_lab_instructions.txt'), instructions)
+    cells = []
+    for i in range(scaled(240, scale)):
+        if i % 4 == 0:
+            cells.append({'cell_type': 'markdown', 'metadata': {}, 'source': [f"## Step {i + 1}\n", "Processing of the data.\n"]})
+        cells.append({
+            'cell_type': 'code', 'metadata': {}, 'execution_count': None, 'outputs': [],
+            'source': notebook_cell(i + 1)
+        })
+    notebook = {'cells': cells, 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+    code_path = os.path.join(folder, 'analysis.ipynb')
+    with open(code_path, 'w', encoding='utf-8') as f:
+        json.dump(notebook, f, indent=1)
+    return instructions, [code_path]
+
+
+def make_plots(folder, scale):
+    instructions = os.path.join(folder, 'instructions.txt')
+    shutil.copyfile(os.path.join(ROOT, 'test_files', 'sample_lab_instructions.txt'), instructions)
+    code_paths = []
+    for i in range(scaled(8, scale)):
+        code_paths.append(os.path.join(folder, f"plots_{i + 1}.py"))
+        with open(code_paths[-1], 'w', encoding='utf-8') as f:
+            f.write(plot_script(i + 1, 6))
+    return instructions, code_paths
+
+
+def make_big_pdf(folder, scale):
+    pages = []
+    for page in range(scaled(150, scale)):
+        lines = [f"Lab 4 - Signal processing - page {page + 1}", ""]
+        lines += [
+            f"Exercise {page + 1}.{line + 1}: compute the moving average of the series and compare it "
+            f"with the filtered signal for a window of {line + 3} samples."
+            for line in range(50)
+        ]
+        pages.append(lines)
+    instructions = os.path.join(folder, 'instructions.pdf')
+    write_pdf(instructions, pages)
+    code_path = os.path.join(folder, 'exercise_1.py')
+    with open(code_path, 'w', encoding='utf-8') as f:
+        f.write(sample_script(1))
+    return instructions, [code_path]
+
+
+WORKLOADS = {
+    'many_files': make_many_files,
+    'notebook': make_notebook,
+    'plots': make_plots,
+    'big_pdf': make_big_pdf,
+}
+
+
+class StackSampler:
+    """Samples the stacks of every thread into collapsed stacks (flamegraph.pl format)."""
+
+    def __init__(self, interval):
+        import collections
+        import threading
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        import threading
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, 'thread').split('_')[0])
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, path):
+        self._stop.set()
+        self._thread.join()
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ThreadProfiler:
+    """cProfile of every thread, merged into one pstats file."""
+
+    def __init__(self):
+        import cProfile
+        self._new = cProfile.Profile
+        self.profiles = []
+
+    def _start_thread(self, *args):
+        profile = self._new()
+        self.profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        import threading
+        self._start_thread()
+        if sys.version_info < (3, 12):
+            # Before 3.12 a profile only sees its own thread: start one in every new thread
+            threading.setprofile(self._start_thread)
+
+    def stop(self, path):
+        import pstats
+        import threading
+        threading.setprofile(None)
+        for profile in self.profiles:
+            profile.disable()
+        pstats.Stats(*self.profiles).dump_stats(path)
+
+
+def stage_summary(events):
+    """Tasks, summed wall and CPU time and span of every stage, from the progress events."""
+    stages = {}
+    for event in events:
+        if event['stage'] == 'report' or event['status'] not in ('done', 'failed', 'reused'):
+            continue
+        stage = stages.setdefault(event['stage'], {'tasks': 0, 'failed': 0, 'wall_ms': 0, 'cpu_ms': 0, 'start_ms': None, 'end_ms': 0})
+        stage['tasks'] += 1
+        stage['failed'] += event['status'] == 'failed'
+        stage['wall_ms'] += event.get('elapsed_ms', 0)
+        stage['cpu_ms'] += event.get('cpu_ms', 0)
+        start_ms = event['t_ms'] - event.get('elapsed_ms', 0)
+        stage['start_ms'] = start_ms if stage['start_ms'] is None else min(stage['start_ms'], start_ms)
+        stage['end_ms'] = max(stage['end_ms'], event['t_ms'])
+    for stage in stages.values():
+        stage['span_ms'] = stage.pop('end_ms') - stage.pop('start_ms')
+    return stages
+
+
+def site_path(filename):
+    """Path of an allocation site, relative to the repository when it is inside."""
+    if filename.startswith(ROOT + os.sep):
+        return os.path.relpath(filename, ROOT)
+    return filename
+
+
+def run_child(name, scale, profile, profile_dir, allocations):
+    """One measured generate_report of a workload; runs in the child interpreter."""
+    import resource
+    import tracemalloc
+
+    import report_generator
+
+    with tempfile.TemporaryDirectory(prefix=f'bench-{name}-') as folder:
+        instructions, code_paths = WORKLOADS[name](folder, scale)
+        output_dir = os.path.join(folder, 'report')
+        os.makedirs(output_dir)
+        warmup_ms = report_generator.warmup() * 1000
+
+        profiler = None
+        if profile == 'cprofile':
+            profiler = ThreadProfiler()
+        elif profile == 'sample':
+            profiler = StackSampler(0.001)
+        if allocations:
+            tracemalloc.start()
+        events = []
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        if profiler is not None:
+            profiler.start()
+        start = time.perf_counter()
+        report_path = report_generator.generate_report(instructions, code_paths, output_dir, progress_callback=events.append)
+        wall = time.perf_counter() - start
+        if profiler is not None:
+            profiler.stop(os.path.join(profile_dir, f"{name}.{'prof' if profile == 'cprofile' else 'folded'}"))
+        after = resource.getrusage(resource.RUSAGE_SELF)
+
+        result = {
+            'workload': name,
+            'files': len(code_paths),
+            'input_kb': round(sum(os.path.getsize(path) for path in [instructions] + code_paths) / 1024),
+            'wall_ms': round(wall * 1000),
+            'cpu_ms': round((after.ru_utime + after.ru_stime - usage.ru_utime - usage.ru_stime) * 1000),
+            'warmup_ms': round(warmup_ms),
+            'peak_rss_mb': round(after.ru_maxrss / 1024, 1),
+            'report': os.path.basename(report_path),
+            'stages': stage_summary(events)
+        }
+        if allocations:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            result['traced_peak_mb'] = round(peak / 2 ** 20, 1)
+            result['top_allocations'] = [
+                {'site': f"{site_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                 'kb': round(stat.size / 1024), 'blocks': stat.count}
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+            ]
+
+        with open(os.path.join(output_dir, 'manifest.json'), encoding='utf-8') as f:
+            sections = json.load(f)['sections']
+        resources = [
+            (section.get('execution_results') or {}).get('resources') or {} for section in sections
+        ]
+        result['sandbox_cpu_ms'] = round(sum(r.get('cpu_ms') or 0 for r in resources))
+        result['sandbox_peak_rss_mb'] = round(max([r.get('peak_rss_kb') or 0 for r in resources] + [0]) / 1024, 1)
+
+    if report_generator.sandbox_pool is not None:
+        report_generator.sandbox_pool.close()
+    return result
+
+
+def measure(name, args):
+    """Run a workload --runs times in fresh interpreters; keep the run of median wall time."""
+    env = dict(os.environ)
+    env.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+    env['LLM_BACKEND'] = 'fake'
+    env['LLM_FAKE_LATENCY_MS'] = str(args.llm_latency_ms)
+    env['RESPONSE_CACHE_ENABLED'] = '0'
+    env['REPORT_KEEP_INTERMEDIATE'] = '0'
+    child = [sys.executable, os.path.abspath(__file__), '--child', name, '--scale', str(args.scale)]
+    command = child + ['--profile-dir', args.profile_dir]
+    if args.profile:
+        command += ['--profile', args.profile]
+
+    runs = []
+    for _ in range(args.runs):
+        process = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, timeout=1800)
+        runs.append(child_result(name, process))
+    median = statistics.median_low([run['wall_ms'] for run in runs])
+    result = next(run for run in runs if run['wall_ms'] == median)
+    result['wall_ms_runs'] = [run['wall_ms'] for run in runs]
+
+    if not args.no_allocations:
+        process = subprocess.run(
+            child + ['--trace-allocations'],
+            cwd=ROOT, env=env, capture_output=True, text=True, timeout=1800
+        )
+        traced = child_result(name, process)
+        result['traced_peak_mb'] = traced['traced_peak_mb']
+        result['top_allocations'] = traced['top_allocations']
+    return result
+
+
+def child_result(name, process):
+    if process.returncode != 0:
+        raise SystemExit(f"Workload {name} failed:\n{process.stderr[-3000:]}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def commit_id():
+    """Current commit, with '+dirty' when the tree has uncommitted changes."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('+dirty' if dirty else '')
+
+
+def change(old, new):
+    if not old:
+        return ''
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def print_comparison(baseline, results):
+    """Change of the wall time of every workload and stage against baseline."""
+    print(f"\nAgainst {baseline.get('commit')} (stage times are summed wall times):")
+    previous = {workload['workload']: workload for workload in baseline['workloads']}
+    for workload in results['workloads']:
+        old = previous.get(workload['workload'])
+        if old is None:
+            continue
+        print(f"  {workload['workload']}: {old['wall_ms']} -> {workload['wall_ms']} ms {change(old['wall_ms'], workload['wall_ms'])}")
+        for stage, values in workload['stages'].items():
+            old_stage = old['stages'].get(stage)
+            if old_stage is not None:
+                print(f"    {stage:<20} {old_stage['wall_ms']:>8} -> {values['wall_ms']:>8} ms {change(old_stage['wall_ms'], values['wall_ms'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workload', nargs='+', choices=sorted(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplier of the workload sizes")
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--llm-latency-ms', type=float, default=0, help="median latency of the fake LLM calls")
+    parser.add_argument('--profile', choices=['cprofile', 'sample'])
+    parser.add_argument('--profile-dir', default='.', help="folder of the profiles")
+    parser.add_argument('--no-allocations', action='store_true', help="skip the run tracing allocations")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare with")
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--trace-allocations', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.profile_dir = os.path.abspath(args.profile_dir)
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.scale, args.profile, args.profile_dir, args.trace_allocations)))
+        return
+
+    results = {
+        'commit': commit_id(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'scale': args.scale,
+        'llm_latency_ms': args.llm_latency_ms,
+        'allocations_traced': not args.no_allocations,
+        'workloads': []
+    }
+    print(f"Commit {results['commit']}, scale {args.scale}, fake LLM latency {args.llm_latency_ms} ms, median of {args.runs} run(s)")
+    for name in args.workload:
+        result = measure(name, args)
+        results['workloads'].append(result)
+        print(f"\n{name}: {result['files']} files, {result['input_kb']} KB, {result['wall_ms']} ms wall, "
+              f"{result['cpu_ms']} ms CPU (+{result['sandbox_cpu_ms']} ms sandboxed), "
+              f"peak RSS {result['peak_rss_mb']} MB (sandbox {result['sandbox_peak_rss_mb']} MB)"
+              + (f", traced heap peak {result['traced_peak_mb']} MB" if 'traced_peak_mb' in result else ""))
+        print(f"  {'stage':<20} {'tasks':>6} {'wall ms':>9} {'span ms':>9} {'cpu ms':>9}")
+        for stage, values in result['stages'].items():
+            print(f"  {stage:<20} {values['tasks']:>6} {values['wall_ms']:>9} {values['span_ms']:>9} {values['cpu_ms']:>9}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Measure the prompt content trimmed by prompt_budget and the cost of trimming it.
+
+Usage: python benchmarks/bench_prompt_budget.py [--budget TOKENS] [--json]
+
+For each workload, prints the locally estimated tokens of the content before and
+after fitting it to the budget (Config.PROMPT_MAX_TOKENS by default), and the
+time the estimation and trimming take. When tiktoken is installed, the
+estimate is also compared with the cl100k_base count of the original content.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+
+import prompt_budget  # noqa: E402
+from config import Config  # noqa: E402
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except ImportError:
+    _encoding = None
+
+
+def data_heavy_python(rows=20000):
+    """A lab script embedding its measurements as a literal, then a few functions."""
+    parts = ['import math', '', 'MEASUREMENTS = [']
+    parts += [f"    ({i}, {math_value(i)}, {i % 7})," for i in range(rows)]
+    parts += [']', '']
+    for n in range(1, 11):
+        parts += [
+            f"def statistic_{n}(rows):",
+            f'    """Statistic number {n} of the measurements."""',
+            f"    return sum(value ** {n} for _, value, _ in rows) / len(rows)",
+            "",
+        ]
+    parts += ["if __name__ == '__main__':"]
+    parts += [f"    print(statistic_{n}(MEASUREMENTS))" for n in range(1, 11)]
+    return "\n".join(parts)
+
+
+def math_value(i):
+    return round((i * 37 % 101) / 7.3, 4)
+
+
+def many_functions_c(functions=400):
+    parts = ["#include <stdio.h>", ""]
+    for n in range(functions):
+        parts += [
+            f"int step_{n}(int *values, int count) {{",
+            "    int total = 0;",
+            "    for (int i = 0; i < count; i++) {",
+            f"        total += values[i] * {n} - i;",
+            "    }",
+            "    return total;",
+            "}",
+            "",
+        ]
+    parts += ["int main(void) {", "    int values[] = {1, 2, 3};", "    return step_0(values, 3);", "}"]
+    return "\n".join(parts)
+
+
+def long_instructions(paragraphs=600):
+    parts = ["TP 4 : Traitement du signal", "", "Objectifs : calculer et interpréter une FFT.", ""]
+    for n in range(paragraphs):
+        parts.append(
+            f"Partie {n % 12 + 1}. On considère le signal échantillonné à 1 kHz et on calcule sa transformée "
+            f"de Fourier discrète ; les valeurs mesurées sont données dans le tableau {n}."
+        )
+        parts += [f"{i}\t{i * 0.25:.2f}\t{(i * 13) % 17}" for i in range(8)]
+    parts.append("Exercice 12 : comparer les spectres obtenus.")
+    return "\n".join(parts)
+
+
+def measure(name, content, kind, language, budget):
+    start = time.perf_counter()
+    before = prompt_budget.estimate_tokens(content)
+    if kind == 'text':
+        fitted = prompt_budget.fit_text(content, budget)
+    else:
+        fitted = prompt_budget.fit_code(content, language, budget)
+    elapsed = time.perf_counter() - start
+    result = {
+        'workload': name,
+        'chars': len(content),
+        'estimated': before,
+        'fitted': prompt_budget.estimate_tokens(fitted),
+        'fit_ms': round(elapsed * 1000, 1)
+    }
+    if _encoding is not None:
+        result['tiktoken'] = len(_encoding.encode(content))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=int, default=Config.PROMPT_MAX_TOKENS)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'test_files', 'sample_code.py'), encoding='utf-8') as f:
+        sample = f.read()
+    workloads = [
+        ('sample_code.py', sample, 'code', 'python'),
+        ('data_heavy.py', data_heavy_python(), 'code', 'python'),
+        ('many_functions.c', many_functions_c(), 'code', 'c'),
+        ('instructions.txt', long_instructions(), 'text', None),
+    ]
+
+    print(f"Budget: {args.budget} tokens of content per prompt")
+    print(f"{'workload':<18} {'chars':>9} {'estimated':>10} {'tiktoken':>9} {'fitted':>8} {'fit ms':>8}")
+    results = []
+    for name, content, kind, language in workloads:
+        result = measure(name, content, kind, language, args.budget)
+        results.append(result)
+        print(f"{name:<18} {result['chars']:>9} {result['estimated']:>10} {result.get('tiktoken', '-'):>9} "
+              f"{result['fitted']:>8} {result['fit_ms']:>8}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
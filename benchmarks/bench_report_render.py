@@ -0,0 +1,143 @@
+"""Measure the assembly of the report HTML from its sections.
+
+Usage: python benchmarks/bench_report_render.py [--sections N ...] [--runs N] [--json]
+
+For reports of 10, 100 and 1000 sections (by default), times the Markdown and
+HTML assembly done before rendering, without writing any file:
+
+- whole: the Markdown of the whole report converted at once (no section cache);
+- cold: each section converted and cached, into an empty section cache;
+- warm: the same report again, every section found in the cache;
+- resubmit: a report where one section in ten changed since the cached one.
+
+Code blocks are highlighted when Pygments is installed (see section_render).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+
+import report_generator  # noqa: E402
+import section_render  # noqa: E402
+
+
+def make_report(sections, version=0, changed_every=0):
+    """lab_info and code_analyses of a report; with changed_every, every n-th section differs by version."""
+    with open(os.path.join(ROOT, 'test_files', 'sample_code.py'), encoding='utf-8') as f:
+        code = f.read()
+    explanation = "\n\n".join(
+        f"Paragraph {n} of the analysis: the **function** iterates over the input, keeps a running "
+        f"state and returns the computed sequence. " * 3 for n in range(4)
+    )
+    code_analyses = []
+    for i in range(sections):
+        changed = version if changed_every and i % changed_every == 0 else 0
+        code_analyses.append({
+            'filename': f"exercise_{i + 1}.py",
+            'language': 'python',
+            'code': code,
+            'code_block': f"# Exercise {i + 1}, version {changed}\n{code}",
+            'explanation': explanation,
+            'execution_results': {
+                'output': "Fibonacci sequence: [0, 1, 1, 2, 3, 5, 8, 13, 21, 34]\n" * 5,
+                'error': None,
+                'plots': [f"/reports/{version}/exercise_{i + 1}_figure_1.png"],
+                'plot_interpretations': {f"exercise_{i + 1}_figure_1.png": "The curve grows linearly."}
+            }
+        })
+    lab_info = {
+        'title': 'Benchmark Lab',
+        'objectives': ['Measure the report assembly'],
+        'exercises': [f"Exercise {i + 1}" for i in range(sections)]
+    }
+    return lab_info, code_analyses
+
+
+def render_whole(lab_info, code_analyses):
+    """The report converted as one Markdown document."""
+    md_content = report_generator.generate_markdown_content(lab_info, code_analyses)
+    return report_generator.get_report_template().render(
+        title=lab_info['title'],
+        highlight_css=section_render.highlight_css(),
+        sections=[section_render.markdown_to_html(md_content)]
+    )
+
+
+def render_sections(cache, lab_info, code_analyses):
+    """The report assembled like generate_pdf_report does, with cache."""
+    return report_generator.get_report_template().render(
+        title=lab_info['title'],
+        highlight_css=section_render.highlight_css(),
+        sections=[cache.render(md, images) for md, images in report_generator.report_sections(lab_info, code_analyses)]
+    )
+
+
+def timed(func, runs):
+    """Best wall time of runs calls of func, in milliseconds."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 1)
+
+
+def measure(sections, runs):
+    lab_info, code_analyses = make_report(sections)
+    resubmitted = make_report(sections, version=1, changed_every=10)
+
+    def cold():
+        render_sections(section_render.SectionCache(sections + 1), lab_info, code_analyses)
+
+    warm_cache = section_render.SectionCache(2 * sections + 2)
+    render_sections(warm_cache, lab_info, code_analyses)
+
+    def resubmit():
+        cache = section_render.SectionCache(2 * sections + 2)
+        render_sections(cache, lab_info, code_analyses)
+        start = time.perf_counter()
+        render_sections(cache, *resubmitted)
+        return time.perf_counter() - start
+
+    resubmit_ms = min(resubmit() for _ in range(runs)) * 1000
+    return {
+        'sections': sections,
+        'whole_ms': timed(lambda: render_whole(lab_info, code_analyses), runs),
+        'cold_ms': timed(cold, runs),
+        'warm_ms': timed(lambda: render_sections(warm_cache, lab_info, code_analyses), runs),
+        'resubmit_ms': round(resubmit_ms, 1),
+        'html_bytes': len(render_sections(warm_cache, lab_info, code_analyses).encode('utf-8'))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--runs', type=int, default=3, help="runs per measurement, the fastest is kept")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    # Converters and the template are loaded once per process, not measured
+    section_render.markdown_to_html("")
+    report_generator.get_report_template()
+
+    print(f"Pygments: {'yes' if section_render.highlight_css() else 'no'}, best of {args.runs}")
+    print(f"{'sections':>8} {'whole ms':>10} {'cold ms':>10} {'warm ms':>10} {'resubmit ms':>12} {'HTML KB':>9}")
+    results = []
+    for sections in args.sections:
+        result = measure(sections, args.runs)
+        results.append(result)
+        print(f"{sections:>8} {result['whole_ms']:>10} {result['cold_ms']:>10} {result['warm_ms']:>10}"
+              f" {result['resubmit_ms']:>12} {result['html_bytes'] / 1024:>9.0f}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare cold and warm execution of Python code in execute_python_code.
+
+Usage: python benchmarks/bench_sandbox.py [--runs N] [--pool-size N] [code_file]
+
+Cold runs start a fresh interpreter for every file (SANDBOX_WARM_POOL=0); warm
+runs go through the pre-imported sandbox pool. Plot interpretation is skipped,
+so no API call is made.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+
+import report_generator  # noqa: E402
+from sandbox import SandboxPool  # noqa: E402
+
+
+def time_runs(code_path, runs):
+    timings = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            results = report_generator.execute_python_code(code_path, output_dir, interpret_plots=False)
+            timings.append(time.perf_counter() - start)
+            if results['error'] and 'Traceback' in results['error']:
+                raise SystemExit(f"Benchmark script failed:\n{results['error']}")
+    return timings
+
+
+def report(name, timings):
+    print(f"{name:>5}: mean {statistics.mean(timings) * 1000:8.1f} ms"
+          f"  median {statistics.median(timings) * 1000:8.1f} ms"
+          f"  min {min(timings) * 1000:8.1f} ms  max {max(timings) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('code_file', nargs='?', default=os.path.join(ROOT, 'test_files', 'sample_code.py'))
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--pool-size', type=int, default=2)
+    args = parser.parse_args()
+
+    report_generator.sandbox_pool = None
+    cold = time_runs(args.code_file, args.runs)
+
+    pool = SandboxPool(size=args.pool_size)
+    pool.start()
+    report_generator.sandbox_pool = pool
+    time_runs(args.code_file, 1)  # Wait for the workers to finish their imports
+    warm = time_runs(args.code_file, args.runs)
+    pool.close()
+
+    print(f"{args.runs} runs of {os.path.basename(args.code_file)}")
+    report('cold', cold)
+    report('warm', warm)
+    print(f"speedup: {statistics.median(cold) / statistics.median(warm):.1f}x (median)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Load test of the upload-to-report path.
+
+Usage: python benchmarks/load_test.py [--requests N] [--concurrency N] [--url URL] [--json]
+
+Uploads the files of test_files/ to /upload (asking for a JSON answer) from
+--concurrency client threads until --requests reports were asked for, polls
+each job until it is done, and prints the p50/p95/p99 latency from upload to
+finished report and the throughput.
+
+Without --url the application is started in this process on a free port, with
+the offline LLM backend (LLM_BACKEND=fake, see fake_llm) and without the
+response cache, unless those are set in the environment. Its reports are
+written to uploads/ like any other. Use --url to load a running server, for
+example one started with LLM_BACKEND=stub in front of `python fake_llm.py`.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Seconds between two status requests of a job
+POLL_INTERVAL = 0.1
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of values."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def start_local_server(job_workers):
+    """Start the application in a thread and return its base URL."""
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    os.environ.setdefault('RESPONSE_CACHE_ENABLED', '0')
+    if job_workers:
+        os.environ['JOB_WORKERS'] = str(job_workers)
+    os.environ['JOB_MAX_PENDING'] = os.environ.get('JOB_MAX_PENDING', '100000')
+
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def load_files(folder):
+    """Instruction and code files to upload, read once."""
+    instruction, code = None, []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        if 'instruction' in name:
+            instruction = (name, data)
+        elif name.endswith(('.py', '.java', '.c', '.ipynb')):
+            code.append((name, data))
+    if instruction is None or not code:
+        raise SystemExit(f"No instruction and code files found in {folder}")
+    return instruction, code
+
+
+def run_one(session, base_url, instruction, code, timeout):
+    """Upload the files, wait for the report and return (status, upload seconds, total seconds)."""
+    files = [('instruction_file', instruction)] + [('code_files', item) for item in code]
+    start = time.perf_counter()
+    response = session.post(f"{base_url}/upload", files=files, headers={'Accept': 'application/json'})
+    uploaded = time.perf_counter() - start
+    if response.status_code == 503:
+        return 'rejected', uploaded, None
+    if response.status_code != 202:
+        return f"http_{response.status_code}", uploaded, None
+
+    status_url = base_url + response.json()['status_url']
+    while time.perf_counter() - start < timeout:
+        status = session.get(status_url).json()['status']
+        if status in ('done', 'failed'):
+            return status, uploaded, time.perf_counter() - start
+        time.sleep(POLL_INTERVAL)
+    return 'timeout', uploaded, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=40, help="reports to generate")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads")
+    parser.add_argument('--url', help="base URL of a running server (default: start one in process)")
+    parser.add_argument('--files', default=os.path.join(ROOT, 'test_files'), help="folder of the files to upload")
+    parser.add_argument('--job-workers', type=int, help="JOB_WORKERS of the in-process server")
+    parser.add_argument('--timeout', type=float, default=300, help="seconds to wait for one report")
+    parser.add_argument('--json', action='store_true', help="also print the results as JSON")
+    args = parser.parse_args()
+
+    instruction, code = load_files(args.files)
+    base_url = args.url.rstrip('/') if args.url else start_local_server(args.job_workers)
+
+    results = []
+    lock = threading.Lock()
+    remaining = [args.requests]
+
+    def client():
+        with requests.Session() as session:
+            while True:
+                with lock:
+                    if remaining[0] == 0:
+                        return
+                    remaining[0] -= 1
+                try:
+                    result = run_one(session, base_url, instruction, code, args.timeout)
+                except requests.RequestException as e:
+                    result = (f"error: {e.__class__.__name__}", None, None)
+                with lock:
+                    results.append(result)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [total for status, _, total in results if status == 'done']
+    uploads = [uploaded for _, uploaded, _ in results if uploaded is not None]
+    outcomes = {}
+    for status, _, _ in results:
+        outcomes[status] = outcomes.get(status, 0) + 1
+
+    summary = {
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'elapsed_s': round(elapsed, 2),
+        'outcomes': outcomes,
+        'throughput_per_s': round(len(latencies) / elapsed, 3) if elapsed else None,
+        'latency_s': {
+            name: round(percentile(latencies, fraction), 3) if latencies else None
+            for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+        },
+        'latency_mean_s': round(statistics.mean(latencies), 3) if latencies else None,
+        'upload_p50_s': round(percentile(uploads, 0.5), 4) if uploads else None
+    }
+
+    print(f"{args.requests} reports, {args.concurrency} clients, {elapsed:.1f} s against {base_url}")
+    print("outcomes: " + ", ".join(f"{status} {count}" for status, count in sorted(outcomes.items())))
+    if latencies:
+        latency = summary['latency_s']
+        print(f"latency: p50 {latency['p50']:.2f} s  p95 {latency['p95']:.2f} s  p99 {latency['p99']:.2f} s"
+              f"  (upload p50 {summary['upload_p50_s'] * 1000:.0f} ms)")
+        print(f"throughput: {summary['throughput_per_s']:.2f} reports/s")
+    if args.json:
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
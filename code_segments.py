@@ -0,0 +1,232 @@
+"""Local pre-segmentation of source files before code analysis.
+
+Files are split into top-level segments (functions, classes, blocks of module
+code) with the Python AST, or by brace matching for C and Java, so that only the
+segments relevant to an exercise are sent to the API.
+"""
+import ast
+import re
+
+# Words that say nothing about which code an exercise title refers to
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'from', 'into', 'using', 'use', 'of', 'to', 'a', 'an', 'in', 'on',
+    'exercise', 'exercice', 'part', 'partie', 'question', 'les', 'des', 'une', 'pour', 'avec', 'dans',
+    'code', 'program', 'programme', 'implementation', 'function', 'fonction'
+}
+
+
+def _segment(name, kind, lines, start_line, end_line):
+    return {
+        'name': name,
+        'kind': kind,
+        'start_line': start_line,
+        'end_line': end_line,
+        'text': '\n'.join(lines[start_line - 1:end_line])
+    }
+
+
+def segment_python(code):
+    """Split Python code into top-level definitions and runs of module-level statements."""
+    lines = code.splitlines()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return [_segment('module', 'module', lines, 1, len(lines))] if lines else []
+
+    segments = []
+    run_start = run_end = None
+    for node in tree.body:
+        start = node.lineno
+        if getattr(node, 'decorator_list', None):
+            start = min(d.lineno for d in node.decorator_list)
+        end = node.end_lineno
+
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if run_start is not None:
+                segments.append(_segment('module', 'module', lines, run_start, run_end))
+                run_start = None
+            kind = 'class' if isinstance(node, ast.ClassDef) else 'function'
+            segments.append(_segment(node.name, kind, lines, start, end))
+        else:
+            if run_start is None:
+                run_start = start
+            run_end = end
+
+    if run_start is not None:
+        segments.append(_segment('module', 'module', lines, run_start, run_end))
+    return segments
+
+
+def _strip_literals(line, in_comment):
+    """Remove comments and string/char literals from a C-like line, for brace counting."""
+    result = []
+    i = 0
+    while i < len(line):
+        if in_comment:
+            end = line.find('*/', i)
+            if end == -1:
+                return ''.join(result), True
+            i = end + 2
+            in_comment = False
+        elif line.startswith('/*', i):
+            in_comment = True
+            i += 2
+        elif line.startswith('//', i):
+            break
+        elif line[i] in '"\'':
+            quote = line[i]
+            i += 1
+            while i < len(line) and line[i] != quote:
+                i += 2 if line[i] == '\\' else 1
+            i += 1
+        else:
+            result.append(line[i])
+            i += 1
+    return ''.join(result), in_comment
+
+
+def _brace_blocks(lines, first_line, last_line):
+    """Find the blocks that open and close at depth 0 between two lines (1-based).
+
+    Returns (start_line, end_line, header) tuples; a block starts at the first line
+    after the previous block (or statement) so that signatures and comments above
+    the opening brace are included.
+    """
+    blocks = []
+    depth = 0
+    in_comment = False
+    block_start = None
+    header = ''
+    candidate_start = first_line
+    for number in range(first_line, last_line + 1):
+        stripped, in_comment = _strip_literals(lines[number - 1], in_comment)
+        for char in stripped:
+            if char == '{':
+                if depth == 0:
+                    block_start = candidate_start
+                    header = ' '.join(lines[i - 1].strip() for i in range(candidate_start, number + 1))
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0 and block_start is not None:
+                    blocks.append((block_start, number, header))
+                    block_start = None
+                    candidate_start = number + 1
+        if depth == 0 and block_start is None:
+            statement = stripped.strip()
+            # Statements and preprocessor lines end the header; leading blank lines (not comments) are skipped
+            blank = not lines[number - 1].strip()
+            if statement.endswith(';') or statement.startswith('#') or (blank and candidate_start == number):
+                candidate_start = number + 1
+    return blocks
+
+
+def _block_name(header):
+    """Guess the name of a C/Java block from its header (signature)."""
+    header = header.split('{')[0]
+    match = re.search(r'\b(class|interface|enum|struct)\s+(\w+)', header)
+    if match:
+        return match.group(2), 'class'
+    match = re.search(r'(\w+)\s*\([^()]*\)\s*(throws\s+[\w.,\s]+)?$', header.strip())
+    if match:
+        return match.group(1), 'function'
+    return 'block', 'block'
+
+
+def segment_braces(code):
+    """Split C or Java code into top-level blocks, descending one level into classes."""
+    lines = code.splitlines()
+    segments = []
+    for start, end, header in _brace_blocks(lines, 1, len(lines)):
+        name, kind = _block_name(header)
+        inner = []
+        if kind == 'class' and end - start > 1:
+            # Methods of a Java class: blocks between the class braces
+            open_line = next(n for n in range(start, end + 1) if '{' in _strip_literals(lines[n - 1], False)[0])
+            inner = _brace_blocks(lines, open_line + 1, end - 1)
+        if inner:
+            for inner_start, inner_end, inner_header in inner:
+                inner_name, inner_kind = _block_name(inner_header)
+                segments.append(_segment(f"{name}.{inner_name}", inner_kind, lines, inner_start, inner_end))
+        else:
+            segments.append(_segment(name, kind, lines, start, end))
+    if not segments and lines:
+        segments.append(_segment('module', 'module', lines, 1, len(lines)))
+    return segments
+
+
+def segment_code(code, language):
+    """Split code into segments for the given language."""
+    if language == 'python':
+        return segment_python(code)
+    if language in ('c', 'java'):
+        return segment_braces(code)
+    lines = code.splitlines()
+    return [_segment('module', 'module', lines, 1, len(lines))] if lines else []
+
+
+def _keywords(text):
+    """Lowercase words (and identifier parts) of at least 3 letters, without stopwords."""
+    words = set()
+    for word in re.findall(r'[A-Za-z_][A-Za-z0-9_]*', text):
+        parts = re.split(r'_|(?<=[a-z])(?=[A-Z])', word)
+        for part in [word] + parts:
+            part = part.lower()
+            if len(part) >= 3 and part not in STOPWORDS:
+                words.add(part)
+    return words
+
+
+def _exercise_number(title):
+    """Return the exercise number mentioned in a title ("Exercise 2: ..."), if any."""
+    match = re.search(r'\b(?:ex|exo|exercise|exercice|question|part|partie)\s*\.?\s*(\d+)', title, re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def select_segments(segments, exercise_title):
+    """Return the segments relevant to an exercise title, in file order.
+
+    Segments are scored on the keywords they share with the title (matches in the
+    segment name count triple) and on an "Exercise N" marker matching the title's
+    number. The best scoring segments are kept, together with the module-level
+    code that calls them. If nothing matches, every segment is returned.
+    """
+    title_words = _keywords(exercise_title or '')
+    number = _exercise_number(exercise_title or '')
+    if not title_words and number is None:
+        return segments
+
+    marker = None
+    if number is not None:
+        marker = re.compile(rf'\b(?:ex|exo|exercise|exercice|question|part|partie)\s*\.?\s*{number}\b', re.IGNORECASE)
+
+    scores = []
+    for segment in segments:
+        score = 3 * len(title_words & _keywords(segment['name'])) + len(title_words & _keywords(segment['text']))
+        if marker is not None and marker.search(segment['text']):
+            score += 5
+        scores.append(score)
+
+    best = max(scores, default=0)
+    if best == 0:
+        return segments
+    selected = {i for i, score in enumerate(scores) if score * 2 >= best}
+
+    names = {segments[i]['name'].split('.')[-1] for i in selected}
+    for i, segment in enumerate(segments):
+        if segment['kind'] == 'module' and any(re.search(rf'\b{re.escape(n)}\s*\(', segment['text']) for n in names):
+            selected.add(i)
+    return [segments[i] for i in sorted(selected)]
+
+
+def number_lines(segments):
+    """Render segments with their original line numbers, separating non-adjacent ones."""
+    rendered = []
+    previous_end = None
+    for segment in segments:
+        if previous_end is not None and segment['start_line'] > previous_end + 1:
+            rendered.append('...')
+        for offset, line in enumerate(segment['text'].split('\n')):
+            rendered.append(f"{segment['start_line'] + offset:4d} | {line}")
+        previous_end = segment['end_line']
+    return '\n'.join(rendered)
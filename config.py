@@ -18,10 +18,83 @@ class Config:
         'code': {'py', 'java', 'c', 'ipynb'}
     }
 
-    # DeepSeek API settings
+    # LLM backend: 'deepseek' (the API), 'stub' (fake_llm.py server) or 'fake' (in process, offline)
+    LLM_BACKEND = os.environ.get('LLM_BACKEND', 'deepseek')
+    LLM_STUB_URL = os.environ.get('LLM_STUB_URL', 'http://127.0.0.1:8089/v1/chat/completions')
+    LLM_FAKE_LATENCY_MS = float(os.environ.get('LLM_FAKE_LATENCY_MS', 200))  # Median latency of fake answers
+    LLM_FAKE_LATENCY_SIGMA = float(os.environ.get('LLM_FAKE_LATENCY_SIGMA', 0.5))  # Lognormal spread, 0 = constant
+    LLM_FAKE_ERROR_RATE = float(os.environ.get('LLM_FAKE_ERROR_RATE', 0))  # Fraction of fake calls failing
+    LLM_FAKE_SEED = int(os.environ.get('LLM_FAKE_SEED', 0))
+
+    # DeepSeek API settings (the key is checked when the client is created, see deepseek_client)
     DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY')
-    if not DEEPSEEK_API_KEY:
-        raise ValueError("ERROR: DeepSeek API key not found. Please set the DEEPSEEK_API_KEY environment variable in your .env file.")
+    DEEPSEEK_API_URL = os.environ.get('DEEPSEEK_API_URL', 'https://api.deepseek.com/v1/chat/completions')
+    DEEPSEEK_CONNECT_TIMEOUT = float(os.environ.get('DEEPSEEK_CONNECT_TIMEOUT', 5))  # Seconds
+    DEEPSEEK_READ_TIMEOUT = float(os.environ.get('DEEPSEEK_READ_TIMEOUT', 120))  # Seconds
+    DEEPSEEK_MAX_RETRIES = int(os.environ.get('DEEPSEEK_MAX_RETRIES', 4))  # Retries on 429/5xx and network errors
+    DEEPSEEK_MAX_CONCURRENCY = int(os.environ.get('DEEPSEEK_MAX_CONCURRENCY', 8))  # Requests in flight per process
+    DEEPSEEK_RATE_LIMIT = float(os.environ.get('DEEPSEEK_RATE_LIMIT', 0))  # Requests per second, 0 = unlimited
+
+    # API response cache settings
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1').lower() not in ('0', 'false', 'no')
+    RESPONSE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'responses.sqlite3')
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 7 * 24 * 3600))  # Seconds, 0 = never expire
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+    # Instruction text extraction settings
+    OCR_MAX_WORKERS = int(os.environ.get('OCR_MAX_WORKERS', 4))  # PDF pages sent to OCR in parallel
+    OCR_DPI = int(os.environ.get('OCR_DPI', 150))  # Resolution of rasterized PDF pages
+    PDF_TEXT_MIN_CHARS = int(os.environ.get('PDF_TEXT_MIN_CHARS', 20))  # Below this a page is OCRed
+
+    # Session storage settings
+    SESSION_DATABASE = os.path.join(UPLOAD_FOLDER, 'sessions.sqlite3')
+    SESSION_TTL = int(os.environ.get('SESSION_TTL', 7 * 24 * 3600))  # Seconds since last access, 0 = keep
+    UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 5 * 1024 * 1024 * 1024))  # Quota, 0 = unlimited
+    SESSION_SWEEP_INTERVAL = int(os.environ.get('SESSION_SWEEP_INTERVAL', 600))  # Seconds between sweeps
+
+    # Background job settings
+    JOB_DATABASE = os.path.join(UPLOAD_FOLDER, 'jobs.sqlite3')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # Reports generated in parallel per process
+    JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 100))  # Uploads refused beyond this backlog
+    JOB_EVENTS_MAX_SECONDS = int(os.environ.get('JOB_EVENTS_MAX_SECONDS', 30))  # Progress stream length before the client reconnects
+    WARMUP = os.environ.get('WARMUP', '0').lower() not in ('0', 'false', 'no')  # Preload the report generator at startup
+
+    # Report pipeline settings
+    REPORT_MAX_WORKERS = int(os.environ.get('REPORT_MAX_WORKERS', 4))  # Concurrent tasks per report
+    ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', 'single')  # 'single' (one JSON call) or 'two-step'
+    PROMPT_MAX_TOKENS = int(os.environ.get('PROMPT_MAX_TOKENS', 16000))  # Content tokens per API call, 0 = model context
+    NOTEBOOK_CHUNK_CHARS = int(os.environ.get('NOTEBOOK_CHUNK_CHARS', 24000))  # Larger notebooks are analyzed by chunks of cells
+    COALESCE_ENABLED = os.environ.get('COALESCE_ENABLED', '1').lower() not in ('0', 'false', 'no')  # Share identical work in flight
+
+    # Code execution settings
+    SANDBOX_WARM_POOL = os.environ.get('SANDBOX_WARM_POOL', '1').lower() not in ('0', 'false', 'no')
+    SANDBOX_POOL_SIZE = int(os.environ.get('SANDBOX_POOL_SIZE', 2))  # Pre-started executor processes
+    SANDBOX_MAX_RUNS = int(os.environ.get('SANDBOX_MAX_RUNS', 50))  # Runs before an executor is recycled
+    SANDBOX_RESOURCE_LIMITS = os.environ.get('SANDBOX_RESOURCE_LIMITS', '1').lower() not in ('0', 'false', 'no')
+    SANDBOX_MAX_MEMORY_MB = int(os.environ.get('SANDBOX_MAX_MEMORY_MB', 1024))  # Address space per run
+    SANDBOX_MAX_CPU_SECONDS = int(os.environ.get('SANDBOX_MAX_CPU_SECONDS', 30))
+    SANDBOX_MAX_FILE_MB = int(os.environ.get('SANDBOX_MAX_FILE_MB', 20))  # Largest file a run may write
+    SANDBOX_MAX_PROCESSES = int(os.environ.get('SANDBOX_MAX_PROCESSES', 64))  # Per user, see RLIMIT_NPROC
+    SANDBOX_MAX_OUTPUT_BYTES = int(os.environ.get('SANDBOX_MAX_OUTPUT_BYTES', 64 * 1024))  # Head + tail kept per stream
+    NOTEBOOK_REUSE_OUTPUTS = os.environ.get('NOTEBOOK_REUSE_OUTPUTS', '1').lower() not in ('0', 'false', 'no')  # Use stored outputs
+    PLOT_FORMAT = os.environ.get('PLOT_FORMAT', 'png')  # Format of captured figures (png or jpg)
+    PLOT_DPI = int(os.environ.get('PLOT_DPI', 100))
+    PLOT_MAX_PIXELS = int(os.environ.get('PLOT_MAX_PIXELS', 1200))  # Larger plots are downscaled to fit
+    PLOT_JPEG_QUALITY = int(os.environ.get('PLOT_JPEG_QUALITY', 85))
+    PLOT_DEDUP_DISTANCE = int(os.environ.get('PLOT_DEDUP_DISTANCE', 4))  # dHash bits, negative = exact matches only
+
+    # C and Java execution settings (see native_runner)
+    NATIVE_EXECUTION = os.environ.get('NATIVE_EXECUTION', '1').lower() not in ('0', 'false', 'no')
+    NATIVE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'native')
+    NATIVE_CACHE_MAX_BYTES = int(os.environ.get('NATIVE_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # Compiled builds kept
+    C_COMPILER = os.environ.get('C_COMPILER', 'gcc')
+    C_FLAGS = os.environ.get('C_FLAGS', '-O1 -std=gnu11').split()
+    JAVA_COMPILE_SERVER = os.environ.get('JAVA_COMPILE_SERVER', '1').lower() not in ('0', 'false', 'no')  # Warm javac
+    JAVA_OPTIONS = os.environ.get('JAVA_OPTIONS', '-XX:TieredStopAtLevel=1 -XX:+UseSerialGC -Xshare:auto').split()
 
     # PDF generation settings
     REPORT_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'report_template.html')
+    SECTION_CACHE_SIZE = int(os.environ.get('SECTION_CACHE_SIZE', 1024))  # Rendered report sections kept in memory, 0 = none
+    PDF_RENDERER = os.environ.get('PDF_RENDERER', 'auto')  # auto, weasyprint, wkhtmltopdf or html
+    REPORT_KEEP_INTERMEDIATE = os.environ.get('REPORT_KEEP_INTERMEDIATE', '0').lower() not in ('0', 'false', 'no')  # Also write lab_report.md/.html
+    REPORT_TIMINGS = os.environ.get('REPORT_TIMINGS', '0').lower() not in ('0', 'false', 'no')  # Write timings.json
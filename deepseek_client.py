@@ -0,0 +1,161 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+import metrics
+import payload_files
+
+# HTTP statuses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Spaces out calls so that at most `rate` of them start per second, across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
+class DeepSeekClient:
+    """Shared DeepSeek API client.
+
+    A single requests.Session keeps connections alive between calls. Every request
+    has connect/read timeouts, is retried with exponential backoff and full jitter
+    on 429/5xx and network errors, and waits on a semaphore bounding the number of
+    requests in flight across all threads. With rate_limit (requests per second),
+    attempts are also spaced out to stay under the API's rate limit.
+    """
+
+    def __init__(self, api_key, api_url, connect_timeout=5, read_timeout=120, max_retries=4,
+                 backoff_base=0.5, backoff_max=30, max_concurrency=8, rate_limit=0):
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _backoff(self, attempt, response=None):
+        """Seconds to wait before the next attempt, honouring Retry-After when sent."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def chat(self, payload):
+        """Send a chat completion request and return the decoded JSON response."""
+        model = payload.get('model', '')
+        outcome = 'error'
+        try:
+            with metrics.API_SECONDS.time(model=model):
+                data = self._send(payload, model)
+            outcome = 'ok'
+            return data
+        finally:
+            metrics.API_REQUESTS.inc(model=model, outcome=outcome)
+
+    def _send(self, payload, model):
+        # Payloads embedding files are streamed instead of serialized in memory
+        parts = payload_files.json_parts(payload) if payload_files.contains_files(payload) else None
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+            try:
+                with self._semaphore:
+                    if parts is not None:
+                        response = self.session.post(self.api_url, data=payload_files.JsonBody(parts), timeout=self.timeout)
+                    else:
+                        response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise
+                metrics.API_RETRIES.inc(model=model, reason='network')
+                print(f"DeepSeek request failed ({str(e)}), retrying")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            metrics.API_REQUEST_BYTES.inc(len(response.request.body or b''), model=model)
+            metrics.API_RESPONSE_BYTES.inc(len(response.content), model=model)
+            if response.status_code in RETRY_STATUSES and not last_attempt:
+                metrics.API_RETRIES.inc(model=model, reason=str(response.status_code))
+                print(f"DeepSeek returned HTTP {response.status_code}, retrying")
+                time.sleep(self._backoff(attempt, response))
+                continue
+
+            response.raise_for_status()  # Raise an exception for HTTP errors
+            return response.json()
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client, creating it from Config on first use.
+
+    Config.LLM_BACKEND selects the DeepSeek API, the local stub server or the
+    in-process fake (see fake_llm).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client(Config.LLM_BACKEND)
+    return _client
+
+
+def create_client(backend):
+    """Create the client of an LLM backend from Config."""
+    if backend == 'fake':
+        import fake_llm
+        return fake_llm.FakeClient(fake_llm.FaultModel(
+            Config.LLM_FAKE_LATENCY_MS,
+            Config.LLM_FAKE_LATENCY_SIGMA,
+            Config.LLM_FAKE_ERROR_RATE,
+            Config.LLM_FAKE_SEED
+        ))
+    if backend == 'stub':
+        api_key, api_url = Config.DEEPSEEK_API_KEY or 'stub', Config.LLM_STUB_URL
+    elif backend == 'deepseek':
+        if not Config.DEEPSEEK_API_KEY:
+            raise ValueError("ERROR: DeepSeek API key not found. Please set the DEEPSEEK_API_KEY environment variable in your .env file.")
+        api_key, api_url = Config.DEEPSEEK_API_KEY, Config.DEEPSEEK_API_URL
+    else:
+        raise ValueError(f"Unknown LLM backend: {backend}")
+    return DeepSeekClient(
+        api_key,
+        api_url,
+        connect_timeout=Config.DEEPSEEK_CONNECT_TIMEOUT,
+        read_timeout=Config.DEEPSEEK_READ_TIMEOUT,
+        max_retries=Config.DEEPSEEK_MAX_RETRIES,
+        max_concurrency=Config.DEEPSEEK_MAX_CONCURRENCY,
+        rate_limit=Config.DEEPSEEK_RATE_LIMIT
+    )
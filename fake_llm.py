@@ -0,0 +1,218 @@
+"""Offline stand-in for the DeepSeek API, for load tests and development.
+
+FakeClient answers chat payloads in process, with the same interface as
+DeepSeekClient; `python fake_llm.py` serves the same answers over HTTP as a
+local stub of the chat completions endpoint, so that the real client (pooling,
+retries, rate limiting) can be exercised too.
+
+Answers are deterministic: they only depend on the payload, and are shaped like
+what each caller of chat_completion expects (lab info JSON, structured analysis
+JSON, extracted code, explanations, OCR text). Latency follows a lognormal
+distribution around a median, and a fraction of calls fail like the API does
+(HTTP 429/503); both are drawn from a random generator seeded by `seed`.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import metrics
+import payload_files
+import prompt_budget
+
+# Statuses of the failures drawn by FakeClient and the stub server
+ERROR_STATUSES = (429, 503)
+
+_NUMBERED_LINE = re.compile(r'^\s*(\d+) \| ', re.MULTILINE)
+_EXERCISE = re.compile(r'^\W*((?:exercise|exercice|question|part|partie)\s*\d+\b.*)$', re.IGNORECASE | re.MULTILINE)
+_FENCED = re.compile(r'```[^\n]*\n(.*?)\n```', re.DOTALL)
+
+
+def _prompt(payload):
+    """System and user text of a payload, and whether it embeds an image."""
+    system, user, has_image = '', '', False
+    for message in payload.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, list):
+            has_image = has_image or any(part.get('type') == 'image_url' for part in content)
+            content = ' '.join(part.get('text', '') for part in content if part.get('type') == 'text')
+        if message.get('role') == 'system':
+            system += content or ''
+        else:
+            user += content or ''
+    return system, user, has_image
+
+
+def _lab_info(text):
+    # The instructions follow the request, after its first blank line
+    body = text.split('\n\n', 1)[-1]
+    lines = [line.strip(' #*\t') for line in body.split('\n')]
+    title = next((line for line in lines if line), 'Lab Report')
+    exercises = [match.group(1).strip(' #*') for match in _EXERCISE.finditer(body)]
+    objectives = [line for line in lines if re.match(r'^\d+\.\s', line)][:5]
+    return {
+        'title': title[:120],
+        'objectives': [re.sub(r'^\d+\.\s*', '', line) for line in objectives] or ['Analyze and document code functionality'],
+        'exercises': exercises or ['Code Analysis']
+    }
+
+
+def fake_content(payload):
+    """Deterministic answer to a chat payload, shaped for the caller that sent it."""
+    system, user, has_image = _prompt(payload)
+    digest = hashlib.sha256()
+    for chunk in payload_files.iter_bytes(payload_files.json_parts(payload, sort_keys=True)):
+        digest.update(chunk)
+    digest = digest.hexdigest()[:8]
+
+    if payload.get('response_format', {}).get('type') == 'json_object':
+        numbers = [int(n) for n in _NUMBERED_LINE.findall(user)] or [1]
+        return json.dumps({
+            'start_line': min(numbers),
+            'end_line': max(numbers),
+            'explanation': f"Offline analysis {digest}: this code defines the structures and functions of the exercise "
+                           f"(lines {min(numbers)}-{max(numbers)})."
+        })
+    if 'lab instructions' in system:
+        return json.dumps(_lab_info(user))
+    if has_image and 'Extract all the text' in user:
+        return f"Lab Report\n\nObjectives\n1. Offline OCR {digest}\n\nExercise 1: Code Analysis\n"
+    if has_image:
+        return f"Offline interpretation {digest}: the plot shows how the computed values evolve along the x axis."
+    if user.startswith('Extract the code block'):
+        match = _FENCED.search(user)
+        return match.group(1) if match else ''
+    return f"Offline analysis {digest}: the code reads its inputs, computes the results and prints them."
+
+
+def fake_response(payload):
+    """Chat completion response body for a payload, with token usage estimated locally."""
+    content = fake_content(payload)
+    prompt_tokens = prompt_budget.estimate_payload_tokens(payload)
+    completion_tokens = prompt_budget.estimate_tokens(content)
+    return {
+        'id': 'fake-' + hashlib.sha256(content.encode('utf-8')).hexdigest()[:12],
+        'object': 'chat.completion',
+        'model': payload.get('model', ''),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+    }
+
+
+class FaultModel:
+    """Draws the latency and the failures of fake API calls."""
+
+    def __init__(self, latency_ms=200, latency_sigma=0.5, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """Return (seconds to wait, HTTP error status or None) for one call."""
+        with self._lock:
+            latency = self.latency_ms / 1000
+            if self.latency_sigma:
+                latency *= math.exp(self._random.gauss(0, self.latency_sigma))
+            failed = self._random.random() < self.error_rate
+            status = self._random.choice(ERROR_STATUSES) if failed else None
+        return latency, status
+
+
+class FakeClient:
+    """In-process stand-in for DeepSeekClient, with drawn latency and failures."""
+
+    def __init__(self, faults=None):
+        self.faults = faults or FaultModel()
+
+    def chat(self, payload):
+        """Answer a chat completion request like DeepSeekClient.chat, without the network."""
+        model = payload.get('model', '')
+        outcome = 'error'
+        try:
+            with metrics.API_SECONDS.time(model=model):
+                latency, status = self.faults.draw()
+                time.sleep(latency)
+                if status is not None:
+                    raise requests.HTTPError(f"{status} Error: fake failure for url: fake://{model}")
+                data = fake_response(payload)
+            outcome = 'ok'
+            return data
+        finally:
+            metrics.API_REQUESTS.inc(model=model, outcome=outcome)
+
+    def close(self):
+        pass
+
+
+def make_handler(faults):
+    """Request handler class of the stub server."""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            latency, status = faults.draw()
+            time.sleep(latency)
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                status = 400
+            if status is not None:
+                data = {'error': {'message': f"Stub error {status}", 'code': status}}
+            else:
+                data = fake_response(payload)
+            answer = json.dumps(data).encode('utf-8')
+            self.send_response(status or 200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(answer)))
+            self.end_headers()
+            self.wfile.write(answer)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def serve(host='127.0.0.1', port=8089, faults=None):
+    """Create the stub server (serve_forever() runs it)."""
+    return ThreadingHTTPServer((host, port), make_handler(faults or FaultModel()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub of the DeepSeek chat completions API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=200, help="median latency of an answer")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="spread of the lognormal latency, 0 = constant")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered 429/503")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    faults = FaultModel(args.latency_ms, args.latency_sigma, args.error_rate, args.seed)
+    server = serve(args.host, args.port, faults)
+    print(f"DeepSeek stub listening on http://{args.host}:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+import json
+from contextlib import closing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when the queue already holds the maximum number of pending jobs."""
+
+
+class JobQueue:
+    """SQLite-backed job queue processed by a bounded pool of worker threads.
+
+    The queue lives in a local SQLite file so that several server processes can
+    share it: a job is claimed atomically by exactly one worker, whichever process
+    it runs in.
+
+    A running job records its owner (the pid of its process and a token of the
+    queue instance), and a monitor thread refreshes its heartbeat every
+    heartbeat_interval seconds. Running jobs whose owner process is gone, or whose
+    heartbeat is older than stale_after seconds, were abandoned (by a restart or a
+    crash): the monitor requeues them, or fails them after max_attempts claims.
+    """
+
+    def __init__(self, db_path, handler, num_workers=2, max_pending=100, poll_interval=1.0,
+                 stale_after=120, heartbeat_interval=15, max_attempts=3):
+        self.db_path = db_path
+        self.handler = handler
+        self.num_workers = num_workers
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.heartbeat_interval = heartbeat_interval
+        self.max_attempts = max_attempts
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:12]}"
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in (('owner', 'TEXT'), ('heartbeat_at', 'REAL'), ('attempts', 'INTEGER NOT NULL DEFAULT 0')):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id)")
+
+    def start(self):
+        """Requeue jobs abandoned by a dead process and start the worker and monitor threads."""
+        if self._threads:
+            return
+        self.recover_orphans()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker, name=f"report-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._monitor, name="report-queue-monitor", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Ask the worker threads to exit once their current job is done."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, session_id, **payload):
+        """Queue a job and return its id without waiting for it to run."""
+        job_id = str(uuid.uuid4())
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                conn.execute("ROLLBACK")
+                raise QueueFull(f"{pending} jobs already pending")
+            conn.execute(
+                "INSERT INTO jobs (id, session_id, status, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, session_id, QUEUED, json.dumps(payload), time.time())
+            )
+            conn.execute("COMMIT")
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def active_sessions(self):
+        """Return the session ids of the queued and running jobs."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT session_id FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row['session_id'] for row in rows]
+
+    def add_event(self, job_id, event):
+        """Store a progress event of a job."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO job_events (job_id, data, created_at) VALUES (?, ?, ?)",
+                (job_id, json.dumps(event), time.time())
+            )
+
+    def get_events(self, job_id, after=0):
+        """Return the (event id, event) pairs of a job stored after event id `after`."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, data FROM job_events WHERE job_id = ? AND id > ? ORDER BY id", (job_id, after)
+            ).fetchall()
+        return [(row['id'], json.loads(row['data'])) for row in rows]
+
+    def purge(self, max_age):
+        """Delete the jobs finished more than max_age seconds ago, with their events (0 = keep all).
+
+        Returns the number of jobs deleted.
+        """
+        if not max_age:
+            return 0
+        cutoff = time.time() - max_age
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM job_events WHERE job_id IN "
+                "(SELECT id FROM jobs WHERE status IN (?, ?) AND finished_at < ?)",
+                (DONE, FAILED, cutoff)
+            )
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (DONE, FAILED, cutoff)
+            ).rowcount
+            conn.execute("COMMIT")
+        return deleted
+
+    def _owner_alive(self, owner):
+        """Return True if the queue instance owner may still be running its jobs."""
+        if owner == self.owner:
+            return True
+        pid, _, _ = (owner or '').partition(':')
+        if not pid.isdigit() or int(pid) == os.getpid():
+            # Another instance of this process (a pid reused after a restart): it is gone
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def heartbeat(self):
+        """Refresh the heartbeat of the jobs this queue is running."""
+        with self._running_lock:
+            running = list(self._running)
+        if not running:
+            return
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND owner = ?",
+                [(time.time(), job_id, self.owner) for job_id in running]
+            )
+
+    def recover_orphans(self):
+        """Requeue (or fail, after max_attempts) the running jobs no live worker owns.
+
+        Returns the number of jobs recovered.
+        """
+        now = time.time()
+        recovered = 0
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, owner, heartbeat_at, started_at, attempts FROM jobs WHERE status = ?", (RUNNING,)
+            ).fetchall()
+            for row in rows:
+                with self._running_lock:
+                    if row['id'] in self._running:
+                        continue
+                last_seen = row['heartbeat_at'] or row['started_at'] or 0
+                if self._owner_alive(row['owner']) and last_seen >= now - self.stale_after:
+                    continue
+                if row['attempts'] >= self.max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                        (FAILED, f"Abandoned by its worker {row['attempts']} times", now, row['id'])
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, heartbeat_at = NULL WHERE id = ?",
+                        (QUEUED, row['id'])
+                    )
+                recovered += 1
+            conn.execute("COMMIT")
+        if recovered:
+            print(f"Recovered {recovered} abandoned job(s)")
+            self._wakeup.set()
+        return recovered
+
+    def _monitor(self):
+        while not self._stopping.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+                self.recover_orphans()
+            except sqlite3.Error as e:
+                print(f"Error monitoring jobs: {str(e)}")
+
+    def _claim(self):
+        """Atomically move the oldest queued job to the running state, owned by this queue."""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, owner = ?, heartbeat_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, now, self.owner, now, row['id'])
+            )
+            conn.execute("COMMIT")
+            with self._running_lock:
+                self._running.add(row['id'])
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def _finish(self, job_id, status, result=None, error=None):
+        """Record the outcome of a job.
+
+        The job stops being heartbeated even if that fails, so that it is recovered
+        as an orphan instead of staying running forever.
+        """
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND owner = ?",
+                    (status, result, error, time.time(), job_id, self.owner)
+                )
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            # An error, such as "database is locked", must not end the thread
+            try:
+                job = self._claim()
+                if job is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+
+                try:
+                    result = self.handler(job)
+                except Exception as e:
+                    print(f"Error running job {job['id']}: {str(e)}")
+                    self._finish(job['id'], FAILED, error=str(e))
+                else:
+                    self._finish(job['id'], DONE, result=result)
+            except Exception as e:
+                print(f"Error in job worker: {str(e)}")
+                self._stopping.wait(self.poll_interval)
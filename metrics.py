@@ -0,0 +1,127 @@
+"""Process-wide counters and histograms, exposed in the Prometheus text format.
+
+The report pipeline records API calls (by model), sandbox runs, stage durations
+and errors here; app.py serves them on /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the duration histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_metrics = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing value per combination of label values."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Distribution of observed values (durations in seconds by default) per label values."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            # The last two slots are the observation count and their sum
+            counts[-2] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        for key, counts in sorted(values.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(bound))])} {count}"
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {counts[-2]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {counts[-2]}"
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+# Report pipeline metrics
+STAGE_SECONDS = Histogram('labreport_stage_seconds', 'Duration of report generation stages.', ['stage', 'status'])
+ERRORS = Counter('labreport_errors_total', 'Errors caught and replaced by a fallback, by stage.', ['stage'])
+API_REQUESTS = Counter('labreport_api_requests_total', 'DeepSeek API requests by outcome.', ['model', 'outcome'])
+API_SECONDS = Histogram('labreport_api_request_seconds', 'Duration of DeepSeek API requests, retries included.', ['model'])
+API_REQUEST_BYTES = Counter('labreport_api_request_bytes_total', 'Bytes sent in DeepSeek API request bodies.', ['model'])
+API_RESPONSE_BYTES = Counter('labreport_api_response_bytes_total', 'Bytes received in DeepSeek API responses.', ['model'])
+API_RETRIES = Counter('labreport_api_retries_total', 'DeepSeek API attempts retried, by reason.', ['model', 'reason'])
+PROMPT_TOKENS = Histogram(
+    'labreport_prompt_tokens', 'Prompt tokens of DeepSeek API calls, estimated locally.', ['model'],
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+)
+PROMPT_TOKENS_TRIMMED = Counter('labreport_prompt_tokens_trimmed_total', 'Estimated tokens removed from prompts to fit their budget.', ['kind'])
+COALESCED_CALLS = Counter('labreport_coalesced_calls_total', 'Calls answered by an identical call already in flight, by stage.', ['stage'])
+API_TOKENS = Counter('labreport_api_tokens_total', 'Tokens reported by the DeepSeek API.', ['model', 'kind'])
+SECTION_RENDERS = Counter('labreport_section_renders_total', 'Report sections converted to HTML or found in the render cache.', ['outcome'])
+SANDBOX_RUNS = Counter('labreport_sandbox_runs_total', 'Code executions by outcome.', ['outcome'])
+NATIVE_BUILDS = Counter('labreport_native_builds_total', 'C and Java builds by language and outcome (compiled, failed, cached).', ['language', 'outcome'])
+SANDBOX_SECONDS = Histogram('labreport_sandbox_run_seconds', 'Wall time of code executions.')
+SANDBOX_CPU_SECONDS = Counter('labreport_sandbox_cpu_seconds_total', 'CPU time used by executed code.')
@@ -0,0 +1,389 @@
+"""Compilation and execution of C and Java submissions.
+
+C files are compiled with a C compiler (gcc by default) and Java files with
+javac, then run in the sandbox (see sandbox) under the same resource limits and
+output capture as Python code. Builds are cached on disk, keyed by a hash of the
+source, the toolchain and its options: a file compiled before (the starter code
+uploaded by a whole class, a resubmitted report) runs without being compiled
+again. Failed builds are cached with their diagnostics too, and identical builds
+running at the same time are done once (see single_flight).
+
+Java sources are compiled by a long-lived compile server (CompileServer.java),
+which keeps javac loaded in one warm JVM, instead of starting a JVM and a cold
+compiler for every file; javac itself is used if the server cannot start.
+Programs still run each in their own JVM, started with options that shorten its
+startup, so that submitted code never shares a process.
+"""
+import base64
+import hashlib
+import json
+import os
+import queue
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+import metrics
+from sandbox import apply_limits
+from single_flight import SingleFlight
+
+LANGUAGES = ('c', 'java')
+
+COMPILE_SERVER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CompileServer.java')
+
+# Limits that do not apply to a JVM: it reserves far more address space than it
+# uses (its heap is capped with -Xmx instead) and counts its threads as processes
+JVM_UNLIMITED = ('RLIMIT_AS', 'RLIMIT_NPROC')
+
+# Limits that do not apply to the compile server either: its CPU time adds up over
+# all the compilations it serves (each one is bounded by the compile timeout)
+SERVER_UNLIMITED = JVM_UNLIMITED + ('RLIMIT_CPU',)
+
+_COMMENTS = re.compile(r'/\*.*?\*/|//[^\n]*', re.DOTALL)
+_LITERALS = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)+\'')
+_TYPE = re.compile(r'\b(?:class|interface|enum|record)\s+([A-Za-z_$][\w$]*)')
+_PUBLIC_TYPE = re.compile(r'\bpublic\s+(?:(?:final|abstract|static|strictfp)\s+)*(?:class|interface|enum|record)\s+([A-Za-z_$][\w$]*)')
+_MAIN = re.compile(r'\bstatic\s+(?:final\s+)?void\s+main\s*\(')
+_PACKAGE = re.compile(r'^\s*package\s+([\w.]+)\s*;', re.MULTILINE)
+_C_FILENAME = re.compile(r'\w[\w.+-]*\.c')
+
+
+def _is_open(code, start, end):
+    """Whether the brace at start is still unclosed at end."""
+    depth = 0
+    for brace in re.finditer(r'[{}]', code[start:end]):
+        depth += 1 if brace.group() == '{' else -1
+        if depth == 0:
+            return False
+    return True
+
+
+def java_entry_point(source):
+    """Return (file name, main class) of a Java source, from its declarations.
+
+    The file must be named after its public class for javac; the main class is
+    the outermost class declaring main(), qualified with the package.
+    """
+    code = _LITERALS.sub('""', _COMMENTS.sub(' ', source))
+    main = _MAIN.search(code)
+    main_class = None
+    for match in _TYPE.finditer(code):
+        body = code.find('{', match.end())
+        if main is None or body < 0 or body > main.start():
+            continue
+        # The type contains main() if its body is still open there
+        if _is_open(code, body, main.start()):
+            main_class = match.group(1)
+            break
+    public = _PUBLIC_TYPE.search(code)
+    if main_class is None:
+        declared = public or _TYPE.search(code)
+        main_class = declared.group(1) if declared else 'Main'
+    filename = f"{public.group(1) if public else main_class}.java"
+    package = _PACKAGE.search(code)
+    return filename, f"{package.group(1)}.{main_class}" if package else main_class
+
+
+def jvm_heap(limits):
+    """JVM option capping the heap at the address space limit of limits, if any."""
+    if 'RLIMIT_AS' not in limits:
+        return []
+    return [f"-Xmx{limits['RLIMIT_AS'] // (1024 * 1024)}m"]
+
+
+def _tool_id(executable):
+    """Identify an installed tool by its resolved path and modification time."""
+    path = shutil.which(executable)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    return f"{path}@{os.stat(path).st_mtime_ns}"
+
+
+class JavaCompileServer:
+    """Parent-side handle of CompileServer, started on first use.
+
+    The server runs under limits (see sandbox.make_limits) with its heap capped
+    to their address space, and exits on OutOfMemoryError: a compilation that
+    exhausts memory costs a restart, not the later builds.
+    """
+
+    def __init__(self, java, javac, cache_dir, java_options=(), start_timeout=60, limits=None):
+        self.java = java
+        self.javac = javac
+        self.cache_dir = cache_dir
+        self.java_options = list(java_options)
+        self.start_timeout = start_timeout
+        self.limits = limits or {}
+        self.process = None
+        self._lines = None
+        self._lock = threading.Lock()
+
+    def _server_classes(self):
+        """Compile CompileServer.java once into the cache and return its class directory."""
+        with open(COMPILE_SERVER_SOURCE, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+        class_dir = os.path.join(self.cache_dir, f"compile-server-{digest}")
+        if not os.path.exists(os.path.join(class_dir, 'CompileServer.class')):
+            os.makedirs(class_dir, exist_ok=True)
+            subprocess.run(
+                [self.javac, '-d', class_dir, COMPILE_SERVER_SOURCE],
+                check=True, capture_output=True, timeout=self.start_timeout
+            )
+        return class_dir
+
+    def _read(self, process, lines):
+        for line in process.stdout:
+            lines.put(line.rstrip('\n'))
+        lines.put(None)  # Server exited
+
+    def _start(self):
+        kwargs = {}
+        if os.name == 'posix':
+            limits = {name: value for name, value in self.limits.items() if name not in SERVER_UNLIMITED}
+            kwargs = {'start_new_session': True, 'preexec_fn': lambda: apply_limits(limits)}
+        options = self.java_options + jvm_heap(self.limits) + ['-XX:+ExitOnOutOfMemoryError']
+        self.process = subprocess.Popen(
+            [self.java] + options + ['-cp', self._server_classes(), 'CompileServer'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            **kwargs
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process, self._lines), daemon=True).start()
+        self._receive(self.start_timeout, expected='ready')
+
+    def _receive(self, timeout, expected=None):
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            self.close()
+            raise subprocess.TimeoutExpired('CompileServer', timeout)
+        if line is None or (expected is not None and line != expected):
+            self.close()
+            raise RuntimeError(f"Java compile server stopped: {line or 'exited'}")
+        return line
+
+    def start(self):
+        """Start the server ahead of the first compilation."""
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+
+    def compile(self, source_dir, class_dir, timeout=60):
+        """Compile the .java files of source_dir into class_dir; returns (compiled, diagnostics)."""
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            self.process.stdin.write(f"{source_dir}\t{class_dir}\n")
+            self.process.stdin.flush()
+            status, _, diagnostics = self._receive(timeout).partition(' ')
+        return status == '0', base64.b64decode(diagnostics).decode('utf-8', errors='replace')
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            if os.name == 'posix':
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.wait()
+        self.process = None
+
+
+class NativeRunner:
+    """Builds C and Java files into a cache and runs them with a sandbox runner.
+
+    run is SandboxPool.run or sandbox.run_cold; compile_limits are the resource
+    limits of the compilers (see sandbox.make_limits).
+    """
+
+    def __init__(self, cache_dir, run, c_compiler='gcc', c_flags=('-O1', '-std=gnu11'), java='java', javac='javac',
+                 java_options=(), compile_server=True, compile_limits=None, compile_timeout=60,
+                 max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self._run = run
+        self.c_compiler = c_compiler
+        self.c_flags = list(c_flags)
+        self.java = java
+        self.javac = javac
+        self.java_options = list(java_options)
+        self.compile_limits = compile_limits or {}
+        self.compile_timeout = compile_timeout
+        self.max_bytes = max_bytes
+        self.server = None
+        if compile_server:
+            self.server = JavaCompileServer(java, javac, cache_dir, java_options, limits=self.compile_limits)
+        self._builds = SingleFlight()
+        self._prune_lock = threading.Lock()
+
+    def available(self, language):
+        """Return True if the toolchain of language is installed."""
+        if language == 'c':
+            return shutil.which(self.c_compiler) is not None
+        if language == 'java':
+            return shutil.which(self.javac) is not None and shutil.which(self.java) is not None
+        return False
+
+    def _key(self, language, source, filename):
+        if language == 'c':
+            toolchain = [_tool_id(self.c_compiler), self.c_flags]
+        else:
+            toolchain = [_tool_id(self.javac)]
+        # The file name is part of the diagnostics (and of Java class names)
+        data = json.dumps([language, toolchain, filename]).encode('utf-8') + b'\0' + source
+        return hashlib.sha256(data).hexdigest()
+
+    def build(self, language, code_path):
+        """Compile a source file, or find its build in the cache.
+
+        Returns the build: a dict with dir (the cached build directory), compiled,
+        diagnostics, main (Java main class), compile_ms and cached.
+        """
+        with open(code_path, 'rb') as f:
+            source = f.read()
+        # C files are compiled under their own name, so that diagnostics refer to it
+        filename, main_class = os.path.basename(code_path), None
+        if not _C_FILENAME.fullmatch(filename):
+            filename = 'main.c'
+        if language == 'java':
+            filename, main_class = java_entry_point(source.decode('utf-8', errors='replace'))
+        key = self._key(language, source, filename)
+        build_dir = os.path.join(self.cache_dir, key[:2], key)
+        info_path = os.path.join(build_dir, 'build.json')
+
+        cached = os.path.exists(info_path)
+        if not cached:
+            self._builds.do('build', key, self._compile, language, source, filename, build_dir)
+        with open(info_path, 'r', encoding='utf-8') as f:
+            build = json.load(f)
+        if cached:
+            os.utime(info_path)  # Most recently used, for pruning
+        metrics.NATIVE_BUILDS.inc(language=language, outcome='cached' if cached else 'compiled' if build['compiled'] else 'failed')
+        return dict(build, dir=build_dir, main=main_class, cached=cached)
+
+    def _compile(self, language, source, filename, build_dir):
+        """Compile into a private directory, then publish it as build_dir in one rename."""
+        if os.path.exists(build_dir):
+            return  # Built by another process meanwhile
+        os.makedirs(os.path.dirname(build_dir), exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix='.build-', dir=os.path.dirname(build_dir))
+        try:
+            with open(os.path.join(work_dir, filename), 'wb') as f:
+                f.write(source)
+            start = time.perf_counter()
+            if language == 'c':
+                compiled, diagnostics = self._compile_c(work_dir, filename)
+            else:
+                compiled, diagnostics = self._compile_java(work_dir, filename)
+            with open(os.path.join(work_dir, 'build.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'compiled': compiled,
+                    'diagnostics': diagnostics,
+                    'compile_ms': round((time.perf_counter() - start) * 1000, 1)
+                }, f)
+            try:
+                os.rename(work_dir, build_dir)
+            except OSError:
+                pass  # Published by another process first
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        self._prune(keep=build_dir)
+
+    def _compile_c(self, work_dir, filename):
+        result = self._run(
+            work_dir, filename, timeout=self.compile_timeout, limits=self.compile_limits,
+            command=[self.c_compiler] + self.c_flags + ['-o', 'program', filename, '-lm']
+        )
+        diagnostics = result['stderr'] + ("\nCompilation timed out" if result['timed_out'] else "")
+        return result['returncode'] == 0 and os.path.exists(os.path.join(work_dir, 'program')), diagnostics
+
+    def _compile_java(self, work_dir, filename):
+        source_dir = os.path.join(work_dir, 'src')
+        class_dir = os.path.join(work_dir, 'classes')
+        os.makedirs(source_dir)
+        os.makedirs(class_dir)
+        os.replace(os.path.join(work_dir, filename), os.path.join(source_dir, filename))
+        if self.server is not None:
+            try:
+                return self.server.compile(source_dir, class_dir, self.compile_timeout)
+            except Exception as e:
+                print(f"Error compiling with the Java compile server, falling back to javac: {str(e)}")
+                metrics.ERRORS.inc(stage='compile_server')
+        result = self._run(
+            work_dir, filename, timeout=self.compile_timeout,
+            limits={name: value for name, value in self.compile_limits.items() if name not in JVM_UNLIMITED},
+            command=[self.javac] + [f"-J{option}" for option in jvm_heap(self.compile_limits)]
+            + ['-d', class_dir, '-encoding', 'UTF-8', '-proc:none', os.path.join(source_dir, filename)]
+        )
+        diagnostics = result['stderr'] + ("\nCompilation timed out" if result['timed_out'] else "")
+        return result['returncode'] == 0, diagnostics
+
+    def run(self, language, code_path, timeout=30, limits=None, output_limit=None):
+        """Build code_path if needed and run it; returns (build, run result or None if it did not compile).
+
+        The run result is the sandbox's (returncode, signal, timed_out, stdout,
+        stderr, truncated, resources). The program runs in a temporary directory
+        holding a copy of its build, so that it cannot alter the cache.
+        """
+        build = self.build(language, code_path)
+        if not build['compiled']:
+            return build, None
+        limits = dict(limits or {})
+        with tempfile.TemporaryDirectory() as run_dir:
+            if language == 'c':
+                shutil.copy2(os.path.join(build['dir'], 'program'), os.path.join(run_dir, 'program'))
+                command = ['./program']
+            else:
+                shutil.copytree(os.path.join(build['dir'], 'classes'), os.path.join(run_dir, 'classes'))
+                command = [self.java] + self.java_options + jvm_heap(limits) + ['-cp', 'classes', build['main']]
+                limits = {name: value for name, value in limits.items() if name not in JVM_UNLIMITED}
+            result = self._run(run_dir, os.path.basename(code_path), timeout=timeout, limits=limits,
+                               output_limit=output_limit, command=command)
+        return build, result
+
+    def _prune(self, keep=None):
+        """Delete the least recently used builds while the cache is larger than max_bytes.
+
+        The build at keep, just published and about to be read, is never deleted.
+        """
+        if not self.max_bytes:
+            return
+        with self._prune_lock:
+            builds = []
+            total = 0
+            for shard in os.scandir(self.cache_dir):
+                if not shard.is_dir() or len(shard.name) != 2:
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.startswith('.') or entry.path == keep:
+                        continue  # Being built or about to be used
+                    try:
+                        used = os.stat(os.path.join(entry.path, 'build.json')).st_mtime
+                    except OSError:
+                        continue
+                    size = sum(
+                        os.path.getsize(os.path.join(folder, name))
+                        for folder, _, names in os.walk(entry.path) for name in names
+                    )
+                    builds.append((used, size, entry.path))
+                    total += size
+            for _, size, path in sorted(builds):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
@@ -0,0 +1,208 @@
+"""Cell-level handling of Jupyter notebooks.
+
+Notebooks are read as a list of code cells rather than one concatenated script:
+large notebooks are analyzed in chunks of consecutive cells that fit in
+Config.NOTEBOOK_CHUNK_CHARS, and executed cell by cell (see sandbox), so that a
+failing cell only costs its own output. When the uploaded notebook was already
+run from top to bottom, its stored outputs are used instead of running it again.
+"""
+import base64
+import json
+import re
+
+# Stored outputs that become plots, with the extension of their files
+IMAGE_TYPES = {'image/png': 'png', 'image/jpeg': 'jpg'}
+
+_ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+_MAGIC = re.compile(r'^(\s*)([%!].*)$')
+
+
+def _text(value):
+    """Join a notebook multiline string (a list of lines or a string)."""
+    return ''.join(value) if isinstance(value, list) else (value or '')
+
+
+def read_notebook(file_path):
+    """Load a notebook file, raising ValueError if it is not one."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        try:
+            notebook = json.load(f)
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid Jupyter notebook format: {file_path} is not a valid JSON file")
+
+    if not isinstance(notebook, dict) or 'cells' not in notebook:
+        raise ValueError(f"Invalid Jupyter notebook structure: 'cells' not found in {file_path}")
+    return notebook
+
+
+def code_cells(notebook):
+    """Return the code cells of a notebook, numbered from 1 in notebook order.
+
+    Each cell is a dict with number, source, execution_count and outputs.
+    """
+    cells = []
+    for cell in notebook.get('cells', []):
+        if cell.get('cell_type') == 'code':
+            cells.append({
+                'number': len(cells) + 1,
+                'source': _text(cell.get('source', [])),
+                'execution_count': cell.get('execution_count'),
+                'outputs': cell.get('outputs') or []
+            })
+    return cells
+
+
+def cells_code(cells):
+    """Concatenate the source of cells like one script."""
+    return ''.join(cell['source'] + "\n\n" for cell in cells)
+
+
+def _scan_line(line, depth, in_string):
+    """Follow brackets and strings through one line of code.
+
+    Returns the bracket depth and the open triple-quoted string delimiter (or
+    None) at the end of the line, and whether it ends with a backslash
+    continuation.
+    """
+    i, n = 0, len(line)
+    while i < n:
+        if in_string is not None:
+            if line.startswith(in_string, i):
+                i += len(in_string)
+                in_string = None
+            else:
+                i += 2 if line[i] == '\\' else 1
+            continue
+        char = line[i]
+        if char == '#':
+            return depth, None, False
+        if char in '\'"':
+            delimiter = line[i:i + 3] if line[i:i + 3] in ('"""', "'''") else char
+            i += len(delimiter)
+            if len(delimiter) == 3:
+                in_string = delimiter
+                continue
+            while i < n and line[i] != char:
+                i += 2 if line[i] == '\\' else 1
+            i += 1
+            continue
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth = max(0, depth - 1)
+        i += 1
+    return depth, in_string, in_string is None and line.endswith('\\')
+
+
+def executable_source(source):
+    """Turn IPython magics and shell escapes (%matplotlib, !pip ...) into no-ops.
+
+    Only lines that begin a logical line are magics: a line continuing an open
+    bracket, string or backslash (such as "% x" in a formatting expression) is
+    left as it is. A cell magic (%%time, %%bash ...) makes the whole cell a no-op.
+    """
+    lines = source.split('\n')
+    if source.lstrip().startswith('%%'):
+        return '\n'.join(f"# {line}" if line else line for line in lines)
+
+    executable = []
+    depth, in_string, continued = 0, None, False
+    for line in lines:
+        if depth == 0 and in_string is None and not continued and _MAGIC.match(line):
+            executable.append(_MAGIC.sub(r'\1pass  # \2', line))
+            continue
+        executable.append(line)
+        depth, in_string, continued = _scan_line(line, depth, in_string)
+    return '\n'.join(executable)
+
+
+def chunk_cells(cells, max_chars):
+    """Group consecutive cells into chunks of at most max_chars of source.
+
+    A cell larger than max_chars gets a chunk of its own.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for cell in cells:
+        if current and size + len(cell['source']) > max_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(cell)
+        size += len(cell['source'])
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_label(chunk):
+    """Human-readable cell range of a chunk ("Cells 3-7")."""
+    first, last = chunk[0]['number'], chunk[-1]['number']
+    return f"Cell {first}" if first == last else f"Cells {first}-{last}"
+
+
+def chunk_code(chunk):
+    """Source of a chunk for analysis, each cell preceded by its number."""
+    return ''.join(f"# Cell {cell['number']}\n{cell['source']}\n\n" for cell in chunk)
+
+
+def merge_analyses(chunks, analyses):
+    """Merge the analyses of the chunks of a notebook into one, in cell order."""
+    if len(analyses) == 1:
+        return analyses[0]
+    return {
+        'code_block': "\n\n".join(analysis['code_block'].strip('\n') for analysis in analyses),
+        'explanation': "\n\n".join(
+            f"**{chunk_label(chunk)}**\n\n{analysis['explanation']}" for chunk, analysis in zip(chunks, analyses)
+        )
+    }
+
+
+def has_stored_outputs(cells):
+    """Return True if every code cell was run, once each and in notebook order.
+
+    Only then do the stored outputs describe a top-to-bottom run of the code as
+    uploaded; an empty notebook has nothing to reuse.
+    """
+    counts = [cell['execution_count'] for cell in cells if cell['source'].strip()]
+    if not counts or any(not isinstance(count, int) for count in counts):
+        return False
+    return all(a < b for a, b in zip(counts, counts[1:]))
+
+
+def stored_results(cells):
+    """Convert the stored outputs of cells to per-cell execution results.
+
+    Returns a list of dicts (number, stdout, stderr, status, figures), figures
+    being (extension, image bytes) pairs in display order.
+    """
+    results = []
+    for cell in cells:
+        stdout, stderr, figures = [], [], []
+        status = 'ok'
+        for output in cell['outputs']:
+            output_type = output.get('output_type')
+            if output_type == 'stream':
+                (stderr if output.get('name') == 'stderr' else stdout).append(_text(output.get('text')))
+            elif output_type in ('execute_result', 'display_data'):
+                data = output.get('data') or {}
+                image_type = next((mime for mime in IMAGE_TYPES if mime in data), None)
+                if image_type is not None:
+                    try:
+                        figures.append((IMAGE_TYPES[image_type], base64.b64decode(_text(data[image_type]))))
+                    except ValueError:
+                        pass
+                elif 'text/plain' in data:
+                    stdout.append(_text(data['text/plain']) + "\n")
+            elif output_type == 'error':
+                status = 'error'
+                traceback = output.get('traceback') or [f"{output.get('ename')}: {output.get('evalue')}"]
+                stderr.append(_ANSI_ESCAPE.sub('', '\n'.join(traceback)) + "\n")
+        results.append({
+            'number': cell['number'],
+            'stdout': ''.join(stdout),
+            'stderr': ''.join(stderr),
+            'status': status,
+            'figures': figures
+        })
+    return results
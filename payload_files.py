@@ -0,0 +1,116 @@
+"""Files embedded base64-encoded in API payloads without loading them in memory.
+
+A Base64File placed in a payload stands for the string prefix + base64(file
+content). The JSON body of the request is produced in chunks, with the file
+read and encoded a slice at a time, so sending a 16 MB PDF never holds its
+base64 (or a JSON copy of it) in memory. Serialized payloads are byte-for-byte
+what json.dumps would give with the string inlined, so cache keys do not depend
+on how a file was passed.
+"""
+import base64
+import json
+import os
+import re
+import uuid
+
+# Multiple of 3, so that every slice encodes without padding
+CHUNK_SIZE = 3 * 64 * 1024
+
+_MARKER = re.compile(r'"(@@file-[0-9a-f]{32}@@)"')
+
+
+class Base64File:
+    """Stands for prefix + the base64 encoding of the file at path."""
+
+    def __init__(self, path, prefix=''):
+        self.path = path
+        self.prefix = prefix
+
+    def __len__(self):
+        return len(self.prefix) + 4 * ((os.path.getsize(self.path) + 2) // 3)
+
+    def iter_encoded(self, chunk_size=CHUNK_SIZE):
+        yield self.prefix.encode('ascii')
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield base64.b64encode(chunk)
+
+
+def json_parts(payload, **kwargs):
+    """Serialize payload like json.dumps(payload, **kwargs), leaving its files unread.
+
+    Returns a list of bytes and Base64File items (each file quoted by the bytes
+    around it) whose concatenation is the JSON document.
+    """
+    files = {}
+
+    def default(obj):
+        if isinstance(obj, Base64File):
+            marker = f"@@file-{uuid.uuid4().hex}@@"
+            files[marker] = obj
+            return marker
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    text = json.dumps(payload, default=default, **kwargs)
+    parts = []
+    position = 0
+    for match in _MARKER.finditer(text):
+        if match.group(1) not in files:
+            continue
+        parts.append(text[position:match.start() + 1].encode('utf-8'))
+        parts.append(files[match.group(1)])
+        position = match.end() - 1
+    parts.append(text[position:].encode('utf-8'))
+    return parts
+
+
+def contains_files(payload):
+    """Return True if a Base64File appears anywhere in payload."""
+    if isinstance(payload, Base64File):
+        return True
+    if isinstance(payload, dict):
+        return any(contains_files(value) for value in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return any(contains_files(value) for value in payload)
+    return False
+
+
+def iter_bytes(parts):
+    """Yield the bytes of serialized parts, encoding files a slice at a time."""
+    for part in parts:
+        if isinstance(part, Base64File):
+            yield from part.iter_encoded()
+        else:
+            yield part
+
+
+class JsonBody:
+    """File-like request body streaming serialized parts, with a known length.
+
+    requests sends it with a Content-Length header, reading it in blocks.
+    """
+
+    def __init__(self, parts):
+        self._length = sum(len(part) for part in parts)
+        self._chunks = iter_bytes(parts)
+        self._chunk = b''
+        self._offset = 0
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        pieces = []
+        while size != 0:
+            if self._offset == len(self._chunk):
+                self._chunk = next(self._chunks, None)
+                self._offset = 0
+                if self._chunk is None:
+                    self._chunk = b''
+                    break
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._offset + size)
+            pieces.append(self._chunk[self._offset:end])
+            if size > 0:
+                size -= end - self._offset
+            self._offset = end
+        return b''.join(pieces)
@@ -0,0 +1,86 @@
+"""Renderers turning the HTML of a lab report into the downloadable file.
+
+WeasyPrint renders in process. wkhtmltopdf (through pdfkit) spawns a process per
+report and is kept for installations without WeasyPrint. The HTML renderer writes
+the HTML itself, for installations without any PDF engine. 'auto' picks the first
+available one, once per process. The engines are imported when their renderer
+is first asked for, not with this module.
+"""
+import functools
+
+
+class Renderer:
+    """Base class of the report renderers."""
+
+    name = None
+    extension = '.pdf'
+
+    def available(self):
+        return True
+
+    def render(self, html, output_path, base_dir):
+        """Write the report for html to output_path; relative links resolve against base_dir."""
+        raise NotImplementedError
+
+
+class WeasyPrintRenderer(Renderer):
+    name = 'weasyprint'
+
+    def available(self):
+        try:
+            import weasyprint  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def render(self, html, output_path, base_dir):
+        import weasyprint
+        weasyprint.HTML(string=html, base_url=base_dir).write_pdf(output_path)
+
+
+class WkhtmltopdfRenderer(Renderer):
+    name = 'wkhtmltopdf'
+
+    def available(self):
+        try:
+            import pdfkit
+        except ImportError:
+            return False
+        try:
+            pdfkit.configuration()
+        except OSError:
+            # No wkhtmltopdf executable on the PATH
+            return False
+        return True
+
+    def render(self, html, output_path, base_dir):
+        import pdfkit
+        pdfkit.from_string(html, output_path, options={'enable-local-file-access': None, 'quiet': None})
+
+
+class HtmlRenderer(Renderer):
+    name = 'html'
+    extension = '.html'
+
+    def render(self, html, output_path, base_dir):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(html)
+
+
+RENDERERS = {renderer.name: renderer for renderer in (WeasyPrintRenderer(), WkhtmltopdfRenderer(), HtmlRenderer())}
+
+
+@functools.lru_cache(maxsize=None)
+def get_renderer(name='auto'):
+    """Return the renderer called name, or the first available one for 'auto'."""
+    if name == 'auto':
+        renderer = next(renderer for renderer in RENDERERS.values() if renderer.available())
+        if renderer.extension == '.html':
+            print("Warning: neither WeasyPrint nor wkhtmltopdf is installed, reports are delivered as HTML")
+        return renderer
+    if name not in RENDERERS:
+        raise ValueError(f"Unknown PDF renderer: {name} (choose from auto, {', '.join(RENDERERS)})")
+    renderer = RENDERERS[name]
+    if not renderer.available():
+        raise ValueError(f"PDF renderer {name} is not installed")
+    return renderer
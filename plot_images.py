@@ -0,0 +1,97 @@
+"""Optimization and deduplication of the plots embedded in a report.
+
+Captured figures are downscaled to fit Config.PLOT_MAX_PIXELS and recompressed
+before they are written, embedded and sent to the vision model. Within a report,
+a plot identical to an earlier one (same bytes) or looking the same (perceptual
+hash within a few bits) shares the earlier plot's interpretation instead of
+costing another API call.
+"""
+import hashlib
+import io
+
+
+def optimize_image(image, max_pixels=1200, fmt='png', jpeg_quality=85):
+    """Downscale image bytes to fit in max_pixels x max_pixels and recompress them.
+
+    PNGs with at most 256 colors (most plots) are stored as palette images, which is
+    lossless. Returns the original bytes when the result is not smaller, or when
+    the image cannot be read (e.g. SVG).
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(image)) as img:
+            img.load()
+            if max(img.size) > max_pixels:
+                img.thumbnail((max_pixels, max_pixels), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            if fmt in ('jpg', 'jpeg'):
+                img.convert('RGB').save(buffer, format='JPEG', quality=jpeg_quality, optimize=True)
+            else:
+                if img.mode not in ('P', 'L') and img.getcolors(256) is not None:
+                    img = img.convert('RGB').quantize(colors=256, method=Image.FASTOCTREE, dither=Image.NONE)
+                img.save(buffer, format='PNG', optimize=True)
+    except OSError as e:
+        print(f"Error optimizing plot image: {str(e)}")
+        return image
+
+    optimized = buffer.getvalue()
+    return optimized if len(optimized) < len(image) else image
+
+
+def dhash(image, size=16):
+    """Return the difference hash of image bytes, as a size*size bit integer."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image)) as img:
+        pixels = img.convert('L').resize((size + 1, size), Image.LANCZOS).tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+class PlotDeduplicator:
+    """Finds the plots of a report that duplicate an earlier one.
+
+    Counts the duplicates found, so that the report can tell how many API calls
+    and embedded bytes they saved. max_distance is the number of dHash bits (out
+    of 256) two plots may differ by to be near-duplicates; None disables the
+    perceptual match.
+    """
+
+    def __init__(self, max_distance=4):
+        self.max_distance = max_distance
+        self._digests = {}
+        self._hashes = []
+        self.exact = 0
+        self.near = 0
+        self.duplicate_bytes = 0
+
+    def add(self, filename, image):
+        """Register a plot; return the filename of the plot it duplicates, or None."""
+        digest = hashlib.sha256(image).hexdigest()
+        if digest in self._digests:
+            self.exact += 1
+            self.duplicate_bytes += len(image)
+            return self._digests[digest]
+
+        try:
+            image_hash = dhash(image) if self.max_distance is not None else None
+        except OSError:
+            image_hash = None
+        if image_hash is not None:
+            for other_hash, other_filename in self._hashes:
+                if bin(image_hash ^ other_hash).count('1') <= self.max_distance:
+                    self.near += 1
+                    # Later exact copies of this plot share the same original
+                    self._digests[digest] = other_filename
+                    return other_filename
+            self._hashes.append((image_hash, filename))
+
+        self._digests[digest] = filename
+        return None
@@ -0,0 +1,89 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import metrics
+
+# Tracker and token counter of the stage running in the current thread
+_current_tracker = ContextVar('current_tracker', default=None)
+_current_stage = ContextVar('current_stage', default=None)
+
+
+def record_tokens(usage):
+    """Add the token usage of an API response to the stages running in this thread."""
+    counter = _current_stage.get()
+    while counter is not None and usage:
+        counter['tokens'] += usage.get('total_tokens', 0)
+        counter = counter['parent']
+
+
+@contextmanager
+def stage(name, file=None):
+    """Report a sub-stage to the tracker of the enclosing stage, if there is one."""
+    tracker = _current_tracker.get()
+    if tracker is None:
+        yield
+    else:
+        with tracker.stage(name, file):
+            yield
+
+
+class ProgressTracker:
+    """Emits structured stage events while a report is generated.
+
+    Each event is a dict with the stage name, the file it concerns (if any), its
+    status ('started', 'done' or 'failed'), the time since the report started
+    (t_ms) and, once finished, the stage duration (elapsed_ms), the CPU time of
+    the thread that ran it (cpu_ms) and the API tokens it used. Stage durations
+    are also recorded in metrics, and every event is kept in events.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.start = time.perf_counter()
+        self.events = []
+
+    def emit(self, stage, file=None, status='done', **fields):
+        event = {
+            'stage': stage,
+            'file': file,
+            'status': status,
+            't_ms': round((time.perf_counter() - self.start) * 1000)
+        }
+        event.update(fields)
+        self.events.append(event)
+        if self.callback is not None:
+            try:
+                self.callback(event)
+            except Exception as e:
+                print(f"Error emitting progress event: {str(e)}")
+        return event
+
+    @contextmanager
+    def stage(self, name, file=None):
+        """Time a stage and count the tokens of the API calls made inside it."""
+        self.emit(name, file, 'started')
+        counter = {'tokens': 0, 'parent': _current_stage.get()}
+        tracker_token = _current_tracker.set(self)
+        stage_token = _current_stage.set(counter)
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+        status = 'failed'
+        try:
+            yield
+            status = 'done'
+        finally:
+            _current_stage.reset(stage_token)
+            _current_tracker.reset(tracker_token)
+            elapsed = time.perf_counter() - start
+            cpu = time.thread_time() - start_cpu
+            metrics.STAGE_SECONDS.observe(elapsed, stage=name, status=status)
+            self.emit(
+                name, file, status,
+                elapsed_ms=round(elapsed * 1000), cpu_ms=round(cpu * 1000), tokens=counter['tokens']
+            )
+
+    def run(self, name, file, func, *args, **kwargs):
+        """Call func inside a stage; handy for executor.submit."""
+        with self.stage(name, file):
+            return func(*args, **kwargs)
@@ -0,0 +1,228 @@
+"""Local token estimation and trimming of prompt content to a token budget.
+
+Instruction text and code are inserted into prompts whole, so a long OCR result
+or a source file with a large data table can exceed a model's context (the API
+answers 400) or cost far more tokens than the useful part. Before a prompt is
+built its content is estimated locally and, when over budget, trimmed: data
+(runs of literal-only lines, very long lines) goes first, then module-level code,
+then function and class bodies (their signature line is kept). Code keeps its
+original line numbers, removed lines being shown as gaps.
+"""
+import math
+import re
+
+import code_segments
+
+# Context window of each model in tokens, and the part of it left for the answer
+MODEL_CONTEXT_TOKENS = {'deepseek-chat': 65536, 'deepseek-coder': 65536, 'deepseek-vision': 32768}
+DEFAULT_CONTEXT_TOKENS = 32768
+COMPLETION_RESERVE = 8192
+
+# Tokens of the fixed part of a prompt (instructions to the model, code fences)
+PROMPT_OVERHEAD = 200
+
+# Runs of at least this many data lines are elided, keeping their first and last lines
+DATA_RUN_MIN = 4
+DATA_RUN_KEEP_HEAD = 2
+# Lines longer than this are cut
+LONG_LINE_CHARS = 400
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'')
+_NUMBER = re.compile(r"[-+]?(?:0[xX][0-9a-fA-F]+|\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)[fFlLjJ]?")
+_SEPARATORS = re.compile(r"[\s,;:\[\](){}]*")
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens of text, without a tokenizer.
+
+    Each punctuation character counts as one token and each word as one token per
+    four characters, which slightly overestimates BPE tokenizers on code and prose.
+    """
+    tokens = 0
+    for piece in _PIECE.findall(text or ''):
+        tokens += math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == '_' else 1
+    return tokens
+
+
+def estimate_payload_tokens(payload):
+    """Estimate the prompt tokens of a chat payload (text content only)."""
+    tokens = 0
+    for message in payload.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            tokens += estimate_tokens(content)
+        elif isinstance(content, list):
+            tokens += sum(estimate_tokens(part.get('text', '')) for part in content if part.get('type') == 'text')
+    return tokens
+
+
+def model_budget(model, max_tokens=0):
+    """Tokens available for the content of a prompt to model.
+
+    max_tokens (Config.PROMPT_MAX_TOKENS) caps the budget below the model's context
+    to save tokens; 0 uses the whole context minus the room left for the answer.
+    """
+    budget = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS) - COMPLETION_RESERVE
+    if max_tokens:
+        budget = min(budget, max_tokens)
+    return max(budget - PROMPT_OVERHEAD, 0)
+
+
+def is_data_line(line):
+    """Return True for a line made only of literals: numbers, strings and separators."""
+    stripped = line.strip()
+    if not stripped:
+        return False
+    rest, strings = _STRING.subn('', stripped)
+    rest, numbers = _NUMBER.subn('', rest)
+    return bool(strings or numbers) and _SEPARATORS.fullmatch(rest) is not None
+
+
+def _cut_long_line(line):
+    if len(line) <= LONG_LINE_CHARS:
+        return line
+    return f"{line[:LONG_LINE_CHARS // 2]} ... [{len(line) - LONG_LINE_CHARS // 2} characters cut]"
+
+
+def _line_segment(segment, lines, first, last):
+    """Part of segment covering its lines first..last (0-based offsets)."""
+    return dict(
+        segment,
+        start_line=segment['start_line'] + first,
+        end_line=segment['start_line'] + last,
+        text='\n'.join(lines[first:last + 1])
+    )
+
+
+def elide_data(segment, cut_long_lines=True):
+    """Split a segment around its runs of data lines and cut its very long lines.
+
+    Returns the parts of the segment that are kept, with their original line numbers.
+    """
+    lines = segment['text'].split('\n')
+    if cut_long_lines:
+        lines = [_cut_long_line(line) for line in lines]
+    parts = []
+    first = 0
+    offset = 0
+    while offset < len(lines):
+        if not is_data_line(lines[offset]):
+            offset += 1
+            continue
+        end = offset
+        while end + 1 < len(lines) and (is_data_line(lines[end + 1]) or not lines[end + 1].strip()):
+            end += 1
+        if end - offset + 1 >= DATA_RUN_MIN:
+            parts.append(_line_segment(segment, lines, first, offset + DATA_RUN_KEEP_HEAD - 1))
+            first = end
+        offset = end + 1
+    parts.append(_line_segment(segment, lines, first, len(lines) - 1))
+    return parts
+
+
+def _segments_tokens(segments):
+    return sum(estimate_tokens(segment['text']) for segment in segments)
+
+
+def _head(segment, max_tokens):
+    """First lines of a segment that fit in max_tokens (at least its first line)."""
+    lines = segment['text'].split('\n')
+    used = 0
+    for count, line in enumerate(lines, start=1):
+        used += estimate_tokens(line) + 1
+        if used > max_tokens and count > 1:
+            return _line_segment(segment, lines, 0, count - 2)
+    return segment
+
+
+def fit_segments(segments, max_tokens):
+    """Trim code segments (see code_segments) to about max_tokens, keeping line numbers.
+
+    Data runs are elided first. If that is not enough, function and class segments
+    are kept in file order before module-level code; the ones that do not fit are
+    reduced to their first line (the signature). Returns the kept parts in file order.
+    """
+    if _segments_tokens(segments) <= max_tokens:
+        return segments
+    parts = [part for segment in segments for part in elide_data(segment)]
+    if _segments_tokens(parts) <= max_tokens:
+        return parts
+
+    kept = []
+    cut = []
+    used = 0
+    for i in sorted(range(len(parts)), key=lambda i: (parts[i]['kind'] == 'module', i)):
+        tokens = estimate_tokens(parts[i]['text'])
+        if used + tokens <= max_tokens:
+            kept.append(parts[i])
+            used += tokens
+            continue
+        # Keep the signature of the definitions that do not fit, while there is room
+        signature = _line_segment(parts[i], parts[i]['text'].split('\n'), 0, 0)
+        tokens = estimate_tokens(signature['text'])
+        if parts[i]['kind'] != 'module' and used + tokens <= max_tokens:
+            kept.append(signature)
+            used += tokens
+            cut.append((len(kept) - 1, parts[i]))
+        else:
+            cut.append((None, parts[i]))
+
+    # Spend what is left of the budget on the beginning of the first part that was cut
+    if cut and used < max_tokens:
+        index, part = cut[0]
+        if index is not None:
+            used -= estimate_tokens(kept.pop(index)['text'])
+        kept.append(_head(part, max_tokens - used))
+    return sorted(kept, key=lambda segment: segment['start_line'])
+
+
+def render_segments(segments, lines, comment='#'):
+    """Join segments of lines as code, marking removed lines with a comment.
+
+    Gaps made only of blank lines (between definitions) are kept as they are.
+    """
+    rendered = []
+    previous_end = 0
+    for segment in segments:
+        gap = lines[previous_end:segment['start_line'] - 1]
+        if any(line.strip() for line in gap):
+            marker = f"... ({len(gap)} lines omitted)"
+            rendered.append(f"{comment} {marker}" if comment else marker)
+        else:
+            rendered.extend(gap)
+        rendered.append(segment['text'])
+        previous_end = segment['end_line']
+    return '\n'.join(rendered)
+
+
+def fit_code(code, language, max_tokens):
+    """Return code trimmed to about max_tokens, with comments where lines were removed."""
+    if estimate_tokens(code) <= max_tokens:
+        return code
+    segments = fit_segments(code_segments.segment_code(code, language), max_tokens)
+    return render_segments(segments, code.splitlines(), '#' if language == 'python' else '//')
+
+
+def fit_text(text, max_tokens):
+    """Return prose trimmed to about max_tokens.
+
+    Data runs are elided first, then the middle of the text is dropped, keeping
+    two thirds of the budget for its beginning (title, objectives) and one third
+    for its end.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lines = text.split('\n')
+    segment = {'name': 'text', 'kind': 'text', 'start_line': 1, 'end_line': len(lines), 'text': text}
+    text = render_segments(elide_data(segment, cut_long_lines=False), lines, '')
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # Characters per token of this text, to cut it by length
+    ratio = len(text) / max(estimate_tokens(text), 1)
+    # Cut between words
+    head = re.sub(r'\S*$', '', text[:int(max_tokens * 2 // 3 * ratio)])
+    tail = re.sub(r'^\S*', '', text[len(text) - int(max_tokens // 3 * ratio):])
+    omitted = len(text) - len(head) - len(tail)
+    return f"{head}\n[... {omitted} characters omitted ...]\n{tail}"
@@ -1,76 +1,240 @@
 import os
-import io
 import tempfile
 import subprocess
 from pathlib import Path
 import base64
 import json
-import matplotlib.pyplot as plt
-from PIL import Image
-import requests
-import markdown
-import pdfkit
 import re
+import time
+import functools
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from config import Config
+from response_cache import ResponseCache, make_key
+from sandbox import SandboxPool, make_limits, run_cold
+from native_runner import NativeRunner
+import progress
+from progress import ProgressTracker
+import report_manifest
+import text_extraction
+import code_segments
+import pdf_renderer
+import plot_images
+import metrics
+import payload_files
+import notebooks
+import prompt_budget
+import section_render
+from single_flight import SingleFlight
+import shutil
+
+# Persistent cache of API responses, shared by all reports
+response_cache = None
+if Config.RESPONSE_CACHE_ENABLED:
+    response_cache = ResponseCache(
+        Config.RESPONSE_CACHE_PATH,
+        ttl=Config.RESPONSE_CACHE_TTL,
+        max_bytes=Config.RESPONSE_CACHE_MAX_BYTES
+    )
+
+# Warm pool of pre-imported Python executors for execute_python_code
+sandbox_pool = None
+if Config.SANDBOX_WARM_POOL:
+    sandbox_pool = SandboxPool(size=Config.SANDBOX_POOL_SIZE, max_runs=Config.SANDBOX_MAX_RUNS)
+
+# HTML of the report sections already converted, shared by all reports
+section_cache = section_render.SectionCache(Config.SECTION_CACHE_SIZE)
+
+# Model used to analyze code
+ANALYSIS_MODEL = "deepseek-coder"
+
+# Interpretation given to a plot when the API call fails
+PLOT_INTERPRETATION_FALLBACK = "Unable to provide plot interpretation."
+
+# Instruction parsing, analyses and plot interpretations in flight, shared by identical concurrent calls
+in_flight = SingleFlight()
+
+# Resource limits applied to executed code (None disables them)
+SANDBOX_LIMITS = None
+if Config.SANDBOX_RESOURCE_LIMITS:
+    SANDBOX_LIMITS = make_limits(
+        memory_mb=Config.SANDBOX_MAX_MEMORY_MB,
+        cpu_seconds=Config.SANDBOX_MAX_CPU_SECONDS,
+        file_mb=Config.SANDBOX_MAX_FILE_MB,
+        processes=Config.SANDBOX_MAX_PROCESSES
+    )
+
+# Messages for executions killed by a resource limit
+LIMIT_SIGNALS = {
+    'SIGXCPU': "CPU time limit exceeded",
+    'SIGXFSZ': "File size limit exceeded",
+    'SIGKILL': "Process killed (memory limit exceeded?)"
+}
+
+# Builds and runs of C and Java files, their builds cached on disk
+native_executor = None
+if Config.NATIVE_EXECUTION:
+    native_executor = NativeRunner(
+        Config.NATIVE_CACHE_DIR,
+        sandbox_pool.run if sandbox_pool is not None else run_cold,
+        c_compiler=Config.C_COMPILER,
+        c_flags=Config.C_FLAGS,
+        java_options=Config.JAVA_OPTIONS,
+        compile_server=Config.JAVA_COMPILE_SERVER,
+        compile_limits=make_limits(
+            memory_mb=Config.SANDBOX_MAX_MEMORY_MB, cpu_seconds=60, file_mb=Config.SANDBOX_MAX_FILE_MB
+        ) if SANDBOX_LIMITS else None,
+        max_bytes=Config.NATIVE_CACHE_MAX_BYTES
+    )
+
+def get_client():
+    """Return the shared LLM client, importing its backend (requests) on first use."""
+    import deepseek_client
+    return deepseek_client.get_client()
+
+def cache_scope():
+    """Scope of the cached responses of the LLM backend in use (None for the DeepSeek API)."""
+    if Config.LLM_BACKEND == 'deepseek':
+        return None
+    if Config.LLM_BACKEND == 'stub':
+        return f"stub {Config.LLM_STUB_URL}"
+    return Config.LLM_BACKEND
+
+def analysis_scope():
+    """What a code analysis depends on besides the code: analysis mode, LLM backend and model."""
+    return [Config.ANALYSIS_MODE, cache_scope() or Config.LLM_BACKEND, ANALYSIS_MODEL]
+
+def chat_completion(payload, validate=None):
+    """Send a chat completion request to the DeepSeek API and return the message content.
+
+    Requests go through the shared pooled, retrying client (see deepseek_client).
+
+    Identical payloads are answered from the response cache when it is enabled. Truncated
+    answers are not cached, nor, when validate is given, answers for which validate(content)
+    is false (such as JSON the caller cannot parse); a cached one is dropped and asked again.
+    """
+    cache_key = make_key(payload, cache_scope()) if response_cache else None
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        if cached is not None and (validate is None or validate(cached)):
+            metrics.API_REQUESTS.inc(model=payload.get("model", ""), outcome='cached')
+            return cached
+        if cached is not None:
+            response_cache.delete(cache_key)
+
+    metrics.PROMPT_TOKENS.observe(prompt_budget.estimate_payload_tokens(payload), model=payload.get("model", ""))
+    response_data = get_client().chat(payload)
+    usage = response_data.get("usage") or {}
+    progress.record_tokens(usage)
+    metrics.API_TOKENS.inc(usage.get("prompt_tokens", 0), model=payload.get("model", ""), kind='prompt')
+    metrics.API_TOKENS.inc(usage.get("completion_tokens", 0), model=payload.get("model", ""), kind='completion')
+    choice = response_data["choices"][0]
+    content = choice["message"]["content"]
+    if cache_key and choice.get("finish_reason") != 'length' and (validate is None or validate(content)):
+        response_cache.put(cache_key, content)
+    return content
+
+def is_json_object(content):
+    """Return True if content is a JSON object, as asked of the structured prompts."""
+    try:
+        return isinstance(json.loads(content), dict)
+    except ValueError:
+        return False
+
+def coalesce(stage, key, func, *args):
+    """Call func(*args), sharing the result with identical calls (same stage and key) in flight."""
+    if not Config.COALESCE_ENABLED:
+        return func(*args)
+    return in_flight.do(stage, key, func, *args)
+
+def content_budget(model):
+    """Tokens of content (text or code) a prompt to model may carry, see prompt_budget."""
+    return prompt_budget.model_budget(model, Config.PROMPT_MAX_TOKENS)
+
+def record_trimmed(kind, original, trimmed):
+    """Count the tokens removed from a prompt's content to fit its budget."""
+    if trimmed is not original:
+        removed = prompt_budget.estimate_tokens(original) - prompt_budget.estimate_tokens(trimmed)
+        metrics.PROMPT_TOKENS_TRIMMED.inc(max(removed, 0), kind=kind)
+    return trimmed
+
+def fit_code(code, language, model="deepseek-coder"):
+    """Trim code to the content budget of model, eliding data before definitions."""
+    return record_trimmed('code', code, prompt_budget.fit_code(code, language, content_budget(model)))
+
+def data_url(image, mime_type):
+    """Return the data: URL of image bytes, or a streamed one for a file path."""
+    if isinstance(image, bytes):
+        return f"data:{mime_type};base64,{base64.b64encode(image).decode('utf-8')}"
+    return payload_files.Base64File(image, f"data:{mime_type};base64,")
+
+def ocr_image(image, mime_type):
+    """Extract the text of an image (bytes or file path) using the DeepSeek vision model."""
+    payload = {
+        "model": "deepseek-vision",
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant that extracts text from images and documents."},
+            {"role": "user", "content": [
+                {"type": "text", "text": "Extract all the text from this document."},
+                {"type": "image_url", "image_url": {"url": data_url(image, mime_type)}}
+            ]}
+        ]
+    }
+    return chat_completion(payload)
 
-# Configure DeepSeek API
-DEEPSEEK_API_KEY = Config.DEEPSEEK_API_KEY
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+def ocr_page(image, mime_type):
+    """OCR one rasterized PDF page, reported as its own progress stage."""
+    with progress.stage('ocr_page'):
+        return ocr_image(image, mime_type)
 
 def extract_text_from_file(file_path):
-    """Extract text from a file using DeepSeek API."""
-    try:
-        # For PDF and image files, we'll use the DeepSeek API to extract text
-        # First, encode the file as base64
-        with open(file_path, 'rb') as f:
-            file_content = f.read()
-            file_base64 = base64.b64encode(file_content).decode('utf-8')
-
-        # Use DeepSeek API to extract text
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": "deepseek-vision",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant that extracts text from images and documents."},
-                {"role": "user", "content": [
-                    {"type": "text", "text": "Extract all the text from this document."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{file_base64}"}}
-                ]}
-            ]
-        }
+    """Extract text from a PDF or image file.
 
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload)
-        response.raise_for_status()
+    PDFs are read from their text layer first; only pages without text are
+    rasterized and sent to the DeepSeek vision model, in parallel. Each OCR call
+    goes through the response cache, whose key includes the page image, so a page
+    already seen is never sent twice. Images are sent to the vision model directly.
+    """
+    try:
+        if Path(file_path).suffix.lower() == '.pdf':
+            text = text_extraction.extract_pdf_text(
+                file_path,
+                ocr_page,
+                max_workers=Config.OCR_MAX_WORKERS,
+                dpi=Config.OCR_DPI,
+                min_chars=Config.PDF_TEXT_MIN_CHARS
+            )
+            if text is not None:
+                return text
+            print("No local PDF tools available, sending the whole document to OCR")
 
-        response_data = response.json()
-        return response_data["choices"][0]["message"]["content"]
+        # Send the file to the vision model, streamed from disk as base64
+        return ocr_image(file_path, get_image_mime_type(file_path))
     except Exception as e:
         print(f"Error extracting text from file: {str(e)}")
+        metrics.ERRORS.inc(stage='ocr')
         return ""
 
 def parse_instruction_file(file_path):
-    """Parse the instruction file to extract title and objectives."""
+    """Parse the instruction file to extract title and objectives.
+
+    When the API call or its answer fails, a generic structure is returned with
+    "fallback" set, so that callers do not keep it as the instructions' parse.
+    """
     file_ext = Path(file_path).suffix.lower()
 
     if file_ext in ['.pdf', '.png', '.jpg', '.jpeg']:
-        text = extract_text_from_file(file_path)
+        with progress.stage('ocr', os.path.basename(file_path)):
+            text = extract_text_from_file(file_path)
     elif file_ext == '.txt':
         with open(file_path, 'r', encoding='utf-8') as f:
             text = f.read()
     else:
         raise ValueError(f"Unsupported instruction file format: {file_ext}")
 
-    # Use DeepSeek API to extract title and objectives
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
+    # Use DeepSeek API to extract title and objectives, from text trimmed to fit the prompt
+    text = record_trimmed('instructions', text, prompt_budget.fit_text(text, content_budget("deepseek-chat")))
     payload = {
         "model": "deepseek-chat",
         "messages": [
@@ -80,19 +244,17 @@ def parse_instruction_file(file_path):
     }
 
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-
-        response_data = response.json()
-        result = json.loads(response_data["choices"][0]["message"]["content"])
+        result = json.loads(chat_completion(payload, validate=is_json_object))
         return result
     except Exception as e:
         print(f"Error using DeepSeek API: {str(e)}")
+        metrics.ERRORS.inc(stage='instructions')
         # Fallback to a simple structure
         return {
             "title": "Lab Report",
             "objectives": ["Analyze and document code functionality"],
-            "exercises": ["Code Analysis"]
+            "exercises": ["Code Analysis"],
+            "fallback": True
         }
 
 def read_code_file(file_path):
@@ -108,368 +270,762 @@ def read_code_file(file_path):
 def read_jupyter_notebook(file_path):
     """Read a Jupyter Notebook file and extract code cells."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            try:
-                notebook = json.load(f)
-            except json.JSONDecodeError:
-                raise ValueError(f"Invalid Jupyter notebook format: {file_path} is not a valid JSON file")
-
-        if 'cells' not in notebook:
-            raise ValueError(f"Invalid Jupyter notebook structure: 'cells' not found in {file_path}")
-
-        code_content = ""
-        for cell in notebook.get('cells', []):
-            if cell.get('cell_type') == 'code':
-                source = cell.get('source', [])
-                if isinstance(source, list):
-                    code_content += ''.join(source) + "\n\n"
-                else:
-                    code_content += source + "\n\n"
-
-        return code_content
+        return notebooks.cells_code(notebooks.code_cells(notebooks.read_notebook(file_path)))
     except Exception as e:
         # Re-raise with a more descriptive message
         raise ValueError(f"Error processing Jupyter notebook: {str(e)}")
 
-def analyze_code(code, language, exercise_title=None):
-    """Use DeepSeek API to analyze and explain the code.
+def build_extract_payload(code, language, exercise_title):
+    """Payload asking DeepSeek to extract the code block of an exercise (two-step mode)."""
+    code = fit_code(code, language)
+    return {
+        "model": ANALYSIS_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a helpful programming assistant."},
+            {"role": "user", "content": f"Extract the code block that corresponds to '{exercise_title}' from the following {language} code. Return ONLY the extracted code, nothing else. If you can't identify a specific block, return a representative portion of the code that would be most relevant to this exercise:\n\n```{language}\n{code}\n```"}
+        ]
+    }
 
-    If exercise_title is provided, extract and analyze only the relevant code block for that exercise.
-    """
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
+def build_analysis_payload(code, language):
+    """Payload asking DeepSeek to explain a piece of code."""
+    code = fit_code(code, language)
+    return {
+        "model": ANALYSIS_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a helpful programming assistant."},
+            {"role": "user", "content": f"Analyze the following {language} code and provide a detailed explanation of what it does, its structure, and any notable algorithms or techniques used:\n\n```{language}\n{code}\n```"}
+        ]
     }
 
-    # If exercise_title is provided, ask DeepSeek to extract the relevant code block
-    if exercise_title:
-        # First, extract the relevant code block for this exercise
-        extract_payload = {
-            "model": "deepseek-coder",
-            "messages": [
-                {"role": "system", "content": "You are a helpful programming assistant."},
-                {"role": "user", "content": f"Extract the code block that corresponds to '{exercise_title}' from the following {language} code. Return ONLY the extracted code, nothing else. If you can't identify a specific block, return a representative portion of the code that would be most relevant to this exercise:\n\n```{language}\n{code}\n```"}
-            ]
-        }
+def build_structured_payload(numbered_code, language, exercise_title):
+    """Payload asking DeepSeek for the block boundaries and the explanation in one JSON answer."""
+    return {
+        "model": ANALYSIS_MODEL,
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {"role": "system", "content": "You are a helpful programming assistant. Always answer with a single JSON object."},
+            {"role": "user", "content": f"The following excerpts of a {language} file are prefixed with their line numbers. Find the lines that implement the exercise '{exercise_title}' (or, if no specific block matches, the most relevant portion), then provide a detailed explanation of what that code does, its structure, and any notable algorithms or techniques used. Answer with JSON of the form {{\"start_line\": <first line>, \"end_line\": <last line>, \"explanation\": \"<explanation>\"}}:\n\n{numbered_code}"}
+        ]
+    }
 
-        try:
-            extract_response = requests.post(DEEPSEEK_API_URL, headers=headers, json=extract_payload)
-            extract_response.raise_for_status()
+def analyze_code_two_step(code, language, exercise_title):
+    """Extract the exercise's code block with one API call, then analyze it with a second."""
+    try:
+        extracted_code = chat_completion(build_extract_payload(code, language, exercise_title))
 
-            extract_data = extract_response.json()
-            extracted_code = extract_data["choices"][0]["message"]["content"]
+        # Clean up the extracted code (remove markdown code block markers if present)
+        extracted_code = re.sub(r'^```.*\n', '', extracted_code)
+        extracted_code = re.sub(r'\n```$', '', extracted_code)
 
-            # Clean up the extracted code (remove markdown code block markers if present)
-            extracted_code = re.sub(r'^```.*\n', '', extracted_code)
-            extracted_code = re.sub(r'\n```$', '', extracted_code)
+        # Use the extracted code for analysis
+        code_to_analyze = extracted_code
+    except Exception as e:
+        print(f"Error extracting code block: {str(e)}")
+        metrics.ERRORS.inc(stage='analysis')
+        code_to_analyze = code  # Fallback to the full code
 
-            # Use the extracted code for analysis
-            code_to_analyze = extracted_code
-        except Exception as e:
-            print(f"Error extracting code block: {str(e)}")
-            code_to_analyze = code  # Fallback to the full code
-    else:
-        code_to_analyze = code
+    return code_to_analyze, chat_completion(build_analysis_payload(code_to_analyze, language))
 
-    # Now analyze the code
-    analysis_payload = {
-        "model": "deepseek-coder",
-        "messages": [
-            {"role": "system", "content": "You are a helpful programming assistant."},
-            {"role": "user", "content": f"Analyze the following {language} code and provide a detailed explanation of what it does, its structure, and any notable algorithms or techniques used:\n\n```{language}\n{code_to_analyze}\n```"}
-        ]
-    }
+def analyze_code_structured(code, language, exercise_title):
+    """Select and analyze the exercise's code block with a single JSON-schema'd API call.
+
+    The file is first split locally (see code_segments) and only the segments relevant
+    to the exercise are sent, with line numbers and trimmed to the prompt budget (see
+    prompt_budget); the answer gives the block boundaries in the original file and the
+    explanation.
+    """
+    segments = code_segments.select_segments(code_segments.segment_code(code, language), exercise_title)
+    fitted = prompt_budget.fit_segments(segments, content_budget("deepseek-coder"))
+    if fitted is not segments:
+        record_trimmed('code', code_segments.number_lines(segments), code_segments.number_lines(fitted))
+        segments = fitted
+    content = chat_completion(
+        build_structured_payload(code_segments.number_lines(segments), language, exercise_title), validate=is_json_object
+    )
+
+    # Fallback: the segments that were sent
+    code_block = "\n\n".join(segment['text'] for segment in segments) or code
+    try:
+        result = json.loads(content)
+    except json.JSONDecodeError:
+        return code_block, content
 
+    lines = code.splitlines()
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=analysis_payload)
-        response.raise_for_status()
+        start_line, end_line = int(result.get("start_line")), int(result.get("end_line"))
+        if 1 <= start_line <= end_line <= len(lines):
+            code_block = "\n".join(lines[start_line - 1:end_line])
+    except (TypeError, ValueError):
+        pass
+    return code_block, result.get("explanation") or content
 
-        response_data = response.json()
+def analyze_code(code, language, exercise_title=None):
+    """Use DeepSeek API to analyze and explain the code.
+
+    If exercise_title is provided, extract and analyze only the relevant code block for that exercise:
+    in a single structured call by default, or with the extract-then-analyze round trips when
+    Config.ANALYSIS_MODE is 'two-step'.
+    """
+    code_to_analyze = code
+    try:
+        if not exercise_title:
+            explanation = chat_completion(build_analysis_payload(code, language))
+        elif Config.ANALYSIS_MODE == 'two-step':
+            code_to_analyze, explanation = analyze_code_two_step(code, language, exercise_title)
+        else:
+            code_to_analyze, explanation = analyze_code_structured(code, language, exercise_title)
         return {
             "code_block": code_to_analyze,
-            "explanation": response_data["choices"][0]["message"]["content"]
+            "explanation": explanation
         }
     except Exception as e:
         print(f"Error using DeepSeek API: {str(e)}")
+        metrics.ERRORS.inc(stage='analysis')
         return {
             "code_block": code_to_analyze,
             "explanation": f"Error analyzing code: {str(e)}"
         }
 
-def interpret_plot(plot_path):
-    """Use DeepSeek API to provide a scientific interpretation of a plot."""
-    try:
-        # Encode the plot image as base64
-        with open(plot_path, 'rb') as f:
-            plot_content = f.read()
-            plot_base64 = base64.b64encode(plot_content).decode('utf-8')
+def get_image_mime_type(path):
+    """Return the MIME type of an image from its file extension."""
+    ext = Path(path).suffix.lower().lstrip('.')
+    return {
+        'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'
+    }.get(ext, f"image/{ext or 'png'}")
 
-        # Use DeepSeek API to interpret the plot
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
+def interpret_plot(plot_path, image=None):
+    """Use DeepSeek API to provide a scientific interpretation of a plot.
 
+    Pass the image bytes when they are already in memory to avoid reading the file back;
+    otherwise the file is streamed into the request.
+    """
+    try:
+        # Use DeepSeek API to interpret the plot
         payload = {
             "model": "deepseek-vision",
             "messages": [
                 {"role": "system", "content": "You are a scientific data analyst specializing in interpreting plots and visualizations."},
                 {"role": "user", "content": [
                     {"type": "text", "text": "Provide a detailed scientific interpretation of this plot. Describe what it shows, the trends or patterns visible, and what scientific conclusions might be drawn from it. Be specific and technical in your analysis."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{plot_base64}"}}
+                    {"type": "image_url", "image_url": {"url": data_url(image if image is not None else plot_path, get_image_mime_type(plot_path))}}
                 ]}
             ]
         }
 
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload)
-        response.raise_for_status()
-
-        response_data = response.json()
-        return response_data["choices"][0]["message"]["content"]
+        return chat_completion(payload)
     except Exception as e:
         print(f"Error interpreting plot: {str(e)}")
-        return "Unable to provide plot interpretation."
-
-def execute_python_code(code_path, output_dir):
-    """Execute Python code in a safe environment and capture output and plots."""
+        metrics.ERRORS.inc(stage='plot_interpretation')
+        return PLOT_INTERPRETATION_FALLBACK
+
+def plot_prefix(code_path):
+    """Prefix of the plot files of a code file: its whole name, so that lab.py and lab.ipynb differ."""
+    return os.path.basename(code_path).replace('.', '_')
+
+def save_plot(image, fmt, code_path, number, output_dir, results, interpret_plots):
+    """Optimize a captured plot, write it to output_dir and add it to results; return its filename."""
+    results["plot_stats"]["original_bytes"] += len(image)
+    image = plot_images.optimize_image(image, Config.PLOT_MAX_PIXELS, fmt, Config.PLOT_JPEG_QUALITY)
+    results["plot_stats"]["optimized_bytes"] += len(image)
+    plot_filename = f"{plot_prefix(code_path)}_figure_{number}.{fmt}"
+    output_plot_path = os.path.join(output_dir, plot_filename)
+    with open(output_plot_path, 'wb') as dst:
+        dst.write(image)
+    results["plots"].append(output_plot_path)
+    results["plot_images"][plot_filename] = image
+
+    # Interpret the plot
+    if interpret_plots:
+        results["plot_interpretations"][plot_filename] = interpret_plot(output_plot_path, image)
+    return plot_filename
+
+def add_cell_results(results, cell_results, plot_filenames):
+    """Store per-cell results (see notebooks) in results["cells"] and combine their output and errors.
+
+    plot_filenames maps the figure indexes of the cells to the saved plot files.
+    """
+    results["cells"] = []
+    errors = []
+    for cell in cell_results:
+        results["cells"].append({
+            "number": cell["number"],
+            "status": cell["status"],
+            "output": cell["stdout"],
+            "error": cell["stderr"] or None,
+            "plots": [plot_filenames[index] for index in cell["figures"] if index in plot_filenames]
+        })
+        if cell["status"] == 'error':
+            errors.append(f"Cell {cell['number']}:\n{cell['stderr']}")
+    results["output"] = "".join(cell["stdout"] for cell in cell_results)
+    return errors
+
+def execute_notebook_outputs(code_path, cells, output_dir, interpret_plots=True):
+    """Build execution results from the outputs stored in a notebook, without running it."""
     results = {
         "output": "",
         "plots": [],
+        "plot_images": {},
+        "plot_interpretations": {},
+        "error": None,
+        "output_truncated": False,
+        "resources": None,
+        "plot_stats": {"original_bytes": 0, "optimized_bytes": 0},
+        "stored_outputs": True
+    }
+    cell_results = notebooks.stored_results(cells)
+    plot_filenames = {}
+    for cell in cell_results:
+        indexes = []
+        for fmt, image in cell["figures"]:
+            index = len(plot_filenames)
+            plot_filenames[index] = save_plot(image, fmt, code_path, index + 1, output_dir, results, interpret_plots)
+            indexes.append(index)
+        cell["figures"] = indexes
+    errors = add_cell_results(results, cell_results, plot_filenames)
+    if errors:
+        results["error"] = "\n".join(errors)
+    return results
+
+def empty_execution_results():
+    """Execution results of a file before it runs."""
+    return {
+        "output": "",
+        "plots": [],
+        "plot_images": {},
         "plot_interpretations": {},
-        "error": None
+        "error": None,
+        "output_truncated": False,
+        "resources": None,
+        "plot_stats": {"original_bytes": 0, "optimized_bytes": 0}
     }
 
+def record_run(results, run_result):
+    """Copy the output of a sandboxed run into results and return its errors, recording its metrics."""
+    results["output"] = run_result["stdout"]
+    results["output_truncated"] = run_result["truncated"]
+    results["resources"] = run_result["resources"]
+    errors = [run_result["stderr"]] if run_result["stderr"] else []
+    outcome = 'ok' if run_result["returncode"] == 0 else 'error'
+    if run_result["timed_out"]:
+        errors.append("Code execution timed out (limit: 30 seconds)")
+        outcome = 'timeout'
+    elif run_result["signal"] in LIMIT_SIGNALS:
+        errors.append(LIMIT_SIGNALS[run_result["signal"]])
+        outcome = 'limit'
+    elif run_result["returncode"] and not errors and run_result["cells"] is None:
+        # A cell run exits with status 1 when a cell failed: its error is reported with the cell
+        errors.append(f"Exited with status {run_result['returncode']}")
+    metrics.SANDBOX_RUNS.inc(outcome=outcome)
+    if run_result["resources"]:
+        metrics.SANDBOX_SECONDS.observe(run_result["resources"]["wall_ms"] / 1000)
+        if run_result["resources"]["cpu_ms"] is not None:
+            metrics.SANDBOX_CPU_SECONDS.inc(run_result["resources"]["cpu_ms"] / 1000)
+    return errors
+
+def execute_native_code(code_path, language):
+    """Compile and run a C or Java file in the sandbox (see native_runner).
+
+    Returns execution results shaped like execute_python_code's, without plots.
+    When the file does not compile, the error is the compiler's diagnostics.
+    """
+    results = empty_execution_results()
+    try:
+        build, run_result = native_executor.run(
+            language, code_path,
+            timeout=30,  # Limit execution time to 30 seconds
+            limits=SANDBOX_LIMITS,
+            output_limit=Config.SANDBOX_MAX_OUTPUT_BYTES
+        )
+        results["build"] = {key: build[key] for key in ('compiled', 'cached', 'compile_ms')}
+        if run_result is None:
+            results["error"] = f"Compilation failed:\n{build['diagnostics']}"
+            metrics.SANDBOX_RUNS.inc(outcome='build_error')
+            return results
+        errors = record_run(results, run_result)
+        if errors:
+            results["error"] = "\n".join(errors)
+    except subprocess.TimeoutExpired:
+        results["error"] = "Code execution timed out (limit: 30 seconds)"
+        metrics.SANDBOX_RUNS.inc(outcome='timeout')
+    except Exception as e:
+        results["error"] = str(e)
+        metrics.ERRORS.inc(stage='execution')
+    return results
+
+def execute_python_code(code_path, output_dir, interpret_plots=True):
+    """Execute Python code in a safe environment and capture output and plots.
+
+    Every matplotlib figure is captured in memory, at each plt.show() and when the
+    script ends. The images are downscaled and recompressed (see plot_images), then
+    written once to output_dir, with the code file name as prefix so that several
+    files can be executed into the same report, and are also returned in plot_images
+    (filename -> bytes). Set interpret_plots to False to leave plot interpretation to
+    the caller.
+
+    Notebooks run cell by cell, and results["cells"] gives the output, error and
+    plots of each cell. A notebook already run from top to bottom is not run again
+    when Config.NOTEBOOK_REUSE_OUTPUTS is set: its stored outputs are used instead.
+    """
+    cells = None
+    if Path(code_path).suffix.lower() == '.ipynb':
+        cells = notebooks.code_cells(notebooks.read_notebook(code_path))
+        if Config.NOTEBOOK_REUSE_OUTPUTS and notebooks.has_stored_outputs(cells):
+            return execute_notebook_outputs(code_path, cells, output_dir, interpret_plots)
+
+    results = empty_execution_results()
+
     # Create a temporary directory for execution
     with tempfile.TemporaryDirectory() as temp_dir:
-        # Copy the code file to the temp directory
-        file_ext = Path(code_path).suffix.lower()
-
-        if file_ext == '.ipynb':
-            # For Jupyter notebooks, extract code and save as a Python file
-            code_content = read_jupyter_notebook(code_path)
-            temp_code_path = os.path.join(temp_dir, os.path.basename(code_path).replace('.ipynb', '.py'))
-            with open(temp_code_path, 'w', encoding='utf-8') as dst:
-                dst.write(code_content)
-        else:
-            # For regular Python files
-            temp_code_path = os.path.join(temp_dir, os.path.basename(code_path))
-            with open(code_path, 'r', encoding='utf-8') as src, open(temp_code_path, 'w', encoding='utf-8') as dst:
-                dst.write(src.read())
+        temp_code_path = os.path.join(temp_dir, os.path.basename(code_path))
+        if cells is None:
+            # Copy the code file to the temp directory, in the kernel (sendfile) without going
+            # through Python buffers; not hard-linked, so the code cannot modify the uploaded file
+            shutil.copyfile(code_path, temp_code_path)
 
-        # Execute the code and capture output
+        # Execute the code and capture output and figures
         try:
-            # Add matplotlib code to save figures
-            plot_capture_code = """
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
-
-# Store the original plt.figure and plt.savefig functions
-original_figure = plt.figure
-original_show = plt.show
-
-# Counter for figure files
-figure_counter = 0
-
-# Override plt.figure to track created figures
-def custom_figure(*args, **kwargs):
-    global figure_counter
-    fig = original_figure(*args, **kwargs)
-    figure_counter += 1
-    return fig
-
-# Override plt.show to save figures instead of displaying them
-def custom_show():
-    global figure_counter
-    plt.savefig(f'figure_{figure_counter}.png')
-    original_show()
-
-plt.figure = custom_figure
-plt.show = custom_show
-"""
-
-            # Create a wrapper script that captures matplotlib plots
-            wrapper_path = os.path.join(temp_dir, "wrapper.py")
-            with open(wrapper_path, 'w', encoding='utf-8') as f:
-                f.write(plot_capture_code)
-                f.write(f"\n\n# Execute the original script\nexec(open('{os.path.basename(temp_code_path)}').read())\n")
-
-            # Run the wrapper script
-            process = subprocess.run(
-                ['python', wrapper_path],
-                cwd=temp_dir,
-                capture_output=True,
-                text=True,
-                timeout=30  # Limit execution time to 30 seconds
+            # Run the script (or the notebook's cells), in a warm sandbox worker when the pool is enabled
+            run = sandbox_pool.run if sandbox_pool is not None else run_cold
+            run_result = run(
+                temp_dir,
+                os.path.basename(temp_code_path),
+                timeout=30,  # Limit execution time to 30 seconds
+                limits=SANDBOX_LIMITS,
+                output_limit=Config.SANDBOX_MAX_OUTPUT_BYTES,
+                figures={'format': Config.PLOT_FORMAT, 'dpi': Config.PLOT_DPI},
+                cells=[notebooks.executable_source(cell['source']) for cell in cells] if cells is not None else None
             )
 
-            results["output"] = process.stdout
-            if process.stderr:
-                results["error"] = process.stderr
-
-            # Collect any generated plot images and interpret them
-            for file in os.listdir(temp_dir):
-                if file.startswith("figure_") and file.endswith(".png"):
-                    plot_path = os.path.join(temp_dir, file)
-                    output_plot_path = os.path.join(output_dir, file)
-                    with open(plot_path, 'rb') as src, open(output_plot_path, 'wb') as dst:
-                        dst.write(src.read())
-                    results["plots"].append(output_plot_path)
-
-                    # Interpret the plot
-                    interpretation = interpret_plot(output_plot_path)
-                    results["plot_interpretations"][file] = interpretation
+            errors = record_run(results, run_result)
+
+            # Save the captured figures (in capture order) for the report and interpret them
+            plot_filenames = {}
+            for index, image in enumerate(run_result["figures"]):
+                plot_filenames[index] = save_plot(
+                    image, Config.PLOT_FORMAT, code_path, index + 1, output_dir, results, interpret_plots
+                )
+
+            if run_result["cells"] is not None:
+                # Errors of the cells first, then those of the whole run (timeout, limits)
+                results["run_error"] = "\n".join(errors) or None
+                errors = add_cell_results(results, run_result["cells"], plot_filenames) + errors
+                results["output_truncated"] = results["output_truncated"] or any(
+                    cell["truncated"] for cell in run_result["cells"]
+                )
+            if errors:
+                results["error"] = "\n".join(errors)
 
         except subprocess.TimeoutExpired:
             results["error"] = "Code execution timed out (limit: 30 seconds)"
+            metrics.SANDBOX_RUNS.inc(outcome='timeout')
         except Exception as e:
             results["error"] = str(e)
+            metrics.ERRORS.inc(stage='execution')
 
     return results
 
-def generate_markdown_content(lab_info, code_analyses):
-    """Generate Markdown content for the lab report."""
-    md_content = []
+def is_reusable_execution(results):
+    """Whether the execution results of a previous report can be reused for the same code.
+
+    Runs that failed (error, timeout, limit, build or sandbox failure) and plots whose
+    interpretation failed are redone, since the failure may not happen again.
+    """
+    return not results.get('error') and not results.get('run_error') and PLOT_INTERPRETATION_FALLBACK not in (
+        results.get('plot_interpretations') or {}
+    ).values()
+
+def append_output(md_content, output, error):
+    """Add the execution output (truncated) and error sections of a run or a notebook cell."""
+    if output:
+        md_content.append("### Execution Output\n")
+        md_content.append(f"```\n{output[:500] + ('...' if len(output) > 500 else '')}\n```\n\n")
+
+    if error:
+        md_content.append("### Execution Error\n")
+        md_content.append(f"```\n{error}\n```\n\n")
 
-    # Title
-    md_content.append(f"# {lab_info.get('title', 'Lab Report')}\n")
+def append_plot(md_content, images, plot_path, interpretations, embedded_plots):
+    """Add a plot and its interpretation, embedding identical images only once (see embedded_plots).
 
-    # Objectives
-    md_content.append("## Objectives\n")
-    for objective in lab_info.get("objectives", []):
-        md_content.append(f"* {objective}\n")
+    The image is referenced by a placeholder for its path, which is added to images
+    (see section_render).
+    """
+    plot_filename = os.path.basename(plot_path)
+    try:
+        images.append(embedded_plots.setdefault(report_manifest.file_hash(plot_path), plot_path))
+    except OSError:
+        images.append(plot_path)
+    md_content.append("### Generated Plot\n")
+    md_content.append(f"![{plot_filename}]({section_render.IMAGE_PLACEHOLDER.format(len(images) - 1)})\n\n")
+
+    # Add plot interpretation if available
+    if plot_filename in interpretations:
+        md_content.append("#### Plot Interpretation\n")
+        md_content.append(f"{interpretations[plot_filename]}\n\n")
+
+def header_markdown(lab_info):
+    """Markdown of the report title and objectives."""
+    md_content = [f"# {lab_info.get('title', 'Lab Report')}\n", "## Objectives\n"]
+    md_content.extend(f"* {objective}\n" for objective in lab_info.get("objectives", []))
     md_content.append("\n")
+    return "".join(md_content)
 
-    # Code analyses
-    for i, analysis in enumerate(code_analyses):
-        # Exercise title if available
-        if i < len(lab_info.get("exercises", [])):
-            exercise_title = lab_info["exercises"][i]
-            md_content.append(f"## Exercise: {exercise_title}\n")
-        else:
-            md_content.append(f"## Code Sample {i+1}\n")
+def section_markdown(heading, analysis, embedded_plots):
+    """Markdown of the section of one code analysis, and the paths of its images."""
+    md_content = []
+    images = []
+    code = analysis['code']
+
+    md_content.append(f"## {heading}\n")
+    md_content.append(f"**File:** {analysis['filename']}\n\n")
+
+    # Code block
+    code_block = analysis.get('code_block', code[:1000] + ('...' if len(code) > 1000 else ''))
+    md_content.append("### Source Code\n")
+    md_content.append(f"```{analysis['language']}\n{code_block}\n```\n\n")
+
+    # Analysis
+    md_content.append("### Analysis\n")
+    md_content.append(f"{analysis['explanation']}\n\n")
+
+    # Output (for Python files)
+    execution_results = analysis.get('execution_results')
+    if not execution_results:
+        return "".join(md_content), images
+
+    plots = execution_results.get('plots', [])
+    interpretations = execution_results.get('plot_interpretations') or {}
+    if execution_results.get('cells') is not None:
+        # Notebooks: output, errors and plots of each cell
+        plot_paths = {os.path.basename(plot_path): plot_path for plot_path in plots}
+        for cell in execution_results['cells']:
+            if not (cell.get('output') or cell.get('error') or cell.get('plots')):
+                continue
+            md_content.append(f"### Cell {cell['number']}\n")
+            append_output(md_content, cell.get('output'), cell.get('error'))
+            for plot_filename in cell.get('plots', []):
+                append_plot(md_content, images, plot_paths.get(plot_filename, plot_filename), interpretations, embedded_plots)
+        # Errors of the whole run (timeout, limits) are not attributed to a cell
+        append_output(md_content, None, execution_results.get('run_error'))
+    else:
+        append_output(md_content, execution_results.get('output'), execution_results.get('error'))
 
-        # File name
-        md_content.append(f"**File:** {analysis['filename']}\n\n")
+        # Add plots if any, embedding identical images only once
+        for plot_path in plots:
+            append_plot(md_content, images, plot_path, interpretations, embedded_plots)
 
-        # Code block
-        md_content.append("### Source Code\n")
-        md_content.append(f"```{analysis['language']}\n{analysis.get('code_block', analysis['code'][:1000] + ('...' if len(analysis['code']) > 1000 else ''))}\n```\n\n")
+    return "".join(md_content), images
 
-        # Analysis
-        md_content.append("### Analysis\n")
-        md_content.append(f"{analysis['explanation']}\n\n")
+def report_sections(lab_info, code_analyses):
+    """Markdown of the parts of the report (header, then one section per analysis) with their images."""
+    exercises = lab_info.get("exercises", [])
+    embedded_plots = {}
+    sections = [(header_markdown(lab_info), [])]
+    for i, analysis in enumerate(code_analyses):
+        # Exercise title if available
+        heading = f"Exercise: {exercises[i]}" if i < len(exercises) else f"Code Sample {i+1}"
+        sections.append(section_markdown(heading, analysis, embedded_plots))
+    return sections
 
-        # Output (for Python files)
-        if analysis.get('execution_results'):
-            if analysis['execution_results'].get('output'):
-                md_content.append("### Execution Output\n")
-                md_content.append(f"```\n{analysis['execution_results']['output'][:500] + ('...' if len(analysis['execution_results']['output']) > 500 else '')}\n```\n\n")
+def generate_markdown_content(lab_info, code_analyses, sections=None):
+    """Generate Markdown content for the lab report."""
+    sections = sections or report_sections(lab_info, code_analyses)
+    return "".join(section_render.fill_images(md, images) for md, images in sections)
 
-            if analysis['execution_results'].get('error'):
-                md_content.append("### Execution Error\n")
-                md_content.append(f"```\n{analysis['execution_results']['error']}\n```\n\n")
+@functools.lru_cache(maxsize=None)
+def get_report_template():
+    """Load and compile the HTML template of the report (Config.REPORT_TEMPLATE) once per process."""
+    import jinja2
 
-            # Add plots if any
-            for plot_path in analysis['execution_results'].get('plots', []):
-                plot_filename = os.path.basename(plot_path)
-                md_content.append("### Generated Plot\n")
-                md_content.append(f"![{plot_filename}]({plot_path})\n\n")
+    template_dir, template_name = os.path.split(Config.REPORT_TEMPLATE)
+    environment = jinja2.Environment(loader=jinja2.FileSystemLoader(template_dir))
+    return environment.get_template(template_name)
 
-                # Add plot interpretation if available
-                if analysis['execution_results'].get('plot_interpretations') and plot_filename in analysis['execution_results']['plot_interpretations']:
-                    md_content.append("#### Plot Interpretation\n")
-                    md_content.append(f"{analysis['execution_results']['plot_interpretations'][plot_filename]}\n\n")
+def warmup():
+    """Load what the first report would otherwise pay for, ahead of it.
 
-    return "".join(md_content)
+    Imports the heavy dependencies left out of the module imports (markdown, PIL,
+    the PDF engine, the LLM client and its backend), compiles the report template and
+    starts the warm sandbox pool and the Java compile server. Meant to run in the background once a server
+    process is up (Config.WARMUP); errors are reported and left for the first report.
+    """
+    start = time.perf_counter()
+    try:
+        section_render.markdown_to_html("")
+        section_render.highlight_css()
+        import PIL.Image  # noqa: F401
+        get_report_template()
+        pdf_renderer.get_renderer(Config.PDF_RENDERER)
+        if sandbox_pool is not None:
+            sandbox_pool.start()
+        if native_executor is not None and native_executor.server is not None and native_executor.available('java'):
+            native_executor.server.start()
+        get_client()
+    except Exception as e:
+        metrics.ERRORS.inc(stage='warmup')
+        print(f"Error warming up the report generator: {str(e)}")
+    return time.perf_counter() - start
 
-def generate_pdf_report(lab_info, code_analyses, output_dir):
-    """Generate a PDF report with the lab information and code analyses using Markdown."""
-    # Generate Markdown content
-    md_content = generate_markdown_content(lab_info, code_analyses)
-
-    # Save Markdown content to a file
-    md_path = os.path.join(output_dir, "lab_report.md")
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(md_content)
-
-    # Convert Markdown to HTML
-    html_content = markdown.markdown(md_content, extensions=['fenced_code', 'tables'])
-
-    # Add some basic styling
-    styled_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; }}
-            h1 {{ color: #333; }}
-            h2 {{ color: #444; margin-top: 20px; }}
-            h3 {{ color: #555; }}
-            pre {{ background-color: #f5f5f5; padding: 10px; border-radius: 5px; overflow-x: auto; }}
-            code {{ font-family: Consolas, monospace; }}
-            img {{ max-width: 100%; height: auto; }}
-        </style>
-    </head>
-    <body>
-        {html_content}
-    </body>
-    </html>
+def generate_pdf_report(lab_info, code_analyses, output_dir, renderer=None):
+    """Generate a PDF report with the lab information and code analyses using Markdown.
+
+    The report is rendered by renderer, or by the one selected with Config.PDF_RENDERER
+    (see pdf_renderer). The intermediate lab_report.md and lab_report.html are only
+    written when Config.REPORT_KEEP_INTERMEDIATE is set. If rendering fails, or 'auto'
+    finds no PDF engine, the HTML report is returned instead and counted as a pdf error.
     """
+    if renderer is None:
+        renderer = pdf_renderer.get_renderer(Config.PDF_RENDERER)
+        if Config.PDF_RENDERER == 'auto' and renderer.extension == '.html':
+            metrics.ERRORS.inc(stage='pdf')
+
+    # Generate the Markdown of each section and convert the ones not seen before to HTML
+    with progress.stage('markdown'):
+        sections = report_sections(lab_info, code_analyses)
+        styled_html = get_report_template().render(
+            title=lab_info.get('title', 'Lab Report'),
+            highlight_css=section_render.highlight_css(),
+            sections=[section_cache.render(md, images) for md, images in sections]
+        )
 
-    # Save HTML content to a file
     html_path = os.path.join(output_dir, "lab_report.html")
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(styled_html)
-
-    # Convert HTML to PDF
-    pdf_path = os.path.join(output_dir, "lab_report.pdf")
+    if Config.REPORT_KEEP_INTERMEDIATE:
+        with open(os.path.join(output_dir, "lab_report.md"), 'w', encoding='utf-8') as f:
+            f.write(generate_markdown_content(lab_info, code_analyses, sections))
+        if renderer.extension != '.html':
+            with open(html_path, 'w', encoding='utf-8') as f:
+                f.write(styled_html)
+
+    report_path = os.path.join(output_dir, f"lab_report{renderer.extension}")
     try:
-        pdfkit.from_file(html_path, pdf_path)
+        with progress.stage('render', renderer.name):
+            renderer.render(styled_html, report_path, output_dir)
     except Exception as e:
-        print(f"Error converting HTML to PDF: {str(e)}")
-        # If pdfkit fails, try to use the HTML file directly
+        print(f"Error rendering the report with {renderer.name}, falling back to HTML: {str(e)}")
+        metrics.ERRORS.inc(stage='pdf')
+        pdf_renderer.RENDERERS['html'].render(styled_html, html_path, output_dir)
         return html_path
 
-    return pdf_path
+    return report_path
 
-def generate_report(instruction_path, code_paths, output_dir):
-    """Main function to generate a lab report from instruction and code files."""
-    # Parse the instruction file
-    lab_info = parse_instruction_file(instruction_path)
+def get_language(code_path):
+    """Return the language name used for a code file."""
+    file_ext = Path(code_path).suffix.lower()
+    return {'.py': 'python', '.java': 'java', '.c': 'c', '.ipynb': 'python'}.get(file_ext, 'text')
 
-    # Analyze each code file
-    code_analyses = []
-    for i, code_path in enumerate(code_paths):
-        file_ext = Path(code_path).suffix.lower()
-        language = {'.py': 'python', '.java': 'java', '.c': 'c', '.ipynb': 'python'}.get(file_ext, 'text')
+def generate_report(instruction_path, code_paths, output_dir, max_workers=None, progress_callback=None,
+                    previous_dir=None, lab_info=None, file_hashes=None):
+    """Main function to generate a lab report from instruction and code files.
+
+    Instruction parsing, code analysis, code execution and plot interpretation run
+    concurrently on a thread pool of at most max_workers threads (Config.REPORT_MAX_WORKERS
+    by default). Results are assembled by file index, so the report order does not
+    depend on which task finishes first.
 
-        code = read_code_file(code_path)
+    progress_callback, if given, receives a stage event (see progress.ProgressTracker)
+    whenever a stage starts or finishes.
 
-        # Get the exercise title if available
-        exercise_title = None
-        if i < len(lab_info.get("exercises", [])):
-            exercise_title = lab_info["exercises"][i]
+    Notebooks longer than Config.NOTEBOOK_CHUNK_CHARS are analyzed in chunks of cells
+    whose analyses are merged, and executed cell by cell (see execute_python_code).
 
-        # Analyze the code with the exercise title to extract the relevant block
-        analysis_result = analyze_code(code, language, exercise_title)
+    previous_dir is the folder of an earlier report of the same student. Sections whose
+    inputs have the same hashes as in its manifest are reused instead of recomputed, and
+    the new report gets its own manifest (see report_manifest).
 
+    lab_info, if given, is the already parsed instruction file (see parse_instruction_file),
+    so that reports sharing the same instructions parse them only once.
+
+    file_hashes maps input paths to the SHA-256 of their content when it is already known
+    (computed while uploading), so that the files are not read again to hash them.
+    """
+    max_workers = max_workers or Config.REPORT_MAX_WORKERS
+    tracker = ProgressTracker(progress_callback)
+    tracker.emit('report', status='started', files=len(code_paths))
+
+    previous = report_manifest.load_manifest(previous_dir)
+    file_hashes = file_hashes or {}
+    instructions_hash = file_hashes.get(instruction_path) or report_manifest.file_hash(instruction_path)
+    code_hashes = [file_hashes.get(code_path) or report_manifest.file_hash(code_path) for code_path in code_paths]
+    languages = [get_language(code_path) for code_path in code_paths]
+    notebook_cells = [
+        notebooks.code_cells(notebooks.read_notebook(code_path)) if Path(code_path).suffix.lower() == '.ipynb' else None
+        for code_path in code_paths
+    ]
+    codes = [
+        notebooks.cells_code(cells) if cells is not None else read_code_file(code_path)
+        for code_path, cells in zip(code_paths, notebook_cells)
+    ]
+    analysis_keys = [None] * len(code_paths)
+    analysis_results = [None] * len(code_paths)
+    # Large notebooks: chunks of cells analyzed separately, and their analyses
+    notebook_chunks = {}
+    chunk_results = {}
+    execution_results = [None] * len(code_paths)
+    deduplicator = plot_images.PlotDeduplicator(
+        Config.PLOT_DEDUP_DISTANCE if Config.PLOT_DEDUP_DISTANCE >= 0 else None
+    )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def start_analyses(lab_info):
+            exercises = lab_info.get("exercises", [])
+            for j, code in enumerate(codes):
+                # Get the exercise title if available
+                exercise_title = exercises[j] if j < len(exercises) else None
+                filename = os.path.basename(code_paths[j])
+                analysis_keys[j] = report_manifest.analysis_key(
+                    code_hashes[j], languages[j], exercise_title, analysis_scope()
+                )
+
+                reused = report_manifest.find_analysis(previous, analysis_keys[j])
+                if reused is not None and not reused['explanation'].startswith("Error analyzing code:"):
+                    analysis_results[j] = {'code_block': reused['code_block'], 'explanation': reused['explanation']}
+                    tracker.emit('analysis', filename, 'reused', elapsed_ms=0, tokens=0)
+                    continue
+
+                if notebook_cells[j] is not None and len(code) > Config.NOTEBOOK_CHUNK_CHARS:
+                    # Analyze the chunks of a large notebook in parallel, merged once all are done
+                    chunks = notebook_chunks[j] = notebooks.chunk_cells(notebook_cells[j], Config.NOTEBOOK_CHUNK_CHARS)
+                    chunk_results[j] = [None] * len(chunks)
+                    for k, chunk in enumerate(chunks):
+                        chunk_code = notebooks.chunk_code(chunk)
+                        chunk_hash = hashlib.sha256(chunk_code.encode('utf-8')).hexdigest()
+                        future = executor.submit(
+                            tracker.run, 'analysis', f"{filename} ({notebooks.chunk_label(chunk)})",
+                            coalesce, 'analysis', report_manifest.analysis_key(
+                                chunk_hash, languages[j], exercise_title, analysis_scope()
+                            ),
+                            analyze_code, chunk_code, languages[j], exercise_title
+                        )
+                        pending[future] = ('analysis_chunk', (j, k))
+                    continue
+
+                # Analyze the code with the exercise title to extract the relevant block
+                future = executor.submit(
+                    tracker.run, 'analysis', filename,
+                    coalesce, 'analysis', analysis_keys[j], analyze_code, code, languages[j], exercise_title
+                )
+                pending[future] = ('analysis', j)
+
+        # Instruction parsing and code execution do not depend on anything: start them first
+        if lab_info is not None:
+            tracker.emit('instructions', os.path.basename(instruction_path), 'reused', elapsed_ms=0, tokens=0)
+            start_analyses(lab_info)
+        elif (previous is not None and previous['instructions']['hash'] == instructions_hash
+              and not previous['instructions']['lab_info'].get('fallback')):
+            lab_info = previous['instructions']['lab_info']
+            tracker.emit('instructions', os.path.basename(instruction_path), 'reused', elapsed_ms=0, tokens=0)
+            start_analyses(lab_info)
+        else:
+            future = executor.submit(
+                tracker.run, 'instructions', os.path.basename(instruction_path),
+                coalesce, 'instructions', instructions_hash, parse_instruction_file, instruction_path
+            )
+            pending[future] = ('instructions', None)
+
+        for i, code_path in enumerate(code_paths):
+            if languages[i] == 'python':
+                execute, args = execute_python_code, (code_path, output_dir, False)
+            elif native_executor is not None and native_executor.available(languages[i]):
+                execute, args = execute_native_code, (code_path, languages[i])
+            else:
+                continue
+            filename = os.path.basename(code_path)
+            reused = report_manifest.find_execution(previous, code_hashes[i])
+            if reused is not None and is_reusable_execution(reused['execution_results']):
+                execution_results[i] = report_manifest.reuse_execution(
+                    previous, reused, output_dir, plot_prefix(code_path)
+                )
+                if execution_results[i] is not None:
+                    tracker.emit('execution', filename, 'reused', elapsed_ms=0, tokens=0)
+                    continue
+            future = executor.submit(tracker.run, 'execution', filename, execute, *args)
+            pending[future] = ('execution', i)
+
+        # Fan out the dependent tasks as soon as their inputs are ready
+        interpretation_futures = []
+        duplicate_plots = []
+        optimized_bytes_saved = 0
+        while pending:
+            done = next(as_completed(pending))
+            kind, i = pending.pop(done)
+
+            if kind == 'instructions':
+                lab_info = done.result()
+                start_analyses(lab_info)
+            elif kind == 'analysis':
+                analysis_results[i] = done.result()
+            elif kind == 'analysis_chunk':
+                j, k = i
+                chunk_results[j][k] = done.result()
+                if all(result is not None for result in chunk_results[j]):
+                    analysis_results[j] = notebooks.merge_analyses(notebook_chunks[j], chunk_results[j])
+            elif kind == 'execution':
+                execution_results[i] = done.result()
+                plot_stats = execution_results[i]['plot_stats']
+                optimized_bytes_saved += plot_stats['original_bytes'] - plot_stats['optimized_bytes']
+                for plot_path in execution_results[i]['plots']:
+                    plot_filename = os.path.basename(plot_path)
+                    image = execution_results[i]['plot_images'][plot_filename]
+                    # A plot looking like an earlier one shares its interpretation
+                    original = deduplicator.add(plot_filename, image)
+                    if original is not None:
+                        duplicate_plots.append((i, plot_filename, original))
+                        continue
+                    future = executor.submit(
+                        tracker.run, 'plot_interpretation', plot_filename,
+                        coalesce, 'plot_interpretation', hashlib.sha256(image).hexdigest(), interpret_plot, plot_path, image
+                    )
+                    interpretation_futures.append((i, plot_filename, future))
+
+        interpretations = {}
+        for i, plot_filename, future in interpretation_futures:
+            interpretations[plot_filename] = future.result()
+            execution_results[i]['plot_interpretations'][plot_filename] = interpretations[plot_filename]
+        for i, plot_filename, original in duplicate_plots:
+            execution_results[i]['plot_interpretations'][plot_filename] = interpretations[original]
+
+    # What plot optimization and deduplication saved in this run
+    if optimized_bytes_saved or deduplicator.exact or deduplicator.near:
+        tracker.emit(
+            'plots', status='done', elapsed_ms=0, tokens=0,
+            exact_duplicates=deduplicator.exact,
+            near_duplicates=deduplicator.near,
+            calls_saved=deduplicator.exact + deduplicator.near,
+            bytes_saved=optimized_bytes_saved + deduplicator.duplicate_bytes
+        )
+
+    code_analyses = []
+    sections = []
+    for i, code_path in enumerate(code_paths):
         analysis = {
             'filename': os.path.basename(code_path),
-            'language': language,
-            'code': code,
-            'code_block': analysis_result['code_block'],
-            'explanation': analysis_result['explanation']
+            'language': languages[i],
+            'code': codes[i],
+            'code_block': analysis_results[i]['code_block'],
+            'explanation': analysis_results[i]['explanation']
         }
-
-        # Execute Python code if applicable
-        if language == 'python' or file_ext == '.ipynb':
-            execution_results = execute_python_code(code_path, output_dir)
-            analysis['execution_results'] = execution_results
-
+        if execution_results[i] is not None:
+            analysis['execution_results'] = execution_results[i]
         code_analyses.append(analysis)
+        sections.append({
+            'filename': analysis['filename'],
+            'language': languages[i],
+            'code_hash': code_hashes[i],
+            'analysis_key': analysis_keys[i],
+            'code_block': analysis['code_block'],
+            'explanation': analysis['explanation'],
+            'execution_results': execution_results[i]
+        })
 
     # Generate the PDF report
-    report_path = generate_pdf_report(lab_info, code_analyses, output_dir)
+    with tracker.stage('pdf'):
+        report_path = generate_pdf_report(lab_info, code_analyses, output_dir)
+    # A failed instructions parse is saved without its hash, so that the next report parses them again
+    report_manifest.save_manifest(output_dir, None if lab_info.get('fallback') else instructions_hash, lab_info, sections)
+    tracker.emit('report', elapsed_ms=round((time.perf_counter() - tracker.start) * 1000))
+    if Config.REPORT_TIMINGS:
+        with open(os.path.join(output_dir, "timings.json"), 'w', encoding='utf-8') as f:
+            json.dump([event for event in tracker.events if event['status'] != 'started'], f, indent=2)
     return report_path
@@ -0,0 +1,135 @@
+"""Per-report manifest of input hashes and the section artifacts derived from them.
+
+Every generated report stores a manifest.json next to the report file. When a
+student resubmits, the manifest of the previous report tells which inputs are
+unchanged, so their lab info, analyses, execution results and plots can be
+reused instead of recomputed.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def file_hash(path):
+    """Return the SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def analysis_key(code_hash, language, exercise_title, scope=None):
+    """Return the key of a code analysis: same code, language and exercise, same analysis.
+
+    scope names what else the analysis depends on (analysis mode, LLM backend and model),
+    so that an analysis made under another configuration is not reused.
+    """
+    data = json.dumps([code_hash, language, exercise_title, scope])
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def load_manifest(report_dir):
+    """Return the manifest stored in report_dir, or None if it is missing or unreadable."""
+    if not report_dir:
+        return None
+    path = os.path.join(report_dir, MANIFEST_FILENAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    manifest['report_dir'] = report_dir
+    return manifest
+
+
+def save_manifest(report_dir, instructions_hash, lab_info, sections):
+    """Write the manifest of a report.
+
+    sections is a list of dicts with the input hashes of a code file (code_hash,
+    analysis_key) and its artifacts (code_block, explanation, execution_results).
+    Plot paths are stored relative to report_dir and image bytes are left out.
+    """
+    stored_sections = []
+    for section in sections:
+        stored = dict(section)
+        execution_results = section.get('execution_results')
+        if execution_results is not None:
+            stored['execution_results'] = {
+                key: value for key, value in execution_results.items() if key != 'plot_images'
+            }
+            stored['execution_results']['plots'] = [os.path.basename(p) for p in execution_results['plots']]
+        stored_sections.append(stored)
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'instructions': {'hash': instructions_hash, 'lab_info': lab_info},
+        'sections': stored_sections
+    }
+    path = os.path.join(report_dir, MANIFEST_FILENAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def find_analysis(manifest, key):
+    """Return the previous section analyzed with the given analysis key, if any."""
+    for section in (manifest or {}).get('sections', []):
+        if section.get('analysis_key') == key:
+            return section
+    return None
+
+
+def find_execution(manifest, code_hash):
+    """Return the previous section that executed the same code, if any."""
+    for section in (manifest or {}).get('sections', []):
+        if section.get('code_hash') == code_hash and section.get('execution_results') is not None:
+            return section
+    return None
+
+
+def reuse_execution(manifest, section, output_dir, plot_prefix):
+    """Bring the execution results of a previous section into output_dir.
+
+    Plot files are hard-linked (or copied) from the previous report and renamed
+    with plot_prefix. Returns execution results shaped like execute_python_code's,
+    or None if the plots cannot be brought (the previous report was deleted meanwhile).
+    """
+    previous = section['execution_results']
+    results = dict(previous)
+    results['plots'] = []
+    results['plot_images'] = {}
+    results['plot_interpretations'] = {}
+    renamed = {}
+    created = []
+    for old_filename in previous['plots']:
+        suffix = old_filename[old_filename.rindex('_figure_'):]
+        new_filename = renamed[old_filename] = f"{plot_prefix}{suffix}"
+        src = os.path.join(manifest['report_dir'], old_filename)
+        dst = os.path.join(output_dir, new_filename)
+        if not os.path.exists(dst):
+            try:
+                os.link(src, dst)
+            except OSError:
+                try:
+                    shutil.copyfile(src, dst)
+                except OSError as e:
+                    print(f"Error reusing plot {old_filename}: {str(e)}")
+                    for path in created:
+                        os.remove(path)
+                    return None
+            created.append(dst)
+        results['plots'].append(dst)
+        if old_filename in previous.get('plot_interpretations', {}):
+            results['plot_interpretations'][new_filename] = previous['plot_interpretations'][old_filename]
+    if previous.get('cells') is not None:
+        results['cells'] = [
+            dict(cell, plots=[renamed.get(name, name) for name in cell['plots']]) for cell in previous['cells']
+        ]
+    return results
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import payload_files
+
+
+def make_key(payload, scope=None):
+    """Return the content address of an API request payload.
+
+    The payload is serialized canonically, so the key covers the model, the prompt
+    and any embedded file bytes (base64 images) at once. Files passed as
+    payload_files.Base64File are hashed as they are encoded, a slice at a time.
+    scope, if given, is hashed first: answers of different backends never share keys.
+    """
+    digest = hashlib.sha256()
+    if scope:
+        digest.update(scope.encode('utf-8') + b'\0')
+    parts = payload_files.json_parts(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    for chunk in payload_files.iter_bytes(parts):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Persistent SQLite cache of API responses with TTL and size-based LRU eviction."""
+
+    def __init__(self, db_path, ttl=7 * 24 * 3600, max_bytes=256 * 1024 * 1024):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl and row[1] < now - self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count('evictions')
+                row = None
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return row[0]
+
+    def put(self, key, value):
+        """Store value under key, then evict expired and least recently used entries."""
+        now = time.time()
+        size = len(key) + len(value.encode('utf-8'))
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            evicted = 0
+            if self.ttl:
+                evicted += conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+                ).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if self.max_bytes and total > self.max_bytes:
+                for old_key, old_size in conn.execute(
+                    "SELECT key, size FROM responses WHERE key != ? ORDER BY accessed_at", (key,)
+                ).fetchall():
+                    conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    evicted += 1
+                    total -= old_size
+                    if total <= self.max_bytes:
+                        break
+            conn.execute("COMMIT")
+        if evicted:
+            self._count('evictions', evicted)
+
+    def delete(self, key):
+        """Remove the value cached under key, if any."""
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def stats(self):
+        """Return the hit/miss/eviction counters and the current cache size."""
+        with closing(self._connect()) as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': size
+            }
+
+    def clear(self):
+        """Remove every cached response."""
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM responses")
@@ -0,0 +1,664 @@
+"""Warm pool of Python executor processes for running student code.
+
+Each worker is a long-lived `python sandbox.py` process that imports matplotlib
+(with the Agg backend) and numpy once, then waits for jobs on stdin. On POSIX a
+job runs in a child forked from the worker, so every run starts from the same
+pre-imported, untouched state without paying for interpreter boot and imports.
+Where fork is unavailable the job runs in the worker itself, which is then
+recycled.
+
+Jobs can run under resource limits (address space, CPU seconds, file size and
+process count, applied with setrlimit in the forked child). Output is read
+incrementally into bounded buffers that keep the head and the tail of each
+stream, and every run reports its wall time, CPU time and peak RSS.
+
+Matplotlib figures are captured in memory rather than shown: every open figure
+is rendered at each plt.show() call and when the script ends, and the image
+bytes travel back to the parent over a pipe, without touching the disk.
+
+A job can also run a list of notebook cells instead of a script: the cells run
+in order in one namespace, each with its own captured output and figures, and
+a cell that raises does not stop the next ones.
+
+A job can also run a command (a compiled C program, a JVM) instead of Python
+code: the forked child applies the limits and execs it, so native programs get
+the same limits, output capture and resource report as scripts.
+
+Protocol: the parent writes one JSON object per line to the worker's stdin and
+reads one JSON object per line back from its stdout.
+"""
+import base64
+import io
+import json
+import struct
+import os
+import queue
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SANDBOX_SCRIPT = os.path.abspath(__file__)
+CAN_FORK = hasattr(os, 'fork')
+
+# File descriptor of the worker's protocol stream, closed in forked children
+_protocol_fd = None
+
+# Default number of bytes of stdout/stderr kept per run
+DEFAULT_OUTPUT_LIMIT = 64 * 1024
+
+# Seconds the parent waits past a job's timeout before killing an unresponsive worker
+TIMEOUT_GRACE = 5
+
+# Default figure capture settings
+DEFAULT_FIGURES = {'format': 'png', 'dpi': 100, 'max_bytes': 50 * 1024 * 1024}
+
+# Bytes of per-cell results a job may send back, past which later cells are not reported
+MAX_CELL_BYTES = 16 * 1024 * 1024
+
+
+def make_limits(memory_mb=None, cpu_seconds=None, file_mb=None, processes=None):
+    """Build the resource limits of a job; None leaves a resource unlimited."""
+    limits = {}
+    if memory_mb:
+        limits['RLIMIT_AS'] = memory_mb * 1024 * 1024
+    if cpu_seconds:
+        limits['RLIMIT_CPU'] = cpu_seconds
+    if file_mb:
+        limits['RLIMIT_FSIZE'] = file_mb * 1024 * 1024
+    if processes:
+        limits['RLIMIT_NPROC'] = processes
+    return limits
+
+
+def apply_limits(limits):
+    """Lower the resource limits of the current process."""
+    if resource is None:
+        return
+    for name, value in limits.items():
+        rlimit = getattr(resource, name, None)
+        if rlimit is None:
+            continue
+        _, hard = resource.getrlimit(rlimit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(rlimit, (value, value))
+
+
+class BoundedOutput:
+    """Keeps the first and the last bytes written to it and drops the middle."""
+
+    def __init__(self, limit=DEFAULT_OUTPUT_LIMIT):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data):
+        self.total += len(data)
+        if len(self.head) < self.head_limit:
+            room = self.head_limit - len(self.head)
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    @property
+    def truncated(self):
+        return self.total > len(self.head) + len(self.tail)
+
+    def getvalue(self):
+        if not self.truncated:
+            return (bytes(self.head) + bytes(self.tail)).decode('utf-8', errors='replace')
+        dropped = self.total - len(self.head) - len(self.tail)
+        return (self.head.decode('utf-8', errors='replace')
+                + f"\n... [{dropped} bytes truncated] ...\n"
+                + self.tail.decode('utf-8', errors='replace'))
+
+
+class _TextWriter(io.TextIOBase):
+    """Text stream writing into a BoundedOutput."""
+
+    def __init__(self, output):
+        self.output = output
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.output.write(text.encode('utf-8', errors='replace'))
+        return len(text)
+
+
+def _install_figure_capture(send_figure, fmt, dpi):
+    """Replace plt.show with a capture of every open figure.
+
+    Returns the capture function, to be called again once the script ends for the
+    figures that were never shown.
+    """
+    import matplotlib.pyplot as plt
+
+    def capture_open_figures():
+        for number in plt.get_fignums():
+            buffer = io.BytesIO()
+            plt.figure(number).savefig(buffer, format=fmt, dpi=dpi)
+            send_figure(buffer.getvalue())
+        # Like closing the window of an interactive backend
+        plt.close('all')
+
+    def show(*args, **kwargs):
+        capture_open_figures()
+
+    plt.show = show
+    return capture_open_figures
+
+
+def _exec_script(script_path, capture_figures=None):
+    """Run a script as __main__ in the current process and return its exit code."""
+    sys.argv = [script_path]
+    sys.path.insert(0, os.getcwd())
+    namespace = {'__name__': '__main__', '__file__': script_path, '__builtins__': __builtins__}
+    try:
+        with open(script_path, 'r', encoding='utf-8') as f:
+            code = compile(f.read(), script_path, 'exec')
+        exec(code, namespace)
+        code = 0
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        # Hide this frame so the traceback looks like a plain `python script` run
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        code = 1
+
+    if capture_figures is not None:
+        try:
+            capture_figures()
+        except Exception:
+            traceback.print_exc()
+    return code
+
+
+def _exec_cells(cells, script_path, send_cell, output_limit, capture_figures=None, figures_sent=None):
+    """Run notebook cells in order in one namespace and return the exit code.
+
+    Like running all the cells of a notebook while ignoring errors: each cell's
+    stdout and stderr are captured on their own, its open figures are captured
+    when it ends (as with the inline backend), and send_cell receives its result
+    (number, stdout, stderr, status, truncated and the number of figures it sent,
+    as counted by figures_sent). The exit code is 1 if any cell raised.
+    """
+    sys.argv = [script_path]
+    sys.path.insert(0, os.getcwd())
+    namespace = {'__name__': '__main__', '__builtins__': __builtins__}
+    saved = sys.stdout, sys.stderr
+    code = 0
+    for number, source in enumerate(cells, start=1):
+        stdout, stderr = BoundedOutput(output_limit), BoundedOutput(output_limit)
+        first_figure = figures_sent() if figures_sent else 0
+        sys.stdout, sys.stderr = _TextWriter(stdout), _TextWriter(stderr)
+        status = 'ok'
+        try:
+            exec(compile(source, f"<cell {number}>", 'exec'), namespace)
+        except BaseException as e:
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            status = 'error'
+            code = 1
+        if capture_figures is not None:
+            try:
+                capture_figures()
+            except Exception:
+                traceback.print_exc()
+        sys.stdout, sys.stderr = saved
+        send_cell({
+            'number': number,
+            'stdout': stdout.getvalue(),
+            'stderr': stderr.getvalue(),
+            'status': status,
+            'truncated': stdout.truncated or stderr.truncated,
+            'figures': (figures_sent() if figures_sent else 0) - first_figure
+        })
+    return code
+
+
+def _exec_command(command):
+    """Replace the current process with command; returns an exit code only if it cannot be run."""
+    try:
+        os.execvp(command[0], command)
+    except OSError as e:
+        print(f"Cannot run {command[0]}: {e}", file=sys.stderr)
+    return 127
+
+
+def _attribute_figures(cells, figures):
+    """Give every cell result the indexes of its figures in the job's figure list."""
+    position = 0
+    for cell in cells:
+        count = cell['figures']
+        cell['figures'] = list(range(position, min(position + count, len(figures))))
+        position += count
+    return cells
+
+
+def _split_frames(data):
+    """Split length-prefixed frames received from a child."""
+    frames = []
+    offset = 0
+    while offset + 4 <= len(data):
+        (size,) = struct.unpack('>I', data[offset:offset + 4])
+        if offset + 4 + size > len(data):
+            break  # Incomplete frame, dropped past the size limit
+        frames.append(bytes(data[offset + 4:offset + 4 + size]))
+        offset += 4 + size
+    return frames
+
+
+def _run_forked(job):
+    """Run a job in a forked child, streaming its output into bounded buffers."""
+    output_limit = job.get('output_limit') or DEFAULT_OUTPUT_LIMIT
+    figures = dict(DEFAULT_FIGURES, **(job.get('figures') or {}))
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    fig_r, fig_w = os.pipe()
+    cell_r, cell_w = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(out_r)
+            os.close(err_r)
+            os.close(fig_r)
+            os.close(cell_r)
+            if _protocol_fd is not None:
+                os.close(_protocol_fd)
+            # Own process group, so that a timeout also kills the processes the job started
+            os.setpgid(0, 0)
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(out_w, 1)
+            os.dup2(err_w, 2)
+            os.chdir(job['cwd'])
+            apply_limits(job.get('limits') or {})
+
+            sent = [0]
+
+            def send_frame(fd, data):
+                frame = memoryview(struct.pack('>I', len(data)) + data)
+                while frame:
+                    frame = frame[os.write(fd, frame):]
+
+            def send_figure(data):
+                sent[0] += 1
+                send_frame(fig_w, data)
+
+            if job.get('command') is not None:
+                code = _exec_command(job['command'])
+                sys.stderr.flush()
+                return
+            capture = _install_figure_capture(send_figure, figures['format'], figures['dpi'])
+            if job.get('cells') is not None:
+                code = _exec_cells(
+                    job['cells'], job['script'], lambda cell: send_frame(cell_w, json.dumps(cell).encode('utf-8')),
+                    output_limit, capture, lambda: sent[0]
+                )
+            else:
+                code = _exec_script(job['script'], capture)
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+    os.close(out_w)
+    os.close(err_w)
+    os.close(fig_w)
+    os.close(cell_w)
+    outputs = {out_r: BoundedOutput(output_limit), err_r: BoundedOutput(output_limit)}
+    figure_data = bytearray()
+    cell_data = bytearray()
+    selector = selectors.DefaultSelector()
+    selector.register(out_r, selectors.EVENT_READ)
+    selector.register(err_r, selectors.EVENT_READ)
+    selector.register(fig_r, selectors.EVENT_READ)
+    selector.register(cell_r, selectors.EVENT_READ)
+    deadline = start + job['timeout'] if job.get('timeout') else None
+    timed_out = False
+    while selector.get_map():
+        if deadline is not None and not timed_out and time.perf_counter() >= deadline:
+            # Kill the child but keep draining the pipes to return the output so far
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                os.kill(pid, signal.SIGKILL)
+            timed_out = True
+        remaining = None if deadline is None or timed_out else max(0, deadline - time.perf_counter())
+        for key, _ in selector.select(remaining):
+            data = os.read(key.fd, 65536)
+            if data and key.fd == fig_r:
+                if len(figure_data) < figures['max_bytes']:
+                    figure_data += data
+            elif data and key.fd == cell_r:
+                if len(cell_data) < MAX_CELL_BYTES:
+                    cell_data += data
+            elif data:
+                outputs[key.fd].write(data)
+            else:
+                selector.unregister(key.fd)
+                os.close(key.fd)
+    selector.close()
+
+    _, status, usage = os.wait4(pid, 0)
+    peak_rss = usage.ru_maxrss if sys.platform != 'darwin' else usage.ru_maxrss // 1024
+    returncode = os.waitstatus_to_exitcode(status)
+    figure_frames = _split_frames(figure_data)
+    cells = None
+    if job.get('cells') is not None:
+        cells = _attribute_figures([json.loads(frame) for frame in _split_frames(cell_data)], figure_frames)
+    return {
+        'returncode': returncode,
+        'signal': signal.Signals(-returncode).name if returncode < 0 else None,
+        'timed_out': timed_out,
+        'stdout': outputs[out_r].getvalue(),
+        'stderr': outputs[err_r].getvalue(),
+        'truncated': outputs[out_r].truncated or outputs[err_r].truncated,
+        'figures': [base64.b64encode(frame).decode('ascii') for frame in figure_frames],
+        'cells': cells,
+        'resources': {
+            'wall_ms': round((time.perf_counter() - start) * 1000, 1),
+            'cpu_ms': round((usage.ru_utime + usage.ru_stime) * 1000, 1),
+            'peak_rss_kb': peak_rss
+        },
+        'recycle': False
+    }
+
+
+def _run_in_process(job):
+    """Run a job in the worker process itself (no fork available, no resource limits)."""
+    if job.get('command') is not None:
+        return _run_command_in_process(job)
+    output_limit = job.get('output_limit') or DEFAULT_OUTPUT_LIMIT
+    figures = dict(DEFAULT_FIGURES, **(job.get('figures') or {}))
+    stdout, stderr = BoundedOutput(output_limit), BoundedOutput(output_limit)
+    captured = []
+    cells = [] if job.get('cells') is not None else None
+    saved = sys.stdout, sys.stderr, sys.argv, list(sys.path), os.getcwd()
+    sys.stdout, sys.stderr = _TextWriter(stdout), _TextWriter(stderr)
+    start, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        os.chdir(job['cwd'])
+        capture = _install_figure_capture(captured.append, figures['format'], figures['dpi'])
+        if cells is not None:
+            code = _exec_cells(job['cells'], job['script'], cells.append, output_limit, capture, lambda: len(captured))
+            _attribute_figures(cells, captured)
+        else:
+            code = _exec_script(job['script'], capture)
+    finally:
+        sys.stdout, sys.stderr, sys.argv, sys.path[:], cwd = saved
+        os.chdir(cwd)
+    return {
+        'returncode': code,
+        'signal': None,
+        'timed_out': False,
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+        'truncated': stdout.truncated or stderr.truncated,
+        'figures': [base64.b64encode(frame).decode('ascii') for frame in captured],
+        'cells': cells,
+        'resources': {
+            'wall_ms': round((time.perf_counter() - start) * 1000, 1),
+            'cpu_ms': round((time.process_time() - start_cpu) * 1000, 1),
+            'peak_rss_kb': None
+        },
+        'recycle': True
+    }
+
+
+def _run_command_in_process(job):
+    """Run a command job as a plain subprocess of the worker (no fork available, no resource limits)."""
+    output_limit = job.get('output_limit') or DEFAULT_OUTPUT_LIMIT
+    stdout, stderr = BoundedOutput(output_limit), BoundedOutput(output_limit)
+    start = time.perf_counter()
+    timed_out = False
+    try:
+        process = subprocess.run(
+            job['command'], cwd=job['cwd'], stdin=subprocess.DEVNULL, capture_output=True, timeout=job.get('timeout')
+        )
+        returncode = process.returncode
+        stdout.write(process.stdout)
+        stderr.write(process.stderr)
+    except subprocess.TimeoutExpired as e:
+        returncode, timed_out = 1, True
+        stdout.write(e.stdout or b'')
+        stderr.write(e.stderr or b'')
+    except OSError as e:
+        returncode = 127
+        stderr.write(f"Cannot run {job['command'][0]}: {e}\n".encode('utf-8'))
+    return {
+        'returncode': returncode,
+        'signal': None,
+        'timed_out': timed_out,
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+        'truncated': stdout.truncated or stderr.truncated,
+        'figures': [],
+        'cells': None,
+        'resources': {'wall_ms': round((time.perf_counter() - start) * 1000, 1), 'cpu_ms': None, 'peak_rss_kb': None},
+        'recycle': False
+    }
+
+
+def worker_main():
+    """Entry point of a worker process."""
+    global _protocol_fd
+
+    # Keep the real stdout for the protocol and silence anything else printed to it
+    _protocol_fd = os.dup(1)
+    protocol = os.fdopen(_protocol_fd, 'w', encoding='utf-8')
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+
+    # Pre-import the heavy libraries student code almost always uses
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        pass
+
+    def send(message):
+        protocol.write(json.dumps(message) + '\n')
+        protocol.flush()
+
+    try:
+        send({'ready': True})
+    except BrokenPipeError:
+        return  # The parent exited while this worker was starting
+    for line in sys.stdin:
+        job = json.loads(line)
+        try:
+            result = _run_forked(job) if CAN_FORK else _run_in_process(job)
+        except Exception as e:
+            result = {
+                'returncode': 1, 'signal': None, 'timed_out': False, 'stdout': '', 'stderr': f"Sandbox error: {str(e)}",
+                'truncated': False, 'figures': [], 'cells': None, 'resources': None, 'recycle': True
+            }
+        send(result)
+
+
+class _Worker:
+    """Parent-side handle of a worker process."""
+
+    def __init__(self, python):
+        kwargs = {'start_new_session': True} if os.name == 'posix' else {}
+        self.process = subprocess.Popen(
+            [python, SANDBOX_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            **kwargs
+        )
+        self.runs = 0
+        self.ready = False
+        self._messages = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self._messages.put(json.loads(line))
+        self._messages.put(None)  # Worker exited
+
+    def receive(self, timeout):
+        message = self._messages.get(timeout=timeout)
+        if message is None:
+            raise RuntimeError("sandbox worker exited unexpectedly")
+        return message
+
+    def wait_ready(self, timeout):
+        if not self.ready:
+            try:
+                self.receive(timeout)
+            except queue.Empty:
+                raise RuntimeError(f"sandbox worker not ready after {timeout} seconds")
+            self.ready = True
+
+    def run(self, cwd, script, timeout, limits, output_limit, figures, start_timeout, cells=None, command=None):
+        self.wait_ready(start_timeout)
+        job = {
+            'cwd': cwd, 'script': script, 'timeout': timeout, 'limits': limits,
+            'output_limit': output_limit, 'figures': figures, 'cells': cells, 'command': command
+        }
+        self.process.stdin.write(json.dumps(job) + '\n')
+        self.process.stdin.flush()
+        self.runs += 1
+        try:
+            # The worker enforces the timeout itself; this is the safety net if it hangs
+            result = self.receive(timeout + TIMEOUT_GRACE)
+        except queue.Empty:
+            raise subprocess.TimeoutExpired(script, timeout)
+        result['figures'] = [base64.b64decode(figure) for figure in result['figures']]
+        return result
+
+    def kill(self):
+        try:
+            if os.name == 'posix':
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.wait()
+
+
+class SandboxPool:
+    """Bounded pool of pre-started sandbox workers.
+
+    Workers are recycled after max_runs jobs, on any error and on timeout. A
+    replacement is started in the background so the next job finds a warm worker.
+    """
+
+    def __init__(self, size=2, max_runs=50, start_timeout=60, python=None):
+        self.size = size
+        self.max_runs = max_runs
+        self.start_timeout = start_timeout
+        self.python = python or sys.executable
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Start all the workers ahead of the first job."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._idle.extend(_Worker(self.python) for _ in range(self.size))
+
+    def _replace(self):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(_Worker(self.python))
+
+    def _acquire_worker(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return _Worker(self.python)
+
+    def _release_worker(self, worker, recycle):
+        if recycle or worker.runs >= self.max_runs or worker.process.poll() is not None:
+            worker.kill()
+            threading.Thread(target=self._replace, daemon=True).start()
+        else:
+            with self._lock:
+                self._idle.append(worker)
+
+    def run(self, cwd, script, timeout=30, limits=None, output_limit=None, figures=None, cells=None, command=None):
+        """Run script (relative to cwd) in a warm worker.
+
+        Returns the result dict of the run (returncode, signal, timed_out, stdout,
+        stderr, truncated, figures, cells, resources), figures being the image bytes
+        of every captured figure in capture order. figures optionally overrides the
+        capture settings (format, dpi, max_bytes). If cells (a list of sources) is
+        given, they are run instead of the script, which only names the notebook,
+        and cells lists the result of every cell that ran (number, stdout, stderr,
+        status, truncated, and figures as indexes into the figure list). If command (an
+        argument list) is given, that program is executed instead, script only naming
+        it in errors. A job running longer than timeout seconds is killed and reported
+        with timed_out set, keeping the output captured so far; subprocess.TimeoutExpired
+        is raised if the worker itself stops responding.
+        """
+        self.start()
+        with self._slots:
+            worker = self._acquire_worker()
+            recycle = True
+            try:
+                result = worker.run(cwd, script, timeout, limits, output_limit, figures, self.start_timeout, cells, command)
+                # A failing command ran in a child that exec'd, leaving the worker untouched
+                recycle = result['recycle'] or (result['returncode'] != 0 and command is None)
+                return result
+            finally:
+                self._release_worker(worker, recycle)
+
+    def close(self):
+        """Stop all idle workers."""
+        with self._lock:
+            workers, self._idle = self._idle, []
+            self._started = False
+        for worker in workers:
+            worker.kill()
+
+
+def run_cold(cwd, script, timeout=30, limits=None, output_limit=None, figures=None, start_timeout=60, python=None,
+             cells=None, command=None):
+    """Run script in a freshly started worker that is stopped afterwards.
+
+    Same result and limits as SandboxPool.run, without keeping any process warm.
+    """
+    worker = _Worker(python or sys.executable)
+    try:
+        return worker.run(cwd, script, timeout, limits, output_limit, figures, start_timeout, cells, command)
+    finally:
+        worker.kill()
+
+
+if __name__ == '__main__':
+    worker_main()
@@ -0,0 +1,93 @@
+"""Section-level conversion of the report Markdown to HTML.
+
+A report is a header (title, objectives) followed by one section per code file.
+Each part is converted on its own, its code blocks highlighted by Pygments when
+it is installed (plain <pre><code> otherwise), and the HTML is kept in a bounded
+in-memory cache keyed by the section's Markdown: a section seen before (same
+code, analysis and outputs), in this report or an earlier one, is not converted
+again. Plot paths differ between reports, so sections refer to their images by
+placeholders, filled in after the cache.
+"""
+import collections
+import functools
+import hashlib
+import html
+import re
+import threading
+
+import metrics
+
+# Stands for the path of the n-th image of a section in its Markdown and cached HTML
+IMAGE_PLACEHOLDER = "labreport-image-{}"
+_IMAGE_PLACEHOLDER = re.compile(r'labreport-image-(\d+)')
+
+# CSS class of the highlighted code blocks
+HIGHLIGHT_CLASS = 'highlight'
+
+# Markdown converters are stateful: one per thread, reset between conversions
+_markdown = threading.local()
+
+
+def markdown_to_html(md_content):
+    """Convert Markdown to HTML with this thread's converter, highlighting fenced code."""
+    converter = getattr(_markdown, 'converter', None)
+    if converter is None:
+        import markdown
+        converter = _markdown.converter = markdown.Markdown(
+            extensions=['fenced_code', 'tables', 'codehilite'],
+            extension_configs={'codehilite': {'guess_lang': False, 'css_class': HIGHLIGHT_CLASS}}
+        )
+    return converter.reset().convert(md_content)
+
+
+@functools.lru_cache(maxsize=None)
+def highlight_css():
+    """Stylesheet of the highlighted code, or an empty string without Pygments."""
+    try:
+        from pygments.formatters import HtmlFormatter
+    except ImportError:
+        return ''
+    return HtmlFormatter().get_style_defs(f'.{HIGHLIGHT_CLASS}')
+
+
+def fill_images(text, images, escape=False):
+    """Replace the image placeholders of text with the paths in images."""
+    if not images:
+        return text
+    return _IMAGE_PLACEHOLDER.sub(
+        lambda match: html.escape(images[int(match.group(1))]) if escape else images[int(match.group(1))],
+        text
+    )
+
+
+class SectionCache:
+    """Bounded in-memory cache of the HTML of report sections, keyed by their Markdown."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, md_content, images=()):
+        """Return the HTML of a section, converting its Markdown only if it was not cached."""
+        key = hashlib.sha256(md_content.encode('utf-8')).digest()
+        with self._lock:
+            section_html = self._entries.get(key)
+            if section_html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if section_html is None:
+            section_html = markdown_to_html(md_content)
+            with self._lock:
+                self.misses += 1
+                if self.max_entries > 0:
+                    self._entries[key] = section_html
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            metrics.SECTION_RENDERS.inc(outcome='converted')
+        else:
+            metrics.SECTION_RENDERS.inc(outcome='cached')
+        return fill_images(section_html, images, escape=True)
@@ -0,0 +1,245 @@
+"""Lifecycle of the per-report session folders under Config.UPLOAD_FOLDER.
+
+Session folders are sharded by the first two characters of their id
+(uploads/ab/abcd...), so that no directory holds more than a few hundred
+entries. A SQLite table records the size and last access of every session; a
+background sweeper deletes sessions not accessed for `ttl` seconds, then the
+least recently used ones while the total size exceeds `max_bytes`. Deleted
+sessions leave a tombstone, so that their links can answer 410 Gone rather than
+404 for a while.
+"""
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+from uploads import SPOOL_PREFIX
+
+# Session states
+LIVE = 'live'
+EVICTED = 'evicted'
+
+# Spool files of interrupted uploads (see uploads.SPOOL_PREFIX) older than this are removed
+SPOOL_MAX_AGE = 3600
+
+
+def dir_size(path):
+    """Total size in bytes of the files under path."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class SessionStorage:
+    """Creates, finds and evicts session folders.
+
+    protected, if given, is called by the sweeper and returns the ids of the
+    sessions that must not be deleted (e.g. those with a queued or running job).
+    cleanup, if given, is called with ttl after each sweep, to expire records kept
+    elsewhere for the sessions (e.g. finished jobs and their events).
+    """
+
+    def __init__(self, root, db_path, ttl=7 * 24 * 3600, max_bytes=0, sweep_interval=600,
+                 tombstone_ttl=30 * 24 * 3600, protected=None, cleanup=None):
+        self.root = root
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.tombstone_ttl = tombstone_ttl
+        self.protected = protected
+        self.cleanup = cleanup
+        self._stopping = threading.Event()
+        self._thread = None
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        os.makedirs(self.root, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    evicted_at REAL,
+                    reason TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_lru ON sessions (state, accessed_at)")
+
+    def _folder(self, session_id):
+        return os.path.join(self.root, session_id[:2], session_id)
+
+    def create(self):
+        """Create a new session folder and return (session_id, path)."""
+        session_id = str(uuid.uuid4())
+        path = self._folder(session_id)
+        os.makedirs(path)
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO sessions (id, state, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (session_id, LIVE, now, now)
+            )
+        return session_id, path
+
+    def state(self, session_id):
+        """Return LIVE, EVICTED or None for an unknown session."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row['state'] if row is not None else None
+
+    def path(self, session_id, touch=True):
+        """Return the folder of a live session, or None; touch marks it as recently used."""
+        if self.state(session_id) != LIVE:
+            return None
+        path = self._folder(session_id)
+        if not os.path.isdir(path):
+            return None
+        if touch:
+            with closing(self._connect()) as conn:
+                conn.execute("UPDATE sessions SET accessed_at = ? WHERE id = ?", (time.time(), session_id))
+        return path
+
+    def update_size(self, session_id):
+        """Record the current size of a session folder, e.g. once its report is generated."""
+        size = dir_size(self._folder(session_id))
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE sessions SET size = ? WHERE id = ? AND state = ?", (size, session_id, LIVE))
+        return size
+
+    def total_size(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM sessions WHERE state = ?", (LIVE,)).fetchone()[0]
+
+    def _evict(self, conn, session_id, reason):
+        # Mark first, so that downloads stop finding the folder before it is deleted
+        conn.execute(
+            "UPDATE sessions SET state = ?, size = 0, evicted_at = ?, reason = ? WHERE id = ? AND state = ?",
+            (EVICTED, time.time(), reason, session_id, LIVE)
+        )
+        shutil.rmtree(self._folder(session_id), ignore_errors=True)
+
+    def sweep(self):
+        """Evict expired sessions, then the least recently used ones above the quota.
+
+        Returns the number of sessions evicted.
+        """
+        protected = set(self.protected()) if self.protected else set()
+        now = time.time()
+        evicted = 0
+        with closing(self._connect()) as conn:
+            if self.ttl:
+                rows = conn.execute(
+                    "SELECT id FROM sessions WHERE state = ? AND accessed_at < ?", (LIVE, now - self.ttl)
+                ).fetchall()
+                for row in rows:
+                    if row['id'] not in protected:
+                        self._evict(conn, row['id'], 'expired')
+                        evicted += 1
+
+            if self.max_bytes:
+                total = self.total_size()
+                rows = conn.execute(
+                    "SELECT id, size FROM sessions WHERE state = ? ORDER BY accessed_at", (LIVE,)
+                ).fetchall()
+                for row in rows:
+                    if total <= self.max_bytes:
+                        break
+                    if row['id'] in protected:
+                        continue
+                    self._evict(conn, row['id'], 'quota')
+                    total -= row['size']
+                    evicted += 1
+
+            conn.execute(
+                "DELETE FROM sessions WHERE state = ? AND evicted_at < ?", (EVICTED, now - self.tombstone_ttl)
+            )
+
+        self._remove_stale_spools(now)
+        if self.cleanup:
+            self.cleanup(self.ttl)
+        return evicted
+
+    def _remove_stale_spools(self, now):
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(SPOOL_PREFIX) and entry.is_file():
+                try:
+                    if entry.stat().st_mtime < now - SPOOL_MAX_AGE:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def adopt_legacy_sessions(self):
+        """Move unsharded session folders (uploads/<uuid>/) into their shard and track them.
+
+        Protected sessions are left in place, as their queued jobs refer to their paths.
+        Server processes starting together adopt the folders one at a time, under a write
+        transaction of the database, and skip those another process already moved.
+        """
+        protected = set(self.protected()) if self.protected else set()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for entry in os.scandir(self.root):
+                    if not entry.is_dir() or len(entry.name) != 36:
+                        continue
+                    try:
+                        session_id = str(uuid.UUID(entry.name))
+                    except ValueError:
+                        continue
+                    if session_id in protected:
+                        continue
+                    path = self._folder(session_id)
+                    try:
+                        mtime = entry.stat().st_mtime
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        os.replace(entry.path, path)
+                    except FileNotFoundError:
+                        continue
+                    except OSError as e:
+                        print(f"Error adopting session {session_id}: {str(e)}")
+                        continue
+                    conn.execute(
+                        "INSERT OR IGNORE INTO sessions (id, state, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                        (session_id, LIVE, dir_size(path), mtime, mtime)
+                    )
+            finally:
+                conn.execute("COMMIT")
+
+    def start(self):
+        """Start the background sweeper thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._sweeper, name="session-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _sweeper(self):
+        while not self._stopping.is_set():
+            try:
+                self.sweep()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Error sweeping sessions: {str(e)}")
+            self._stopping.wait(self.sweep_interval)
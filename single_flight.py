@@ -0,0 +1,72 @@
+"""Coalescing of identical work units running at the same time.
+
+When a lab deadline hits, many reports are generated at once from the same
+instructions and often the same starter code. A SingleFlight lets the first call
+for a (stage, key) pair run and makes the identical calls that arrive while it
+runs wait for its result instead of repeating the work. Nothing is kept once the
+call returns: results are cached across reports by the response cache and the
+report manifests, not here. Coalescing is per process.
+"""
+import copy
+import threading
+
+import metrics
+
+
+class _Call:
+    """A call in flight and what its waiters receive."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one call at a time per (stage, key); concurrent duplicates share its result."""
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, stage, key, func, *args, **kwargs):
+        """Return func(*args, **kwargs), or the result of the identical call in flight.
+
+        Waiters get a deep copy of the result, so that no two reports share mutable
+        structures, and the exception of the call if it raised one.
+        """
+        with self._lock:
+            call = self._in_flight.get((stage, key))
+            leader = call is None
+            if leader:
+                call = self._in_flight[(stage, key)] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            metrics.COALESCED_CALLS.inc(stage=stage)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = func(*args, **kwargs)
+            # The waiters copy this snapshot while the caller may already change result
+            call.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[(stage, key)]
+            call.done.set()
+
+    def in_flight(self):
+        """Number of calls running now."""
+        with self._lock:
+            return len(self._in_flight)
@@ -51,6 +51,8 @@ document.addEventListener('DOMContentLoaded', function() {
     // Form submission handling
     const form = document.getElementById('upload-form');
     if (form) {
+        showActiveJob(form);
+
         form.addEventListener('submit', function(e) {
             const instructionFile = instructionFileInput.files.length;
             const codeFiles = codeFilesInput.files.length;
@@ -62,8 +64,136 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     }
+
+    // Live progress of a queued report
+    const jobElement = document.getElementById('job');
+    if (jobElement) {
+        watchJob(jobElement);
+    }
 });
 
+// Report progress
+const STAGE_LABELS = {
+    report: 'Rapport',
+    instructions: 'Analyse des instructions',
+    ocr: 'Lecture du document (OCR)',
+    ocr_page: 'OCR d\'une page',
+    analysis: 'Analyse du code',
+    execution: 'Exécution du code',
+    plot_interpretation: 'Interprétation des graphiques',
+    plots: 'Optimisation des graphiques',
+    pdf: 'Génération du PDF',
+    markdown: 'Mise en forme du rapport',
+    render: 'Rendu du PDF'
+};
+
+const JOB_LABELS = {
+    queued: 'En attente d\'un worker...',
+    running: 'Génération en cours...',
+    done: 'Rapport prêt !',
+    failed: 'Échec de la génération.'
+};
+
+// Warn before resubmitting while a report is still being generated
+function showActiveJob(form) {
+    const activeJob = localStorage.getItem('activeJobUrl');
+    if (!activeJob) {
+        return;
+    }
+    const notice = document.createElement('div');
+    notice.className = 'alert alert-info';
+    notice.innerHTML = 'Un rapport est déjà en cours de génération. <a href="' + activeJob + '">Suivre sa progression</a>';
+    form.parentElement.insertBefore(notice, form);
+}
+
+function watchJob(jobElement) {
+    const statusText = document.getElementById('job-status');
+    const progressContainer = document.getElementById('progress-container');
+    const stageList = document.getElementById('job-stages');
+    const errorBox = document.getElementById('job-error');
+    const downloadBtn = document.getElementById('download-btn');
+    const stageItems = {};
+
+    function finish(job) {
+        localStorage.removeItem('activeJobUrl');
+        statusText.textContent = JOB_LABELS[job.status] || job.status;
+        progressContainer.classList.add('d-none');
+        if (job.status === 'done') {
+            downloadBtn.href = job.result_url;
+            downloadBtn.classList.remove('d-none');
+            document.getElementById('resubmit-btn').classList.remove('d-none');
+        } else {
+            errorBox.textContent = job.error;
+            errorBox.classList.remove('d-none');
+        }
+    }
+
+    function showStage(event) {
+        if (event.stage === 'report') {
+            statusText.textContent = JOB_LABELS.running;
+            return;
+        }
+        const key = event.stage + ':' + (event.file || '');
+        let item = stageItems[key];
+        if (!item) {
+            item = document.createElement('li');
+            item.className = 'list-group-item d-flex justify-content-between align-items-center';
+            item.innerHTML = '<span></span><span class="badge rounded-pill"></span>';
+            item.firstChild.textContent = (STAGE_LABELS[event.stage] || event.stage) + (event.file ? ' — ' + event.file : '');
+            stageList.appendChild(item);
+            stageItems[key] = item;
+        }
+        const badge = item.lastChild;
+        if (event.status === 'started') {
+            badge.className = 'badge rounded-pill bg-secondary';
+            badge.textContent = '...';
+        } else if (event.status === 'reused') {
+            badge.className = 'badge rounded-pill bg-info';
+            badge.textContent = 'réutilisé';
+        } else if (event.stage === 'plots') {
+            badge.className = 'badge rounded-pill bg-success';
+            badge.textContent = Math.round(event.bytes_saved / 1024) + ' Ko · ' + event.calls_saved + ' appels économisés';
+        } else {
+            const seconds = (event.elapsed_ms / 1000).toFixed(1) + ' s';
+            const tokens = event.tokens ? ' · ' + event.tokens + ' tokens' : '';
+            badge.className = 'badge rounded-pill ' + (event.status === 'done' ? 'bg-success' : 'bg-danger');
+            badge.textContent = seconds + tokens;
+        }
+    }
+
+    function poll() {
+        fetch(jobElement.dataset.statusUrl, {headers: {'Accept': 'application/json'}})
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'done' || job.status === 'failed') {
+                    finish(job);
+                } else {
+                    statusText.textContent = JOB_LABELS[job.status] || job.status;
+                    setTimeout(poll, 2000);
+                }
+            })
+            .catch(() => setTimeout(poll, 5000));
+    }
+
+    const status = jobElement.dataset.jobStatus;
+    if (status === 'done' || status === 'failed') {
+        localStorage.removeItem('activeJobUrl');
+        return;
+    }
+    localStorage.setItem('activeJobUrl', window.location.pathname);
+
+    if (!window.EventSource) {
+        poll();
+        return;
+    }
+    const source = new EventSource(jobElement.dataset.eventsUrl);
+    source.onmessage = e => showStage(JSON.parse(e.data));
+    source.addEventListener('end', e => {
+        source.close();
+        finish(JSON.parse(e.data));
+    });
+}
+
 // Helper functions
 function validateFileInput(input, allowedExtensions) {
     const files = Array.from(input.files);
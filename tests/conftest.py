@@ -0,0 +1,13 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DEEPSEEK_API_KEY', 'test')
+# Tests of report_generator run offline and must not touch the shared caches of the repository
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('LLM_FAKE_LATENCY_MS', '0')
+os.environ.setdefault('RESPONSE_CACHE_ENABLED', '0')
+os.environ.setdefault('NATIVE_EXECUTION', '0')
+os.environ.setdefault('SANDBOX_WARM_POOL', '0')
+os.environ.setdefault('PDF_RENDERER', 'html')
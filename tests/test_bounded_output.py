@@ -0,0 +1,28 @@
+from sandbox import BoundedOutput
+
+
+def test_keeps_everything_under_the_limit():
+    output = BoundedOutput(100)
+    output.write(b"hello ")
+    output.write(b"world")
+    assert not output.truncated
+    assert output.getvalue() == "hello world"
+
+
+def test_keeps_head_and_tail_over_the_limit():
+    output = BoundedOutput(10)
+    for i in range(10):
+        output.write(f"{i}abc".encode())
+    assert output.truncated
+    assert output.total == 40
+    value = output.getvalue()
+    assert value.startswith("0abc1")
+    assert value.endswith("c9abc")
+    assert "[30 bytes truncated]" in value
+
+
+def test_one_large_write():
+    output = BoundedOutput(8)
+    output.write(b"abcdefghijklmnopqrstuvwxyz")
+    assert output.head == b"abcd"
+    assert output.tail == b"wxyz"
@@ -0,0 +1,80 @@
+import code_segments
+
+PYTHON = '''import math
+
+
+@cache
+def area(radius):
+    return math.pi * radius ** 2
+
+
+class Stack:
+    def push(self, item):
+        pass
+
+
+print(area(2))
+values = [1, 2]
+'''
+
+JAVA = '''import java.util.*;
+
+public class Lab {
+    // Exercise 1: sum of an array
+    static int sum(int[] values) {
+        int total = 0;
+        for (int v : values) { total += v; }
+        return total;
+    }
+
+    /* Exercise 2 } */
+    static String reverse(String text) {
+        return new StringBuilder(text).reverse().toString() + "}";
+    }
+}
+'''
+
+
+def segments(code, language):
+    return [(s['name'], s['kind'], s['start_line'], s['end_line']) for s in code_segments.segment_code(code, language)]
+
+
+def test_python_segments():
+    assert segments(PYTHON, 'python') == [
+        ('module', 'module', 1, 1),
+        ('area', 'function', 4, 6),
+        ('Stack', 'class', 9, 11),
+        ('module', 'module', 14, 15),
+    ]
+
+
+def test_python_with_a_syntax_error_is_one_segment():
+    assert segments("def broken(:\n    pass\n", 'python') == [('module', 'module', 1, 2)]
+
+
+def test_java_methods_ignore_braces_in_comments_and_strings():
+    assert segments(JAVA, 'java') == [
+        ('Lab.sum', 'function', 4, 9),
+        ('Lab.reverse', 'function', 11, 14),
+    ]
+
+
+def test_c_functions():
+    code = "#include <stdio.h>\n\nstruct point { int x; };\n\nint square(int x) {\n    return x * x;\n}\n"
+    assert segments(code, 'c') == [('point', 'class', 3, 3), ('square', 'function', 5, 7)]
+
+
+def test_selection_by_exercise_number_and_keywords():
+    java = code_segments.segment_code(JAVA, 'java')
+    assert [s['name'] for s in code_segments.select_segments(java, "Exercise 2")] == ['Lab.reverse']
+    python = code_segments.segment_code(PYTHON, 'python')
+    # The module code calling the selected function comes with it
+    assert [s['name'] for s in code_segments.select_segments(python, "Circle area")] == ['area', 'module']
+    assert code_segments.select_segments(python, "Unrelated topic") == python
+
+
+def test_number_lines_marks_gaps():
+    python = code_segments.segment_code(PYTHON, 'python')
+    rendered = code_segments.number_lines([python[1], python[3]])
+    assert rendered.splitlines()[0] == "   4 | @cache"
+    assert "\n...\n  14 | print(area(2))" in rendered
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+import requests
+
+import deepseek_client
+import fake_llm
+
+PAYLOAD = {'model': 'deepseek-chat', 'messages': [{'role': 'user', 'content': 'Hello'}]}
+
+
+class ScriptedFaults(fake_llm.FaultModel):
+    """Answers the stub's requests with the given statuses in order, then successes."""
+
+    def __init__(self, statuses):
+        super().__init__(latency_ms=0, latency_sigma=0)
+        self.statuses = list(statuses)
+        self.requests = 0
+
+    def draw(self):
+        with self._lock:
+            self.requests += 1
+            return 0, self.statuses.pop(0) if self.statuses else None
+
+
+@pytest.fixture
+def stub():
+    """Start a stub server; returns a function giving (client, faults) for scripted statuses."""
+    servers = []
+
+    def start(statuses, max_retries=3):
+        faults = ScriptedFaults(statuses)
+        server = fake_llm.serve(port=0, faults=faults)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+        return deepseek_client.DeepSeekClient('test', url, max_retries=max_retries, backoff_base=0.001), faults
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_retries_transient_errors(stub):
+    client, faults = stub([503, 429])
+    data = client.chat(PAYLOAD)
+    assert data['choices'][0]['message']['content']
+    assert faults.requests == 3
+
+
+def test_gives_up_after_max_retries(stub):
+    client, faults = stub([503] * 5, max_retries=2)
+    with pytest.raises(requests.HTTPError):
+        client.chat(PAYLOAD)
+    assert faults.requests == 3
+
+
+def test_does_not_retry_client_errors(stub):
+    client, faults = stub([400])
+    with pytest.raises(requests.HTTPError):
+        client.chat(PAYLOAD)
+    assert faults.requests == 1
+
+
+def test_backoff_is_jittered_and_capped():
+    client = deepseek_client.DeepSeekClient('test', 'http://127.0.0.1:9', backoff_base=0.5, backoff_max=4)
+    for attempt in range(8):
+        delay = client._backoff(attempt)
+        assert 0 <= delay <= min(4, 0.5 * 2 ** attempt)
+
+
+def test_backoff_honours_retry_after():
+    client = deepseek_client.DeepSeekClient('test', 'http://127.0.0.1:9', backoff_max=30)
+    response = requests.Response()
+    response.headers['Retry-After'] = '7'
+    assert client._backoff(0, response) == 7
+    response.headers['Retry-After'] = '120'
+    assert client._backoff(0, response) == 30
@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue, QueueFull
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.sqlite3'), handler=None, max_pending=3, stale_after=60)
+
+
+def set_job(queue, job_id, **values):
+    with sqlite3.connect(queue.db_path) as conn:
+        conn.execute(
+            f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in values)} WHERE id = ?",
+            list(values.values()) + [job_id]
+        )
+
+
+def test_claim_and_finish(queue):
+    first = queue.submit('session-1', path='a')
+    second = queue.submit('session-2', path='b')
+    job = queue._claim()
+    assert job['id'] == first and job['payload'] == {'path': 'a'}
+    assert queue.get(first)['status'] == RUNNING
+    assert queue.get(first)['owner'] == queue.owner
+    assert set(queue.active_sessions()) == {'session-1', 'session-2'}
+
+    queue._finish(first, DONE, result='report.pdf')
+    assert queue.get(first)['status'] == DONE
+    assert queue.get(first)['result'] == 'report.pdf'
+    assert queue._claim()['id'] == second
+    assert queue._claim() is None
+
+
+def test_submit_refuses_beyond_max_pending(queue):
+    for i in range(3):
+        queue.submit(f"session-{i}")
+    with pytest.raises(QueueFull):
+        queue.submit('session-4')
+
+
+def test_requeues_jobs_of_a_dead_owner(queue):
+    job_id = queue.submit('session')
+    set_job(queue, job_id, status=RUNNING, owner='999999999:gone', heartbeat_at=time.time(), attempts=1)
+    assert queue.recover_orphans() == 1
+    assert queue.get(job_id)['status'] == QUEUED
+    assert queue._claim()['id'] == job_id
+
+
+def test_keeps_jobs_with_a_live_owner_and_a_recent_heartbeat(queue):
+    job_id = queue.submit('session')
+    set_job(queue, job_id, status=RUNNING, owner=f"{os.getppid()}:other", heartbeat_at=time.time(), attempts=1)
+    assert queue.recover_orphans() == 0
+    assert queue.get(job_id)['status'] == RUNNING
+
+    set_job(queue, job_id, heartbeat_at=time.time() - 120)
+    assert queue.recover_orphans() == 1
+    assert queue.get(job_id)['status'] == QUEUED
+
+
+def test_fails_jobs_abandoned_too_often(queue):
+    job_id = queue.submit('session')
+    set_job(queue, job_id, status=RUNNING, owner='999999999:gone', attempts=queue.max_attempts)
+    queue.recover_orphans()
+    assert queue.get(job_id)['status'] == FAILED
+
+
+def test_own_running_jobs_are_not_requeued(queue):
+    job_id = queue.submit('session')
+    queue._claim()
+    set_job(queue, job_id, heartbeat_at=0)
+    assert queue.recover_orphans() == 0
+    queue.heartbeat()
+    assert queue.get(job_id)['heartbeat_at'] > time.time() - 5
+
+
+def test_purge_deletes_old_finished_jobs_and_their_events(queue):
+    old = queue.submit('session')
+    queue._claim()
+    queue._finish(old, DONE)
+    queue.add_event(old, {'stage': 'report'})
+    set_job(queue, old, finished_at=time.time() - 3600)
+    pending = queue.submit('session')
+    queue.add_event(pending, {'stage': 'report'})
+
+    assert queue.purge(600) == 1
+    assert queue.get(old) is None and queue.get_events(old) == []
+    assert queue.get(pending) is not None and len(queue.get_events(pending)) == 1
+    assert queue.purge(0) == 0
+
+
+def test_worker_survives_database_errors(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), handler=lambda job: 'report.pdf', num_workers=1, poll_interval=0.01)
+    finish = queue._finish
+    failures = []
+
+    def flaky_finish(job_id, status, **kwargs):
+        if not failures:
+            failures.append(job_id)
+            raise sqlite3.OperationalError("database is locked")
+        finish(job_id, status, **kwargs)
+
+    queue._finish = flaky_finish
+    first = queue.submit('session-1')
+    second = queue.submit('session-2')
+    queue.start()
+    try:
+        deadline = time.time() + 10
+        while queue.get(second)['status'] != DONE and time.time() < deadline:
+            time.sleep(0.01)
+        assert failures == [first]
+        assert queue.get(second)['status'] == DONE
+        assert all(thread.is_alive() for thread in queue._threads)
+    finally:
+        queue.stop(5)
@@ -0,0 +1,74 @@
+import pytest
+
+import metrics
+import progress
+
+
+@pytest.fixture
+def registered():
+    """Metrics created in a test, removed from the process-wide registry afterwards."""
+    created = []
+
+    def register(metric):
+        created.append(metric)
+        return metric
+
+    yield register
+    for metric in created:
+        metrics._metrics.remove(metric)
+
+
+def test_counter_samples_per_label_values(registered):
+    counter = registered(metrics.Counter('test_requests_total', 'Requests.', ['model', 'outcome']))
+    counter.inc(model='deepseek-chat', outcome='ok')
+    counter.inc(2, model='deepseek-chat', outcome='ok')
+    counter.inc(0.5, model='say "hi"\n', outcome='error')
+    assert list(counter.samples()) == [
+        'test_requests_total{model="deepseek-chat",outcome="ok"} 3',
+        'test_requests_total{model="say \\"hi\\"\\n",outcome="error"} 0.5',
+    ]
+
+
+def test_histogram_buckets_are_cumulative(registered):
+    histogram = registered(metrics.Histogram('test_seconds', 'Durations.', buckets=(0.1, 1)))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value)
+    assert list(histogram.samples()) == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        'test_seconds_sum 4.25',
+        'test_seconds_count 4',
+    ]
+
+
+def test_render_lists_every_metric(registered):
+    registered(metrics.Counter('test_render_total', 'Rendered.')).inc()
+    text = metrics.render()
+    assert "# HELP test_render_total Rendered.\n# TYPE test_render_total counter\ntest_render_total 1\n" in text
+    assert "# TYPE labreport_stage_seconds histogram" in text
+
+
+def test_stages_are_timed_with_their_status_and_tokens():
+    events = []
+    tracker = progress.ProgressTracker(events.append)
+    before = metrics.STAGE_SECONDS._values.get(('test_stage', 'failed'), [0] * 16)[-2]
+    with tracker.stage('test_stage', 'lab.py'):
+        progress.record_tokens({'total_tokens': 120})
+    with pytest.raises(ValueError):
+        tracker.run('test_stage', 'lab.py', int, 'not a number')
+
+    finished = [event for event in events if event['status'] != 'started']
+    assert [(event['status'], event['tokens']) for event in finished] == [('done', 120), ('failed', 0)]
+    assert metrics.STAGE_SECONDS._values[('test_stage', 'failed')][-2] == before + 1
+
+
+def test_sub_stage_tokens_also_count_for_the_enclosing_stage():
+    events = []
+    tracker = progress.ProgressTracker(events.append)
+    with tracker.stage('instructions', 'lab.pdf'):
+        with progress.stage('ocr', 'page 1'):
+            progress.record_tokens({'total_tokens': 50})
+        progress.record_tokens({'total_tokens': 10})
+    tokens = {event['stage']: event['tokens'] for event in events if event['status'] == 'done'}
+    assert tokens == {'ocr': 50, 'instructions': 60}
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import sys
+import threading
+
+import pytest
+
+import native_runner
+from sandbox import SandboxPool, make_limits
+
+needs_gcc = pytest.mark.skipif(shutil.which('gcc') is None, reason="needs gcc")
+
+HELLO = b'#include <stdio.h>\nint main(void) { printf("hello %d\\n", 6 * 7); return 0; }\n'
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = SandboxPool(size=1)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def runner(pool, tmp_path):
+    return native_runner.NativeRunner(str(tmp_path / 'cache'), pool.run, compile_server=False)
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_java_entry_point():
+    source = """
+    package lab.one;
+    // class Commented { static void main(String[] a) {} }
+    public class Exercise {
+        static class Helper { }
+        public static void main(String[] args) { System.out.println("class Fake {"); }
+    }
+    """
+    assert native_runner.java_entry_point(source) == ('Exercise.java', 'lab.one.Exercise')
+    assert native_runner.java_entry_point("class A {}\nclass B { public static void main(String[] a) {} }") == ('B.java', 'B')
+
+
+def test_jvm_heap():
+    assert native_runner.jvm_heap(make_limits(memory_mb=512)) == ['-Xmx512m']
+    assert native_runner.jvm_heap({}) == []
+
+
+@needs_gcc
+def test_c_build_is_cached(runner, tmp_path):
+    code_path = write(tmp_path / 'hello.c', HELLO)
+    build, result = runner.run('c', code_path)
+    assert not build['cached'] and build['compiled']
+    assert result['stdout'] == "hello 42\n"
+
+    build, result = runner.run('c', code_path)
+    assert build['cached']
+    assert result['stdout'] == "hello 42\n"
+
+
+@needs_gcc
+def test_diagnostics_name_the_uploaded_file(runner, tmp_path):
+    code_path = write(tmp_path / 'exercise1.c', b'int main(void) { return missing; }\n')
+    build, result = runner.run('c', code_path)
+    assert result is None
+    assert not build['compiled']
+    assert 'exercise1.c:1' in build['diagnostics']
+    # The failure is cached too
+    assert runner.build('c', code_path)['cached']
+
+
+@needs_gcc
+def test_identical_builds_compile_once(runner, tmp_path):
+    compiles = []
+    compile_c = runner._compile_c
+
+    def counting_compile_c(work_dir, filename):
+        compiles.append(filename)
+        return compile_c(work_dir, filename)
+
+    runner._compile_c = counting_compile_c
+    code_paths = [write(tmp_path / 'hello.c', HELLO)] * 4
+    builds = []
+    threads = [threading.Thread(target=lambda path=path: builds.append(runner.build('c', path))) for path in code_paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    assert compiles == ['hello.c']
+    assert len({build['dir'] for build in builds}) == 1
+
+
+@needs_gcc
+def test_cache_keeps_the_most_recent_builds(runner, tmp_path):
+    runner.max_bytes = 1
+    first = runner.build('c', write(tmp_path / 'a.c', HELLO))
+    second = runner.build('c', write(tmp_path / 'b.c', HELLO.replace(b'6 * 7', b'6 * 8')))
+    assert not os.path.exists(first['dir'])
+    assert os.path.exists(second['dir'])
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="needs POSIX limits")
+def test_compile_server_runs_under_limits(tmp_path):
+    # Stand-ins for java and javac: the server reports its arguments and limits, then compiles nothing
+    seen = tmp_path / 'seen.json'
+    java = tmp_path / 'java'
+    java.write_text(
+        f"#!{sys.executable}\n"
+        "import json, resource, sys\n"
+        f"json.dump({{'args': sys.argv[1:], 'fsize': resource.getrlimit(resource.RLIMIT_FSIZE)[0]}}, open({str(seen)!r}, 'w'))\n"
+        "print('ready', flush=True)\n"
+        "for line in sys.stdin:\n"
+        "    print('0 ', flush=True)\n"
+    )
+    javac = tmp_path / 'javac'
+    javac.write_text("#!/bin/sh\ntouch \"$2/CompileServer.class\"\n")
+    java.chmod(0o755)
+    javac.chmod(0o755)
+
+    server = native_runner.JavaCompileServer(
+        str(java), str(javac), str(tmp_path / 'cache'), limits=make_limits(memory_mb=512, cpu_seconds=60, file_mb=10)
+    )
+    try:
+        assert server.compile(str(tmp_path), str(tmp_path)) == (True, '')
+        reported = json.loads(seen.read_text())
+        assert '-Xmx512m' in reported['args'] and '-XX:+ExitOnOutOfMemoryError' in reported['args']
+        assert reported['fsize'] == 10 * 1024 * 1024
+
+        # A server that exited is started again
+        server.process.kill()
+        server.process.wait()
+        assert server.compile(str(tmp_path), str(tmp_path)) == (True, '')
+    finally:
+        server.close()
@@ -0,0 +1,35 @@
+import pytest
+
+from notebooks import executable_source
+
+
+@pytest.mark.parametrize('source', [
+    'x = 3\nprint("value: %d"\n      % x)',
+    'x = 1\nif (x\n        != 3):\n    pass',
+    'y = 3 \\\n    % 2',
+    's = """\n%not a magic\n!nor this\n"""',
+    "t = 'it\\'s ('\nu = t",
+    'd = {"a": "(",  # (\n}',
+])
+def test_continuation_lines_are_kept(source):
+    assert executable_source(source) == source
+    compile(source, 'cell', 'exec')
+
+
+def test_line_magics_and_shell_escapes_become_no_ops():
+    source = "%matplotlib inline\nimport os\n!pip install numpy\nif True:\n    %time x = 1\n"
+    result = executable_source(source)
+    assert result == "pass  # %matplotlib inline\nimport os\npass  # !pip install numpy\nif True:\n    pass  # %time x = 1\n"
+    compile(result, 'cell', 'exec')
+
+
+def test_magic_after_a_closed_statement():
+    result = executable_source('values = (1,\n          2)\n%who')
+    assert result.endswith('\npass  # %who')
+    compile(result, 'cell', 'exec')
+
+
+def test_cell_magics_disable_the_cell():
+    result = executable_source("%%bash\necho hello\nls -la")
+    assert result == "# %%bash\n# echo hello\n# ls -la"
+    compile(result, 'cell', 'exec')
@@ -0,0 +1,35 @@
+import pytest
+
+import metrics
+import pdf_renderer
+import report_generator
+from config import Config
+
+
+@pytest.fixture
+def no_pdf_engine(monkeypatch):
+    monkeypatch.setattr(pdf_renderer.WeasyPrintRenderer, 'available', lambda self: False)
+    monkeypatch.setattr(pdf_renderer.WkhtmltopdfRenderer, 'available', lambda self: False)
+    pdf_renderer.get_renderer.cache_clear()
+    yield
+    pdf_renderer.get_renderer.cache_clear()
+
+
+def test_auto_falls_back_to_html_with_a_warning(no_pdf_engine, capsys):
+    assert pdf_renderer.get_renderer('auto').name == 'html'
+    assert "reports are delivered as HTML" in capsys.readouterr().out
+
+
+def test_html_fallback_is_counted_and_intermediate_files_are_not_kept(no_pdf_engine, monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, 'PDF_RENDERER', 'auto')
+    before = metrics.ERRORS._values.get(('pdf',), 0)
+    lab_info = {'title': "Lab 1", 'objectives': [], 'exercises': [], 'requirements': []}
+    report_path = report_generator.generate_pdf_report(lab_info, [], str(tmp_path))
+    assert report_path.endswith('lab_report.html')
+    assert metrics.ERRORS._values[('pdf',)] == before + 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['lab_report.html']
+
+
+def test_unknown_renderer_is_refused():
+    with pytest.raises(ValueError):
+        pdf_renderer.get_renderer('latex')
@@ -0,0 +1,48 @@
+import io
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import plot_images  # noqa: E402
+
+
+def plot(values, dpi=100, kind='plot', fmt='png'):
+    figure = plt.figure(figsize=(6, 4))
+    getattr(plt, kind)(range(len(values)), values)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt, dpi=dpi)
+    plt.close(figure)
+    return buffer.getvalue()
+
+
+def test_large_plots_are_downscaled_and_smaller():
+    image = plot([1, 4, 9, 16], dpi=300)
+    optimized = plot_images.optimize_image(image, max_pixels=800)
+    assert len(optimized) < len(image)
+    with Image.open(io.BytesIO(optimized)) as img:
+        assert max(img.size) == 800
+
+
+def test_unreadable_images_are_kept_as_they_are():
+    svg = plot([1, 2, 3], fmt='svg')
+    assert plot_images.optimize_image(svg) == svg
+
+
+def test_exact_and_near_duplicates():
+    deduplicator = plot_images.PlotDeduplicator(max_distance=4)
+    curve = plot([1, 4, 9, 16])
+    assert deduplicator.add('a_py_figure_1.png', curve) is None
+    assert deduplicator.add('b_py_figure_1.png', curve) == 'a_py_figure_1.png'
+    # The same plot at another resolution looks the same
+    assert deduplicator.add('c_py_figure_1.png', plot([1, 4, 9, 16], dpi=80)) == 'a_py_figure_1.png'
+    assert deduplicator.add('d_py_figure_1.png', plot([16, 9, 4, 1], kind='bar')) is None
+    assert (deduplicator.exact, deduplicator.near) == (1, 1)
+    assert deduplicator.duplicate_bytes == len(curve)
+
+
+def test_exact_matches_only():
+    deduplicator = plot_images.PlotDeduplicator(max_distance=None)
+    assert deduplicator.add('a.png', plot([1, 4, 9, 16])) is None
+    assert deduplicator.add('b.png', plot([1, 4, 9, 16], dpi=80)) is None
@@ -0,0 +1,29 @@
+import prompt_budget
+
+
+def test_text_under_budget_is_unchanged():
+    text = "Lab 3\n\nExercise 1: sort a list"
+    assert prompt_budget.fit_text(text, 1000) == text
+
+
+def test_long_text_keeps_its_beginning_and_end():
+    text = "Title of the lab\n" + "\n".join(f"Paragraph {i} of the instructions." for i in range(2000)) + "\nLast line"
+    fitted = prompt_budget.fit_text(text, 500)
+    assert prompt_budget.estimate_tokens(fitted) <= 550
+    assert fitted.startswith("Title of the lab")
+    assert fitted.endswith("Last line")
+    assert "characters omitted" in fitted
+
+
+def test_code_data_is_elided_first():
+    table = "\n".join(f"    [{i}, {i * 2}, {i * 3}, {i * 4}]," for i in range(3000))
+    code = f"DATA = [\n{table}\n]\n\n\ndef total(rows):\n    return sum(sum(row) for row in rows)\n"
+    fitted = prompt_budget.fit_code(code, 'python', 400)
+    assert prompt_budget.estimate_tokens(fitted) <= 400
+    assert "def total(rows):" in fitted
+    assert "return sum(sum(row) for row in rows)" in fitted
+
+
+def test_code_under_budget_is_unchanged():
+    code = "def f():\n    return 1\n"
+    assert prompt_budget.fit_code(code, 'python', 100) == code
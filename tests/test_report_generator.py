@@ -0,0 +1,20 @@
+import io
+
+from PIL import Image
+
+import report_generator
+
+
+def png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), 'white').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_plots_of_files_sharing_a_stem_do_not_collide(tmp_path):
+    results = report_generator.empty_execution_results()
+    script = report_generator.save_plot(png(), 'png', '/uploads/lab.py', 1, str(tmp_path), results, False)
+    notebook = report_generator.save_plot(png(), 'png', '/uploads/lab.ipynb', 1, str(tmp_path), results, False)
+    assert script != notebook
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([script, notebook])
+    assert set(results['plot_images']) == {script, notebook}
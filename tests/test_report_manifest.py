@@ -0,0 +1,87 @@
+import os
+import shutil
+
+import pytest
+
+import report_generator
+import report_manifest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLOT_SCRIPT = """import matplotlib.pyplot as plt
+plt.plot([1, 2, 3], [1, 4, 9])
+plt.show()
+print("plotted")
+"""
+
+
+@pytest.fixture
+def lab(tmp_path):
+    instructions = tmp_path / 'instructions.txt'
+    shutil.copyfile(os.path.join(ROOT, 'test_files', 'sample_lab_instructions.txt'), instructions)
+    (tmp_path / 'plot.py').write_text(PLOT_SCRIPT)
+    (tmp_path / 'fail.py').write_text("raise SystemExit('failed')\n")
+    return str(instructions), [str(tmp_path / 'plot.py'), str(tmp_path / 'fail.py')]
+
+
+def generate(lab, output_dir, previous_dir=None):
+    """Generate a report into output_dir; return {(stage, file): status} of its finished stages."""
+    instructions, code_paths = lab
+    os.makedirs(output_dir)
+    events = []
+    report_generator.generate_report(
+        instructions, code_paths, str(output_dir), progress_callback=events.append, previous_dir=previous_dir
+    )
+    return {(event['stage'], event.get('file')): event['status'] for event in events if event['status'] != 'started'}
+
+
+def test_unchanged_sections_are_reused(lab, tmp_path):
+    first = tmp_path / 'first'
+    generate(lab, first)
+    statuses = generate(lab, tmp_path / 'second', previous_dir=str(first))
+
+    assert statuses[('instructions', 'instructions.txt')] == 'reused'
+    assert statuses[('analysis', 'plot.py')] == 'reused'
+    assert statuses[('execution', 'plot.py')] == 'reused'
+    assert os.path.exists(tmp_path / 'second' / 'plot_py_figure_1.png')
+    # A failed run is executed again
+    assert statuses[('execution', 'fail.py')] == 'done'
+
+
+def test_missing_plots_of_the_previous_report_are_recomputed(lab, tmp_path):
+    first = tmp_path / 'first'
+    generate(lab, first)
+    os.remove(first / 'plot_py_figure_1.png')
+    statuses = generate(lab, tmp_path / 'second', previous_dir=str(first))
+
+    assert statuses[('execution', 'plot.py')] == 'done'
+    assert os.path.exists(tmp_path / 'second' / 'plot_py_figure_1.png')
+
+
+def test_reuse_execution_gives_up_without_leaving_plots(tmp_path):
+    previous_dir = tmp_path / 'previous'
+    previous_dir.mkdir()
+    (previous_dir / 'lab_py_figure_1.png').write_bytes(b'png')
+    manifest = {'report_dir': str(previous_dir)}
+    section = {'filename': 'lab.py', 'execution_results': {
+        'output': '', 'error': None, 'plots': ['lab_py_figure_1.png', 'lab_py_figure_2.png'], 'plot_interpretations': {}
+    }}
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    assert report_manifest.reuse_execution(manifest, section, str(output_dir), 'lab_py') is None
+    assert list(output_dir.iterdir()) == []
+
+
+def test_failed_runs_and_interpretations_are_not_reusable():
+    assert report_generator.is_reusable_execution({'error': None, 'plot_interpretations': {'a.png': "A curve."}})
+    assert not report_generator.is_reusable_execution({'error': "Code execution timed out (limit: 30 seconds)"})
+    assert not report_generator.is_reusable_execution(
+        {'error': None, 'plot_interpretations': {'a.png': report_generator.PLOT_INTERPRETATION_FALLBACK}}
+    )
+
+
+def test_analysis_key_depends_on_the_configuration():
+    key = report_manifest.analysis_key('hash', 'python', 'Exercise 1', ['single', 'deepseek', 'deepseek-coder'])
+    assert key == report_manifest.analysis_key('hash', 'python', 'Exercise 1', ['single', 'deepseek', 'deepseek-coder'])
+    assert key != report_manifest.analysis_key('hash', 'python', 'Exercise 1', ['two-step', 'deepseek', 'deepseek-coder'])
+    assert key != report_manifest.analysis_key('hash', 'python', 'Exercise 1', ['single', 'fake', 'deepseek-coder'])
@@ -0,0 +1,28 @@
+import base64
+
+from payload_files import Base64File
+from response_cache import make_key
+
+
+def payload(image):
+    return {
+        'model': 'deepseek-vision',
+        'messages': [{'role': 'user', 'content': [
+            {'type': 'text', 'text': "Décrivez ce graphique"},
+            {'type': 'image_url', 'image_url': {'url': image}}
+        ]}]
+    }
+
+
+def test_file_and_inline_payloads_have_the_same_key(tmp_path):
+    path = tmp_path / 'plot.png'
+    # Not a multiple of the encoding slice, to check the slices join up
+    path.write_bytes(bytes(range(256)) * 1000 + b'tail')
+    inline = "data:image/png;base64," + base64.b64encode(path.read_bytes()).decode('ascii')
+    assert make_key(payload(Base64File(str(path), "data:image/png;base64,"))) == make_key(payload(inline))
+
+
+def test_key_depends_on_content_and_scope():
+    assert make_key(payload("a")) != make_key(payload("b"))
+    assert make_key(payload("a")) == make_key(payload("a"), None)
+    assert make_key(payload("a"), 'fake') != make_key(payload("a"))
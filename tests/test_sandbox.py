@@ -0,0 +1,132 @@
+import os
+import time
+
+import pytest
+
+from sandbox import SandboxPool, make_limits
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = SandboxPool(size=1)
+    yield pool
+    pool.close()
+
+
+def run(pool, tmp_path, source, **options):
+    (tmp_path / 'script.py').write_text(source)
+    return pool.run(str(tmp_path), 'script.py', **options)
+
+
+def test_timeout_keeps_the_output_so_far(pool, tmp_path):
+    result = run(pool, tmp_path, "print('started', flush=True)\nwhile True:\n    pass\n", timeout=1)
+    assert result['timed_out']
+    assert result['signal'] == 'SIGKILL'
+    assert result['stdout'] == "started\n"
+    assert 900 <= result['resources']['wall_ms'] < 5000
+
+
+def is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/stat'), reason="needs /proc")
+def test_timeout_also_kills_the_processes_started_by_the_job(pool, tmp_path):
+    source = (
+        "import subprocess, sys\n"
+        "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+        "open('child.pid', 'w').write(str(child.pid))\n"
+        "while True:\n    pass\n"
+    )
+    result = run(pool, tmp_path, source, timeout=1)
+    assert result['timed_out']
+    pid = int((tmp_path / 'child.pid').read_text())
+    deadline = time.time() + 5
+    while is_running(pid) and time.time() < deadline:
+        time.sleep(0.05)
+    assert not is_running(pid)
+
+
+def test_cpu_limit_stops_busy_loops(pool, tmp_path):
+    result = run(pool, tmp_path, "while True:\n    pass\n", timeout=20, limits=make_limits(cpu_seconds=1))
+    assert not result['timed_out']
+    assert result['signal'] in ('SIGXCPU', 'SIGKILL')
+    assert result['resources']['cpu_ms'] >= 900
+
+
+def test_memory_limit_raises_memory_error(pool, tmp_path):
+    result = run(pool, tmp_path, "data = bytearray(4 * 1024 ** 3)\n", limits=make_limits(memory_mb=1024))
+    assert result['returncode'] == 1
+    assert 'MemoryError' in result['stderr']
+
+
+def test_file_size_limit(pool, tmp_path):
+    source = "with open('big.bin', 'wb') as f:\n    f.write(b'x' * (3 * 1024 * 1024))\n"
+    result = run(pool, tmp_path, source, limits=make_limits(file_mb=1))
+    assert result['returncode'] != 0
+    assert 'File too large' in result['stderr'] or result['signal'] == 'SIGXFSZ'
+    assert (tmp_path / 'big.bin').stat().st_size <= 1024 * 1024
+
+
+def test_output_is_bounded(pool, tmp_path):
+    result = run(pool, tmp_path, "print('x' * 1_000_000)\nprint('end')\n", output_limit=1000)
+    assert result['truncated']
+    assert len(result['stdout']) < 1100
+    assert result['stdout'].endswith("end\n")
+
+
+def test_runs_start_from_the_same_untouched_state(pool, tmp_path):
+    first = run(pool, tmp_path, "import json\njson.leaked = True\nprint('ok')\n")
+    second = run(pool, tmp_path, "import json, sys\nprint(hasattr(json, 'leaked'), 'numpy' in sys.modules)\n")
+    assert first['stdout'] == "ok\n"
+    assert second['stdout'] == "False True\n"
+
+
+def test_failed_runs_recycle_their_worker(tmp_path):
+    pool = SandboxPool(size=1)
+    try:
+        run(pool, tmp_path, "print('ok')\n")
+        worker = pool._idle[0]
+        run(pool, tmp_path, "raise ValueError('failed')\n")
+        deadline = time.time() + 30
+        while not pool._idle and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool._idle and pool._idle[0] is not worker
+        assert worker.process.poll() is not None
+        assert run(pool, tmp_path, "print('again')\n")['stdout'] == "again\n"
+    finally:
+        pool.close()
+
+
+def test_figures_are_captured_in_memory(pool, tmp_path):
+    source = (
+        "import matplotlib.pyplot as plt\n"
+        "plt.plot([1, 2, 3])\n"
+        "plt.show()\n"
+        "plt.figure()\n"
+        "plt.bar([1, 2], [3, 4])\n"
+    )
+    result = run(pool, tmp_path, source, figures={'format': 'png', 'dpi': 50})
+    assert result['returncode'] == 0
+    # One figure at plt.show(), the one left open when the script ended
+    assert len(result['figures']) == 2
+    assert all(figure.startswith(b'\x89PNG') for figure in result['figures'])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['script.py']
+
+
+def test_notebook_cells_get_their_own_output_and_figures(pool, tmp_path):
+    cells = [
+        "import matplotlib.pyplot as plt\nx = 2",
+        "print(x * 3)\nplt.plot([x])\nplt.show()",
+        "raise ValueError('broken')",
+        "print('after')",
+    ]
+    result = pool.run(str(tmp_path), 'lab.ipynb', cells=cells)
+    statuses = [(cell['number'], cell['status'], cell['stdout'], cell['figures']) for cell in result['cells']]
+    assert statuses == [(1, 'ok', '', []), (2, 'ok', "6\n", [0]), (3, 'error', '', []), (4, 'ok', "after\n", [])]
+    assert 'ValueError: broken' in result['cells'][2]['stderr']
+    assert len(result['figures']) == 1
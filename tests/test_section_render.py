@@ -0,0 +1,47 @@
+import threading
+
+import section_render
+from section_render import IMAGE_PLACEHOLDER, SectionCache
+
+SECTION = f"## lab.py\n\n```python\nprint('a < b')\n```\n\n![Figure 1]({IMAGE_PLACEHOLDER.format(0)})\n"
+
+
+def test_sections_are_converted_once_and_get_their_images():
+    cache = SectionCache()
+    first = cache.render(SECTION, ['/reports/1/lab_py_figure_1.png'])
+    second = cache.render(SECTION, ['/reports/2/lab "py"_figure_1.png'])
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert 'src="/reports/1/lab_py_figure_1.png"' in first
+    assert 'src="/reports/2/lab &quot;py&quot;_figure_1.png"' in second
+    assert 'a &lt; b' in first
+
+
+def test_cache_is_bounded_and_keeps_the_most_recent_sections():
+    cache = SectionCache(max_entries=2)
+    for text in ("one", "two", "one", "three"):
+        cache.render(text)
+    cache.render("one")
+    cache.render("two")
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_disabled_cache_converts_every_time():
+    cache = SectionCache(max_entries=0)
+    cache.render("text")
+    cache.render("text")
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_threads_convert_with_their_own_converter():
+    results = {}
+
+    def convert(i):
+        results[i] = section_render.markdown_to_html(f"# Title {i}\n\n| a |\n|---|\n| {i} |")
+
+    threads = [threading.Thread(target=convert, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i, html in results.items():
+        assert f"Title {i}" in html and f"<td>{i}</td>" in html
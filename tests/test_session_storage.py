@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+import uuid
+from contextlib import closing
+
+from session_storage import EVICTED, LIVE, SessionStorage
+from uploads import SPOOL_PREFIX
+
+
+def make_storage(tmp_path, **options):
+    return SessionStorage(str(tmp_path / 'uploads'), str(tmp_path / 'sessions.sqlite3'), **options)
+
+
+def test_legacy_sessions_are_adopted_once_by_concurrent_processes(tmp_path):
+    storage = make_storage(tmp_path)
+    session_ids = [str(uuid.uuid4()) for _ in range(20)]
+    for session_id in session_ids:
+        folder = tmp_path / 'uploads' / session_id
+        folder.mkdir()
+        (folder / 'lab_report.md').write_text("# Report")
+
+    errors = []
+
+    def adopt():
+        try:
+            make_storage(tmp_path).adopt_legacy_sessions()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=adopt) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert errors == []
+    for session_id in session_ids:
+        assert storage.state(session_id) == LIVE
+        assert os.path.exists(os.path.join(storage.path(session_id), 'lab_report.md'))
+    assert not any(len(entry.name) == 36 for entry in os.scandir(tmp_path / 'uploads'))
+
+
+def test_protected_legacy_sessions_stay_in_place(tmp_path):
+    session_id = str(uuid.uuid4())
+    (tmp_path / 'uploads' / session_id).mkdir(parents=True)
+    storage = make_storage(tmp_path, protected=lambda: [session_id])
+    storage.adopt_legacy_sessions()
+    assert storage.state(session_id) is None
+    assert (tmp_path / 'uploads' / session_id).is_dir()
+
+
+def age(storage, session_id, seconds):
+    with closing(storage._connect()) as conn:
+        conn.execute("UPDATE sessions SET accessed_at = ? WHERE id = ?", (time.time() - seconds, session_id))
+
+
+def add_session(storage, size):
+    session_id, path = storage.create()
+    with open(os.path.join(path, 'report.pdf'), 'wb') as f:
+        f.write(b'x' * size)
+    storage.update_size(session_id)
+    return session_id, path
+
+
+def test_expired_sessions_leave_a_tombstone(tmp_path):
+    cleaned = []
+    storage = make_storage(tmp_path, ttl=3600, cleanup=cleaned.append)
+    old, old_path = add_session(storage, 10)
+    recent, _ = add_session(storage, 10)
+    age(storage, old, 7200)
+
+    assert storage.sweep() == 1
+    assert storage.state(old) == EVICTED
+    assert storage.path(old) is None and not os.path.exists(old_path)
+    assert storage.state(recent) == LIVE
+    assert cleaned == [3600]
+
+
+def test_quota_evicts_the_least_recently_used_sessions(tmp_path):
+    storage = make_storage(tmp_path, ttl=0, max_bytes=250)
+    sessions = [add_session(storage, 100)[0] for _ in range(3)]
+    for i, session_id in enumerate(sessions):
+        age(storage, session_id, 100 - i)
+    # Reading a report makes its session the most recently used
+    storage.path(sessions[0])
+
+    assert storage.sweep() == 1
+    assert [storage.state(session_id) for session_id in sessions] == [LIVE, EVICTED, LIVE]
+    assert storage.total_size() == 200
+
+
+def test_protected_sessions_are_not_evicted(tmp_path):
+    session_id, path = add_session(make_storage(tmp_path), 10)
+    storage = make_storage(tmp_path, ttl=60, protected=lambda: [session_id])
+    age(storage, session_id, 3600)
+    assert storage.sweep() == 0
+    assert os.path.isdir(path)
+
+
+def test_tombstones_and_stale_spool_files_are_removed(tmp_path):
+    storage = make_storage(tmp_path, ttl=60, tombstone_ttl=0)
+    session_id, _ = add_session(storage, 10)
+    age(storage, session_id, 3600)
+    spool = tmp_path / 'uploads' / f"{SPOOL_PREFIX}interrupted"
+    spool.write_bytes(b'partial')
+    os.utime(spool, (0, 0))
+
+    storage.sweep()
+    storage.sweep()
+    assert storage.state(session_id) is None
+    assert not spool.exists()
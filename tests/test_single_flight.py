@@ -0,0 +1,76 @@
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_identical_calls_run_once():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return {'value': value}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('stage', 'key', work, 1)))
+    leader.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=lambda: results.append(flight.do('stage', 'key', work, 2))) for _ in range(4)]
+    for thread in waiters:
+        thread.start()
+    while flight.coalesced < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == [{'value': 1}] * 5
+    assert flight.calls == 1 and flight.coalesced == 4
+    # Waiters get their own copy of the result
+    assert len({id(result) for result in results}) == 5
+    assert flight.in_flight() == 0
+
+
+def test_different_keys_and_later_calls_are_not_coalesced():
+    flight = SingleFlight()
+    assert flight.do('stage', 'a', lambda: 1) == 1
+    assert flight.do('stage', 'b', lambda: 2) == 2
+    assert flight.do('stage', 'a', lambda: 3) == 3
+    assert flight.calls == 3 and flight.coalesced == 0
+
+
+def test_waiters_receive_the_exception():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("failed")
+
+    def call():
+        try:
+            flight.do('stage', 'key', fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    while flight.coalesced < 1:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(errors) == 2
+    assert all(str(error) == "failed" for error in errors)
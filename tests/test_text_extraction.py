@@ -0,0 +1,54 @@
+import pytest
+
+import text_extraction
+from benchmarks.bench_pipeline import write_pdf
+
+pytestmark = pytest.mark.skipif(text_extraction._optional_module('pypdf') is None, reason="needs pypdf")
+
+TEXT_PAGE = ["Lab 2: sorting", "Exercise 1: implement insertion sort on a list of integers."]
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """Rasterize pages as their number and OCR them to "OCR of page N"; returns the pages OCRed."""
+    pages = []
+    monkeypatch.setattr(text_extraction, 'can_rasterize', lambda: True)
+    monkeypatch.setattr(text_extraction, 'rasterize_page', lambda path, number, dpi=150: str(number).encode())
+
+    def ocr_image(image, mime_type):
+        pages.append(int(image))
+        return f"OCR of page {int(image)}"
+
+    return ocr_image, pages
+
+
+def test_text_layer_is_read_without_ocr(tmp_path, fake_ocr):
+    ocr_image, ocr_pages = fake_ocr
+    path = str(tmp_path / 'lab.pdf')
+    write_pdf(path, [TEXT_PAGE, ["Exercise 2: merge sort, recursively, with a helper function."]])
+    text = text_extraction.extract_pdf_text(path, ocr_image)
+    assert "insertion sort" in text and "merge sort" in text
+    assert ocr_pages == []
+
+
+def test_only_pages_without_text_are_ocred(tmp_path, fake_ocr):
+    ocr_image, ocr_pages = fake_ocr
+    path = str(tmp_path / 'lab.pdf')
+    write_pdf(path, [TEXT_PAGE, [], ["Fig. 1"], TEXT_PAGE])
+    text = text_extraction.extract_pdf_text(path, ocr_image, min_chars=20)
+    assert sorted(ocr_pages) == [2, 3]
+    assert text.index("OCR of page 2") < text.index("OCR of page 3") < text.rindex("insertion sort")
+
+
+def test_without_a_rasterizer_the_caller_falls_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_extraction, 'can_rasterize', lambda: False)
+    path = str(tmp_path / 'scan.pdf')
+    write_pdf(path, [[]])
+    assert text_extraction.extract_pdf_text(path, lambda image, mime_type: "") is None
+
+
+def test_failed_pages_are_left_out(tmp_path, fake_ocr, monkeypatch):
+    monkeypatch.setattr(text_extraction, 'rasterize_page', lambda path, number, dpi=150: 1 / 0)
+    path = str(tmp_path / 'lab.pdf')
+    write_pdf(path, [TEXT_PAGE, []])
+    assert text_extraction.extract_pdf_text(path, fake_ocr[0]).startswith("Lab 2: sorting")
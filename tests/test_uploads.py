@@ -0,0 +1,49 @@
+import hashlib
+import io
+import os
+
+import pytest
+from flask import Flask, jsonify, request
+
+from uploads import SPOOL_PREFIX, UploadRequest, discard_uploads, save_upload
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        saved = {}
+        if request.args.get('save'):
+            for name, file_storage in request.files.items():
+                path = os.path.join(str(tmp_path), file_storage.filename)
+                saved[file_storage.filename] = save_upload(file_storage, path)
+        discard_uploads(request.files)
+        return jsonify(saved)
+
+    return app
+
+
+def spool_files(app):
+    return [name for name in os.listdir(app.config['UPLOAD_FOLDER']) if name.startswith(SPOOL_PREFIX)]
+
+
+def test_uploads_are_spooled_hashed_and_moved(app, tmp_path):
+    content = os.urandom(3 * 1024 * 1024)
+    response = app.test_client().post(
+        '/upload?save=1', data={'code': (io.BytesIO(content), 'lab.py')}, content_type='multipart/form-data'
+    )
+    assert response.json == {'lab.py': hashlib.sha256(content).hexdigest()}
+    assert (tmp_path / 'lab.py').read_bytes() == content
+    assert spool_files(app) == []
+
+
+def test_unsaved_uploads_are_discarded(app):
+    response = app.test_client().post(
+        '/upload', data={'code': (io.BytesIO(b'print(1)'), 'lab.py')}, content_type='multipart/form-data'
+    )
+    assert response.status_code == 200
+    assert spool_files(app) == []
@@ -0,0 +1,105 @@
+"""Tiered text extraction for instruction PDFs.
+
+Most instruction PDFs have a text layer that can be read locally in
+milliseconds. Pages are read with pypdf (or poppler's pdftotext when pypdf is
+not installed); only pages without usable text are rasterized with poppler and
+sent to the vision OCR, page by page and in parallel.
+"""
+import contextvars
+import functools
+import importlib
+import io
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+@functools.lru_cache(maxsize=None)
+def _optional_module(name):
+    """Import an optional dependency on first use, or return None if it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def extract_text_layer(pdf_path):
+    """Return the text layer of every page, or None if no local extractor is available."""
+    pypdf = _optional_module('pypdf')
+    if pypdf is not None:
+        reader = pypdf.PdfReader(pdf_path)
+        return [page.extract_text() or "" for page in reader.pages]
+
+    if shutil.which('pdftotext'):
+        process = subprocess.run(
+            ['pdftotext', '-layout', '-enc', 'UTF-8', pdf_path, '-'],
+            capture_output=True, check=True, timeout=60
+        )
+        # pdftotext ends every page with a form feed
+        pages = process.stdout.decode('utf-8', errors='replace').split('\f')
+        if pages and not pages[-1].strip():
+            pages.pop()
+        return pages
+
+    return None
+
+
+def can_rasterize():
+    """Return True if PDF pages can be rendered to images locally."""
+    return _optional_module('pdf2image') is not None or shutil.which('pdftoppm') is not None
+
+
+def rasterize_page(pdf_path, page_number, dpi=150):
+    """Render one page (1-based) of a PDF to PNG bytes with poppler."""
+    pdf2image = _optional_module('pdf2image')
+    if pdf2image is not None:
+        images = pdf2image.convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+        buffer = io.BytesIO()
+        images[0].save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    process = subprocess.run(
+        ['pdftoppm', '-png', '-r', str(dpi), '-f', str(page_number), '-l', str(page_number), '-singlefile', pdf_path],
+        capture_output=True, check=True, timeout=60
+    )
+    return process.stdout
+
+
+def extract_pdf_text(pdf_path, ocr_image, max_workers=4, dpi=150, min_chars=20):
+    """Extract the text of a PDF, using OCR only for the pages that need it.
+
+    ocr_image(image_bytes, mime_type) is called for every page whose text layer has
+    fewer than min_chars characters, after rendering it at dpi. Returns None when
+    the PDF cannot be processed locally (no text extractor or no rasterizer
+    available for the pages that need OCR), so that the caller can fall back to
+    sending the whole document.
+    """
+    pages = extract_text_layer(pdf_path)
+    if pages is None:
+        return None
+
+    missing = [i for i, text in enumerate(pages) if len(text.strip()) < min_chars]
+    if missing and not can_rasterize():
+        return None
+
+    def ocr_page(index):
+        image = rasterize_page(pdf_path, index + 1, dpi)
+        return ocr_image(image, 'image/png')
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Run each page in a copy of the caller's context (progress tracking)
+            futures = {
+                i: executor.submit(contextvars.copy_context().run, ocr_page, i)
+                for i in missing
+            }
+            for i, future in futures.items():
+                try:
+                    pages[i] = future.result()
+                except Exception as e:
+                    print(f"Error extracting text from page {i + 1}: {str(e)}")
+                    metrics.ERRORS.inc(stage='ocr_page')
+
+    return "\n\n".join(text.strip() for text in pages if text.strip())
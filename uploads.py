@@ -0,0 +1,72 @@
+"""Streaming of uploaded files to disk.
+
+Werkzeug parses multipart uploads into a stream per file. UploadRequest gives it
+a spool file in the upload folder instead of a memory buffer or a file in /tmp:
+each chunk is written to disk and hashed as it arrives, and save_upload then
+moves the file into place with a rename instead of copying it.
+"""
+import hashlib
+import os
+import tempfile
+
+from flask import Request, current_app
+
+SPOOL_PREFIX = '.upload-'
+
+
+class HashingSpoolFile:
+    """Writable, readable spool file that hashes what is written to it."""
+
+    def __init__(self, directory):
+        self.file = tempfile.NamedTemporaryFile(dir=directory, prefix=SPOOL_PREFIX, delete=False)
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.file)
+
+
+class UploadRequest(Request):
+    """Request spooling uploaded files to the upload folder while they are parsed."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        folder = current_app.config['UPLOAD_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        return HashingSpoolFile(folder)
+
+
+def save_upload(file_storage, path, chunk_size=1024 * 1024):
+    """Save an uploaded file to path and return the SHA-256 of its content.
+
+    Spooled files are renamed into place; other streams are copied in chunks.
+    """
+    stream = file_storage.stream
+    if isinstance(stream, HashingSpoolFile):
+        stream.file.close()
+        os.replace(stream.name, path)
+        return stream.sha256.hexdigest()
+
+    digest = hashlib.sha256()
+    with open(path, 'wb') as dst:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+
+def discard_uploads(files):
+    """Remove the spool files of uploads that were not saved."""
+    for _, file_storage in files.items(multi=True):
+        stream = file_storage.stream
+        if isinstance(stream, HashingSpoolFile):
+            stream.file.close()
+            try:
+                os.remove(stream.name)
+            except FileNotFoundError:
+                pass